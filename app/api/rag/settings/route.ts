@@ -49,6 +49,8 @@ export async function PATCH(request: Request) {
       "vector_weight",
       "rrf_k",
       "hybrid_top_k",
+      "use_binary_prefilter",
+      "binary_candidates",
     ];
 
     for (const key of allowed) {
@@ -123,6 +123,7 @@ export async function searchChunks(
     fts_weight: settings.fts_weight,
     vector_weight: settings.vector_weight,
     rrf_k: settings.rrf_k,
+    use_binary_prefilter: settings.use_binary_prefilter,
   });
 
   const embedding = await embedQuery(query);
@@ -134,20 +135,25 @@ export async function searchChunks(
   let vectorChunks: MatchedChunk[] = [];
   let bestVectorSimilarity = 0;
 
-  const { data: vectorData, error: vectorError } = await supabase.rpc("match_chunks", {
+  // Préfiltre binaire : candidats Hamming (embedding_bit) puis rerank cosinus exact
+  const vectorRpc = settings.use_binary_prefilter ? "match_chunks_bq" : "match_chunks";
+  const { data: vectorData, error: vectorError } = await supabase.rpc(vectorRpc, {
     query_embedding: embedding,
     match_threshold: threshold,
     match_count: limit,
+    ...(settings.use_binary_prefilter
+      ? { candidate_count: Math.max(settings.binary_candidates, limit) }
+      : {}),
   });
 
   if (vectorError) {
-    console.error("[RAG/search] match_chunks error", vectorError);
+    console.error(`[RAG/search] ${vectorRpc} error`, vectorError);
     throw new Error(`RAG search failed: ${vectorError.message}`);
   }
 
   vectorChunks = (vectorData ?? []) as MatchedChunk[];
   bestVectorSimilarity = vectorChunks[0]?.similarity ?? 0;
-  LOG("match_chunks result", { count: vectorChunks.length, bestVectorSimilarity });
+  LOG(`${vectorRpc} result`, { count: vectorChunks.length, bestVectorSimilarity });
 
   if (!useFts || vectorChunks.length === 0) {
     return {
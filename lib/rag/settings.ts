@@ -16,6 +16,8 @@ export type RagSettings = {
   vector_weight: number;
   rrf_k: number;
   hybrid_top_k: number;
+  use_binary_prefilter: boolean;
+  binary_candidates: number;
 };
 
 const DEFAULT_SETTINGS: RagSettings = {
@@ -29,6 +31,8 @@ const DEFAULT_SETTINGS: RagSettings = {
   vector_weight: 1,
   rrf_k: 60,
   hybrid_top_k: 20,
+  use_binary_prefilter: false,
+  binary_candidates: 200,
 };
 
 function parseBool(value: string | null, fallback: boolean): boolean {
@@ -52,6 +56,8 @@ export const RAG_SETTINGS_BOUNDS: Record<
   vector_weight: { min: 0, max: 10, type: "float" },
   rrf_k: { min: 1, max: 200, type: "integer" },
   hybrid_top_k: { min: 5, max: 100, type: "integer" },
+  use_binary_prefilter: { type: "boolean" },
+  binary_candidates: { min: 20, max: 1000, type: "integer" },
 };
 
 function parseFloatSafe(value: string | null, fallback: number): number {
@@ -100,6 +106,8 @@ export async function getRagSettings(): Promise<RagSettings> {
     vector_weight: parseFloatSafe(map.get("vector_weight") ?? null, DEFAULT_SETTINGS.vector_weight),
     rrf_k: parseIntSafe(map.get("rrf_k") ?? null, DEFAULT_SETTINGS.rrf_k),
     hybrid_top_k: parseIntSafe(map.get("hybrid_top_k") ?? null, DEFAULT_SETTINGS.hybrid_top_k),
+    use_binary_prefilter: parseBool(map.get("use_binary_prefilter") ?? null, DEFAULT_SETTINGS.use_binary_prefilter),
+    binary_candidates: parseIntSafe(map.get("binary_candidates") ?? null, DEFAULT_SETTINGS.binary_candidates),
   };
 }
 
@@ -118,6 +126,8 @@ const BOUNDS: Record<
   vector_weight: { min: 0, max: 10 },
   rrf_k: { min: 1, max: 200 },
   hybrid_top_k: { min: 5, max: 100 },
+  use_binary_prefilter: null,
+  binary_candidates: { min: 20, max: 1000 },
 };
 
 /**
@@ -136,9 +146,9 @@ export function validateRagSettings(
       }
       continue;
     }
-    if (key === "use_similarity_guard") {
+    if (key === "use_similarity_guard" || key === "use_binary_prefilter") {
       if (typeof value !== "boolean") {
-        return { ok: false, error: `use_similarity_guard doit être true ou false` };
+        return { ok: false, error: `${key} doit être true ou false` };
       }
       continue;
     }
@@ -180,13 +190,15 @@ export async function updateRagSettings(
     "vector_weight",
     "rrf_k",
     "hybrid_top_k",
+    "use_binary_prefilter",
+    "binary_candidates",
   ];
 
   const now = new Date().toISOString();
   for (const key of keys) {
     const value = partial[key];
     if (value === undefined) continue;
-    const valueStr = key === "use_similarity_guard" ? (value ? "true" : "false") : String(value);
+    const valueStr = typeof value === "boolean" ? (value ? "true" : "false") : String(value);
     const { error } = await supabase
       .from("rag_settings")
       .upsert(
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Applique la politique de sections d'ingest.py aux chunks déjà en base.
+
+Depuis FTS_ONLY_SECTIONS (scripts/chunking.py), les chunks des sections
+References et Acknowledgments sont ingérés sans embedding : recherche plein texte
+(content_tsv, content_fr_tsv) seulement, hors index HNSW. Ce script fait de même
+pour les chunks existants : embedding, embedding_bit et embedding_fr passent à NULL
+(le contenu et les colonnes FTS ne bougent pas), par batches de UPDATE_BATCH lignes.
+
+Sans --apply : bilan seul — chunks concernés par titre de section, part des
+vecteurs de chaque index HNSW, gain de taille estimé. Un index HNSW ne rétrécit
+pas sur place (les entrées supprimées sont seulement marquées) : --reindex le
+reconstruit (REINDEX CONCURRENTLY, sans bloquer la recherche) et mesure la taille
+réelle avant / après.
+
+Usage :
+    cd scripts && python3 apply_section_policy.py                        # bilan (rien n'est modifié)
+    cd scripts && python3 apply_section_policy.py --apply --reindex      # NULL + reconstruction des index
+    cd scripts && python3 apply_section_policy.py --sections references,acknowledg,supporting --apply
+
+Prérequis : SUPABASE_DB_URL.
+"""
+import argparse
+import time
+
+from chunking import FTS_ONLY_SECTIONS
+from db_conn import MAINTENANCE_MEM, get_conn
+
+UPDATE_BATCH = 5000
+VECTOR_INDEXES = (
+    # index, colonne
+    ("idx_chunks_embedding",     "embedding"),
+    ("idx_chunks_embedding_bit", "embedding_bit"),
+    ("idx_chunks_embedding_fr",  "embedding_fr"),
+)
+
+
+def section_sql(sections: tuple) -> tuple:
+    """Condition SQL équivalente à chunking.fts_only (titre sans numéro, minuscules, préfixe)."""
+    return (
+        "lower(regexp_replace(btrim(c.section_title), '^[0-9]+\\.?\\s*', '')) LIKE ANY (%s)"
+        " AND (c.is_temp = false OR c.is_temp IS NULL)",
+        ([s.replace("%", "").replace("_", "\\_") + "%" for s in sections],),
+    )
+
+
+def index_sizes(cur, indexes: list) -> dict:
+    sizes = {}
+    for name, _ in indexes:
+        cur.execute("SELECT pg_relation_size(%s::regclass)", (f"public.{name}",))
+        sizes[name] = cur.fetchone()[0]
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sections FTS seule : embeddings NULL sur les chunks existants")
+    parser.add_argument(
+        "--sections", default=",".join(FTS_ONLY_SECTIONS),
+        help="Préfixes de titres de section (défaut: %(default)s, comme ingest.py --fts-only-sections)",
+    )
+    parser.add_argument("--apply", action="store_true", help="Passe les embeddings de ces chunks à NULL")
+    parser.add_argument("--reindex", action="store_true", help="Avec --apply : REINDEX CONCURRENTLY des index HNSW")
+    args = parser.parse_args()
+    sections = tuple(p.strip().lower() for p in args.sections.split(",") if p.strip())
+    if not sections:
+        parser.error("--sections vide")
+    where, params = section_sql(sections)
+
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT column_name FROM information_schema.columns WHERE table_schema = 'public' AND table_name = 'chunks'")
+        columns = {r[0] for r in cur.fetchall()}
+        indexes = []
+        for name, column in VECTOR_INDEXES:
+            cur.execute("SELECT to_regclass(%s)", (f"public.{name}",))
+            if column in columns and cur.fetchone()[0] is not None:
+                indexes.append((name, column))
+
+        print(f"📚  Sections FTS seule : {', '.join(sections)}", flush=True)
+        cur.execute(
+            f"SELECT c.section_title, count(*) FROM public.chunks c WHERE {where} AND c.embedding IS NOT NULL"
+            " GROUP BY 1 ORDER BY 2 DESC LIMIT 15",
+            params,
+        )
+        for title, n in cur.fetchall():
+            print(f"  {n:>9}  {title!r}")
+
+        sizes = index_sizes(cur, indexes)
+        print(f"\n{'index':<26} {'vecteurs':>10} {'concernés':>10} {'part':>6} {'taille Mo':>10} {'gain estimé':>12}")
+        for name, column in indexes:
+            cur.execute(f"SELECT count(*) FROM public.chunks c WHERE c.{column} IS NOT NULL")
+            total = cur.fetchone()[0]
+            cur.execute(f"SELECT count(*) FROM public.chunks c WHERE {where} AND c.{column} IS NOT NULL", params)
+            hit = cur.fetchone()[0]
+            share = hit / max(total, 1)
+            print(
+                f"{name:<26} {total:>10} {hit:>10} {share:>6.1%} {sizes[name] / 1e6:>10.1f} "
+                f"{sizes[name] * share / 1e6:>9.1f} Mo"
+            )
+        if not args.apply:
+            print("\n💡  Rien n'est modifié sans --apply.")
+            return
+
+        vector_columns = [column for _, column in VECTOR_INDEXES if column in columns]
+        cur.execute(
+            f"SELECT c.id FROM public.chunks c WHERE {where}"
+            f" AND ({' OR '.join(f'c.{column} IS NOT NULL' for column in vector_columns)})",
+            params,
+        )
+        ids = [r[0] for r in cur.fetchall()]
+        assignments = ", ".join(f"{column} = NULL" for column in vector_columns)
+        t0 = time.monotonic()
+        for i in range(0, len(ids), UPDATE_BATCH):
+            cur.execute(
+                f"UPDATE public.chunks SET {assignments} WHERE id = ANY(%s::uuid[])",
+                (ids[i:i + UPDATE_BATCH],),
+            )
+            print(f"  {min(i + UPDATE_BATCH, len(ids))}/{len(ids)} chunks ({time.monotonic() - t0:.0f}s)...", flush=True)
+        print(f"✅  {len(ids)} chunks passés en FTS seule en {time.monotonic() - t0:.0f}s.", flush=True)
+
+        if not args.reindex:
+            print("💡  Les index HNSW gardent leur taille jusqu'à un REINDEX (--reindex).")
+            return
+        cur.execute("SET maintenance_work_mem = %s", (MAINTENANCE_MEM,))
+        for name, _ in indexes:
+            t1 = time.monotonic()
+            print(f"🏗   REINDEX CONCURRENTLY {name}...", flush=True)
+            cur.execute(f"REINDEX INDEX CONCURRENTLY public.{name}")
+            print(f"  {time.monotonic() - t1:.0f}s", flush=True)
+        after = index_sizes(cur, indexes)
+        print(f"\n{'index':<26} {'avant Mo':>10} {'après Mo':>10} {'gain':>7}")
+        for name, _ in indexes:
+            print(f"{name:<26} {sizes[name] / 1e6:>10.1f} {after[name] / 1e6:>10.1f} {1 - after[name] / max(sizes[name], 1):>7.1%}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Benchmark du pipeline ingest.py sur des PDF synthétiques déterministes.
+
+Aucun PDF du corpus ni accès Supabase : les PDF sont générés avec PyMuPDF (graine
+fixe) et l'insert passe par une base locale en mémoire qui sérialise les lignes
+comme le client PostgREST. Chaque étage est mesuré séparément :
+  extract   extract_text_with_ocr_fallback, par type de PDF     → pages/s
+  metadata  extract_metadata                                   → documents/s
+  chunk     chunk_text                                         → chunks/s
+  dedup     ChunkFingerprintIndex.classify + commit (index vide) → chunks/s
+  embed     EmbeddingBatcher (backend torch ou onnx, sans cache) → embeddings/s
+  insert    RestWriter (base locale) et COPY binaire (encodage) → chunks/s
+plus le pic de RSS du processus. Les résultats sont comparés au baseline commité
+(scripts/bench_ingest_baseline.json) ; écart > --tolerance → régression signalée.
+
+Le découpage dépend du compteur de tokens (chunking.token_counter_name : tokenizer
+épinglé ou approximation CHUNK_TOKENS_APPROX=1), enregistré dans params. Il est
+chargé avant les mesures. Si celui du baseline diffère, les étages qui dépendent
+des chunks (chunk, dedup, embed, insert) ne sont pas comparés.
+
+Une mesure sans valeur comparable dans le baseline (absente, ou n/c) fait échouer
+--check : le baseline est à régénérer. --update-baseline refuse d'écrire un
+baseline incomplet (approximation des tokens, sans embed torch ou sans OCR), sauf
+--allow-partial ; plusieurs passages (ex. --embed-backend onnx) se cumulent.
+
+Types de PDF générés :
+  text        une colonne, sections (Introduction, Methods…), DOI, journal
+  two_column  deux colonnes par page
+  spaced      texte legacy « e s p a c é » (lettres séparées par des espaces)
+  image       pages scannées (image seule, sans couche texte → OCR)
+
+Usage :
+  python3 scripts/bench_ingest.py                       # mesure + comparaison au baseline
+  python3 scripts/bench_ingest.py --skip-embed          # sans charger le modèle
+  python3 scripts/bench_ingest.py --embed-backend onnx  # étage embed en ONNX Runtime int8
+  python3 scripts/bench_ingest.py --check               # code retour 1 si régression
+  python3 scripts/bench_ingest.py --update-baseline     # réécrit le baseline (tokenizer épinglé, torch, tesseract)
+  python3 scripts/bench_ingest.py --update-baseline --embed-backend onnx   # ajoute embed.onnx
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import queue
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import fitz
+import numpy as np
+
+import ingest
+from chunk_fingerprints import ChunkFingerprintIndex
+from chunking import token_counter_name
+from embedder import load_embedder
+
+BASELINE_PATH = Path(__file__).resolve().parent / "bench_ingest_baseline.json"
+SEED          = 1234
+PAGES         = {"text": 40, "two_column": 40, "spaced": 20, "image": 4}
+DOCS_PER_KIND = 3
+REPEAT        = 5      # on garde la meilleure mesure
+TOLERANCE     = 0.20   # écart relatif toléré avant de signaler une régression
+CHUNK_STAGES  = ("chunk.", "dedup.", "embed.", "insert.")  # mesures qui dépendent du découpage
+# Sans elles, --check ne garde ni l'embedding ni l'OCR : --update-baseline les exige.
+REQUIRED_METRICS = ("embed.torch.embeddings_per_s", "extract.image.pages_per_s")
+
+_WORDS = (
+    "catalyst ligand complex synthesis crystal structure spectroscopy reaction yield "
+    "temperature solvent oxidation reduction electron density bond angle molecule "
+    "coordination metal copper iron nickel cobalt zinc palladium ruthenium organic "
+    "analysis sample measurement result method mechanism kinetic thermodynamic phase "
+    "the of and in with for by on from was were is are this that these which between"
+).split()
+_SECTIONS = ["Abstract", "1. Introduction", "2. Experimental", "3. Results and Discussion", "4. Conclusions", "References"]
+
+
+# ── PDF synthétiques ─────────────────────────────────────────────────────────
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 20))]
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng: random.Random) -> str:
+    return " ".join(_sentence(rng) for _ in range(rng.randint(3, 7)))
+
+
+def _page_lines(rng: random.Random, page_no: int, n_pages: int) -> list:
+    lines = []
+    if page_no == 0:
+        lines += [
+            "Synthetic Study of Copper Complexes",
+            "",
+            "A. Martin, B. Dupont and C. Leroy",
+            "Journal of Coordination Chemistry",
+            f"DOI: 10.1234/bench.{rng.randint(1000, 9999)}",
+            "",
+        ]
+    # une section toutes les ~n_pages/len(_SECTIONS) pages
+    step = max(1, n_pages // len(_SECTIONS))
+    if page_no % step == 0 and page_no // step < len(_SECTIONS):
+        lines += [_SECTIONS[page_no // step], ""]
+    for _ in range(4):
+        lines += [_paragraph(rng), ""]
+    return lines
+
+
+def _spaced(line: str) -> str:
+    """Texte legacy : lettres séparées par une espace, mots par deux."""
+    return "  ".join(" ".join(w) for w in line.split())
+
+
+def make_pdf(path: Path, kind: str, n_pages: int, seed: int) -> None:
+    rng = random.Random(seed)
+    doc = fitz.open()
+    doc.set_metadata({})  # pas de titre/auteur : extract_metadata passe par les heuristiques texte
+    for p in range(n_pages):
+        lines = _page_lines(rng, p, n_pages)
+        page = doc.new_page(width=595, height=842)
+        margin = fitz.Rect(50, 50, 545, 792)
+        if kind == "two_column":
+            text = "\n".join(lines)
+            half = len(text) // 2
+            page.insert_textbox(fitz.Rect(50, 50, 290, 792), text[:half], fontsize=7)
+            page.insert_textbox(fitz.Rect(305, 50, 545, 792), text[half:], fontsize=7)
+        elif kind == "spaced":
+            page.insert_textbox(margin, "\n".join(_spaced(ln) for ln in lines), fontsize=6)
+        elif kind == "image":
+            # page rendue puis réinsérée en image : plus aucune couche texte
+            tmp = fitz.open()
+            src = tmp.new_page(width=595, height=842)
+            src.insert_textbox(margin, "\n".join(lines), fontsize=9)
+            pix = src.get_pixmap(dpi=150, colorspace=fitz.csGRAY, alpha=False)
+            page.insert_image(page.rect, pixmap=pix)
+            tmp.close()
+        else:
+            page.insert_textbox(margin, "\n".join(lines), fontsize=8)
+    doc.save(path, garbage=3, deflate=True, no_new_id=True)
+    doc.close()
+
+
+def make_corpus(root: Path, pages: dict, docs_per_kind: int) -> dict:
+    """kind → [Path] ; dossier par année pour que _extract_year_from_folder s'applique."""
+    out = {}
+    year_dir = root / "2025"
+    year_dir.mkdir(parents=True, exist_ok=True)
+    for k, kind in enumerate(sorted(pages)):
+        out[kind] = []
+        for d in range(docs_per_kind):
+            path = year_dir / f"{kind}_{d}.pdf"
+            make_pdf(path, kind, pages[kind], SEED + 100 * k + d)
+            out[kind].append(path)
+    return out
+
+
+# ── Base locale (stand-in PostgREST) ─────────────────────────────────────────
+
+class LocalTable:
+    def __init__(self, db: "LocalDB", name: str):
+        self.db, self.name, self.payload = db, name, None
+
+    def insert(self, rows):
+        self.payload = rows
+        return self
+
+    def update(self, values: dict):
+        self.payload = values
+        return self
+
+    def eq(self, column: str, value):
+        return self
+
+    def execute(self):
+        # Même coût de sérialisation que le client (corps JSON de la requête HTTP).
+        body = json.dumps(self.payload)
+        self.db.requests += 1
+        self.db.bytes += len(body)
+        if self.name == "chunks" and isinstance(self.payload, list):
+            self.db.rows += len(self.payload)
+        return self
+
+
+class LocalDB:
+    def __init__(self):
+        self.requests = 0
+        self.rows = 0
+        self.bytes = 0
+
+    def table(self, name: str) -> LocalTable:
+        return LocalTable(self, name)
+
+
+# ── Mesures ──────────────────────────────────────────────────────────────────
+
+def peak_rss_mb() -> float:
+    # ru_maxrss : Ko sous Linux, octets sous macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def best_of(repeat: int, fn) -> float:
+    """Meilleure durée (s) de fn() sur `repeat` essais."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run_benchmark(
+    corpus: dict,
+    repeat: int,
+    skip_embed: bool,
+    verbose: bool,
+    embed_backend: str = "torch",
+    embed_threads: int = 0,
+) -> dict:
+    metrics: dict = {}
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    ingest.INSERT_PAUSE = 0  # la pause entre batches est un throttle volontaire, hors mesure
+
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()  # binaire tesseract présent
+        ocr_available = True
+    except Exception:
+        ocr_available = False
+
+    extracted: dict = {}
+    with quiet:
+        for kind, paths in corpus.items():
+            if kind == "image" and not ocr_available:
+                continue
+
+            def extract_all():
+                extracted[kind] = [ingest.extract_text_with_ocr_fallback(p) for p in paths]
+
+            secs = best_of(1 if kind == "image" else repeat, extract_all)
+            n_pages = sum(len(pt) for _, pt, _ in extracted[kind])
+            metrics[f"extract.{kind}.pages_per_s"] = n_pages / secs
+    metrics["extract.peak_rss_mb"] = peak_rss_mb()
+
+    docs = [(p, r) for kind, paths in corpus.items() if kind in extracted for p, r in zip(paths, extracted[kind])]
+
+    def metadata_all():
+        for p, (full_text, _, _) in docs:
+            d = fitz.open(p)
+            try:
+                ingest.extract_metadata(d, full_text, p)
+            finally:
+                d.close()
+
+    metrics["metadata.docs_per_s"] = len(docs) / best_of(repeat, metadata_all)
+
+    chunked: list = []
+
+    def chunk_all():
+        chunked[:] = [ingest.chunk_text(full_text, page_texts) for _, (full_text, page_texts, _) in docs]
+
+    secs = best_of(repeat, chunk_all)
+    n_chunks = sum(len(c) for c in chunked)
+    n_pages = sum(len(pt) for _, (_, pt, _) in docs)
+    metrics["chunk.chunks_per_s"] = n_chunks / secs
+    metrics["chunk.pages_per_s"] = n_pages / secs
+    metrics["chunk.peak_rss_mb"] = peak_rss_mb()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = iter(range(repeat + 1))
+
+        def dedup_all():
+            index = ChunkFingerprintIndex(Path(tmp) / f"fingerprints-{next(runs)}.sqlite")
+            for i, chunks in enumerate(chunked):
+                index.classify(f"doc{i}", [c[0] for c in chunks])
+                index.commit(f"doc{i}")
+            index.close()
+
+        metrics["dedup.chunks_per_s"] = n_chunks / best_of(repeat, dedup_all)
+
+    jobs = [{"tag": f"[{i}]", "chunks": c, "document_id": f"00000000-0000-0000-0000-{i:012d}"} for i, c in enumerate(chunked)]
+    if not skip_embed:
+        model = load_embedder(embed_backend, ingest.EMBED_MODEL, embed_threads)
+        out_q: queue.Queue = queue.Queue()
+
+        def embed_all():
+            batcher = ingest.EmbeddingBatcher(model, out_q, ingest.EMBED_BATCH, ingest.EMBED_FLUSH_S, cache=None)
+            for job in jobs:
+                batcher.add(job)
+            batcher.flush()
+
+        with quiet:
+            embed_all()  # échauffement (chargement des poids, allocations)
+            metrics[f"embed.{embed_backend}.embeddings_per_s"] = n_chunks / best_of(repeat, embed_all)
+        metrics["embed.peak_rss_mb"] = peak_rss_mb()
+    else:
+        # Vecteurs déterministes pour l'étage insert (pas de modèle chargé).
+        rng = np.random.default_rng(SEED)
+        for job in jobs:
+            job["embeddings"] = rng.standard_normal((len(job["chunks"]), ingest.EMBED_DIM)).astype(np.float32)
+
+    db = LocalDB()
+    writer = ingest.RestWriter(db)
+
+    def insert_all():
+        for job in jobs:
+            writer.write_chunks(job)
+
+    with quiet:
+        metrics["insert.rest.chunks_per_s"] = n_chunks / best_of(repeat, insert_all)
+
+    try:
+        import ingest_pg
+    except Exception:
+        ingest_pg = None
+    if ingest_pg is not None:
+        def encode_all():
+            for job in jobs:
+                ingest_pg.encode_copy_binary(job["document_id"], job["chunks"], job["embeddings"])
+
+        metrics["insert.copy.chunks_per_s"] = n_chunks / best_of(repeat, encode_all)
+
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    metrics["_counts"] = {"documents": len(docs), "pages": n_pages, "chunks": n_chunks, "ocr": ocr_available}
+    return metrics
+
+
+# ── Baseline ─────────────────────────────────────────────────────────────────
+
+def _lower_is_better(key: str) -> bool:
+    return key.endswith("rss_mb")
+
+
+def compare(metrics: dict, baseline: dict, tolerance: float, skip: tuple = ()) -> list:
+    """Affiche le tableau de comparaison ; retourne la liste des régressions.
+
+    skip : préfixes de métriques affichées sans comparaison (mesures non comparables).
+    """
+    base = baseline.get("metrics", {})
+    regressions = []
+    print(f"\n{'métrique':<32} {'mesure':>12} {'baseline':>12} {'écart':>9}")
+    for key in sorted(k for k in metrics if not k.startswith("_")):
+        value = metrics[key]
+        ref = base.get(key)
+        if ref is None or ref == 0:
+            print(f"{key:<32} {value:>12.1f} {'-':>12} {'':>9}")
+            continue
+        if key.startswith(skip):
+            print(f"{key:<32} {value:>12.1f} {ref:>12.1f} {'n/c':>9}")
+            continue
+        delta = value / ref - 1
+        worse = delta > tolerance if _lower_is_better(key) else delta < -tolerance
+        flag = "  ⚠️" if worse else ""
+        print(f"{key:<32} {value:>12.1f} {ref:>12.1f} {delta:>+8.0%}{flag}")
+        if worse:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du pipeline d'ingestion (PDF synthétiques)")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help=f"Essais par étage, meilleur retenu (défaut: {REPEAT})")
+    parser.add_argument("--docs", type=int, default=DOCS_PER_KIND, help=f"PDF par type (défaut: {DOCS_PER_KIND})")
+    parser.add_argument("--skip-embed", action="store_true", help="Ne charge pas le modèle d'embeddings (étage embed non mesuré)")
+    parser.add_argument("--embed-backend", choices=("torch", "onnx", "server"), default="torch", help="Backend d'embeddings mesuré (défaut: torch)")
+    parser.add_argument("--embed-threads", type=int, default=0, help="Threads intra-op du modèle (0 = défaut du backend)")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help=f"Écart relatif toléré (défaut: {TOLERANCE})")
+    parser.add_argument("--check", action="store_true", help="Code retour 1 si une métrique régresse au-delà de la tolérance")
+    parser.add_argument("--update-baseline", action="store_true", help=f"Écrit les mesures dans {BASELINE_PATH.name}")
+    parser.add_argument(
+        "--allow-partial", action="store_true",
+        help=f"--update-baseline même sans tokenizer épinglé ni {', '.join(REQUIRED_METRICS)}",
+    )
+    parser.add_argument("--keep", type=Path, help="Génère les PDF dans ce dossier et les conserve")
+    parser.add_argument("--verbose", action="store_true", help="Affiche les logs d'ingest.py pendant les mesures")
+    args = parser.parse_args()
+
+    # Chargé ici, hors de l'étage chunk mesuré (lecture et hachage du tokenizer.json).
+    try:
+        counter = token_counter_name()
+    except RuntimeError as e:
+        sys.exit(f"❌  {e}")
+    print(f"✂️   Découpage : {counter}.")
+
+    with tempfile.TemporaryDirectory(prefix="bench_ingest_") as tmp:
+        root = args.keep or Path(tmp)
+        t0 = time.monotonic()
+        corpus = make_corpus(root, PAGES, args.docs)
+        print(f"📄  {sum(len(v) for v in corpus.values())} PDF synthétiques générés en {time.monotonic() - t0:.1f}s ({root}).")
+        metrics = run_benchmark(
+            corpus, args.repeat, args.skip_embed, args.verbose, args.embed_backend, args.embed_threads,
+        )
+
+    counts = metrics["_counts"]
+    print(f"📊  {counts['documents']} documents | {counts['pages']} pages | {counts['chunks']} chunks"
+          f"{'' if counts['ocr'] else ' | OCR indisponible (PDF image non mesurés)'}")
+
+    params = {"pages": PAGES, "docs_per_kind": args.docs, "seed": SEED, "token_counter": counter}
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    base_params = dict(baseline.get("params", {}))
+    skip = ()
+    if baseline and base_params.pop("token_counter", None) != counter:
+        print(
+            f"⚠️   Découpage différent du baseline ({baseline['params'].get('token_counter', '?')}) : "
+            f"étages chunk, dedup, embed et insert non comparés (n/c)."
+        )
+        skip = CHUNK_STAGES
+    if baseline and base_params != {k: v for k, v in params.items() if k != "token_counter"}:
+        print("⚠️   Paramètres différents du baseline : comparaison indicative.")
+    regressions = compare(metrics, baseline, args.tolerance, skip)
+    base_metrics = baseline.get("metrics", {})
+    unverified = [
+        k for k in sorted(metrics)
+        if not k.startswith("_") and (not base_metrics.get(k) or k.startswith(skip))
+    ]
+
+    if args.update_baseline:
+        # On garde les métriques du baseline non mesurées ici (ex. embed onnx lors d'un passage torch),
+        # sauf celles qui dépendent d'un autre découpage.
+        merged = {k: v for k, v in base_metrics.items() if not k.startswith(skip)}
+        merged.update({k: round(v, 1) for k, v in metrics.items() if not k.startswith("_")})
+        missing = [k for k in REQUIRED_METRICS if k not in merged]
+        if (counter == "approx" or missing) and not args.allow_partial:
+            reasons = (["tokens estimés (CHUNK_TOKENS_APPROX)"] if counter == "approx" else []) + [
+                f"{k} non mesuré" for k in missing
+            ]
+            sys.exit(f"❌  Baseline incomplet ({', '.join(reasons)}) : non écrit (--allow-partial pour forcer).")
+        BASELINE_PATH.write_text(json.dumps({
+            "params": params,
+            "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+            "metrics": dict(sorted(merged.items())),
+        }, indent=2, ensure_ascii=False) + "\n")
+        print(f"\n💾  Baseline mis à jour : {BASELINE_PATH}")
+        return
+    if regressions:
+        print(f"\n⚠️   {len(regressions)} régression(s) au-delà de {args.tolerance:.0%} : {', '.join(regressions)}")
+    if unverified:
+        print(f"\n⚠️   {len(unverified)} mesure(s) sans référence comparable (baseline à régénérer) : {', '.join(unverified)}")
+    if not (regressions or unverified):
+        print("\n✅  Pas de régression au-delà de la tolérance.")
+    elif args.check:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
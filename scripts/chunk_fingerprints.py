@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Empreintes des chunks pour ingest.py : boilerplate éditeur et quasi-doublons.
+
+Mentions de copyright ACS/Wiley, filigranes « Downloaded from … », en-têtes
+courants : le même texte est découpé et embeddé dans chaque document. Chaque chunk
+reçoit une signature MinHash (NUM_PERM minima sur les bigrammes de mots du texte
+normalisé : minuscules, chiffres → 0, ponctuation ignorée — dates, DOI et numéros
+de page ne cassent pas la ressemblance), comparée à l'index persistant du corpus :
+  - boilerplate : Jaccard estimé >= NEAR_JACCARD avec des chunks vus dans au moins
+    BOILERPLATE_MIN_DOCS documents (celui-ci compris) → inséré sans embedding (FTS seule) ;
+  - quasi-doublon : proche d'un chunk d'un autre document → inséré, mais signalé
+    (positions dans documents.ingestion_log).
+Candidats par LSH : la signature est coupée en 16 bandes de BAND_ROWS minima, deux
+chunks qui partagent une bande sont comparés (Jaccard 0,7 → candidat à 99 %, 0,6 à
+89 % ; deux chunks sans rapport, Jaccard ~0,03 : ~1e-5, quelques candidats par
+requête même sur tout le corpus).
+Une entrée classée boilerplate n'est plus complétée par les chunks qui lui
+ressemblent : l'index reste borné pour le texte le plus répété.
+
+SimHash a été écarté : sur un chunk court, un seul mot changé (le mois d'un
+filigrane) déplace l'empreinte d'autant de bits que deux paragraphes sans rapport.
+
+Les documents sont identifiés par leur storage_path : une ré-ingestion oublie
+d'abord les empreintes de la tentative précédente (forget). Les écritures d'un
+document ne sont appliquées qu'à la fin de son chunking (commit) : un document
+est classé contre l'état de l'index à son début, si bien qu'un flux repris après
+un crash retrouve exactement les mêmes chunks aux mêmes positions.
+
+Fichier : data/.chunk_fingerprints.sqlite (ou CHUNK_FINGERPRINTS_PATH).
+
+Usage :
+    index = ChunkFingerprintIndex()
+    index.forget(rel_path)
+    statuses = index.classify(rel_path, [content for content, *_ in chunks])   # "keep" | "near" | "boilerplate"
+    index.commit(rel_path)
+
+    cd scripts && python3 chunk_fingerprints.py --stats        # boilerplate connu, le plus fréquent d'abord
+    cd scripts && python3 chunk_fingerprints.py --rebuild      # amorce l'index depuis les chunks en base (SUPABASE_DB_URL)
+"""
+import argparse
+import hashlib
+import itertools
+import os
+import re
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).resolve().parent.parent
+
+DEFAULT_FINGERPRINTS_PATH = Path(os.environ.get("CHUNK_FINGERPRINTS_PATH") or project_root / "data" / ".chunk_fingerprints.sqlite")
+SHINGLE              = 2     # mots par shingle
+NUM_PERM             = 64    # minima par signature
+BAND_ROWS            = 4     # minima par bande LSH (→ NUM_PERM / BAND_ROWS bandes)
+NEAR_JACCARD         = 0.6   # similarité estimée à partir de laquelle deux chunks sont « le même »
+BOILERPLATE_MIN_DOCS = 3     # documents distincts à partir desquels un chunk est du boilerplate
+SAMPLE_CHARS         = 200   # extrait gardé pour --stats
+MINHASH_SEED         = 20261018
+
+_WORD_RE  = re.compile(r"\w+")
+_DIGIT_RE = re.compile(r"\d")
+_PRIME    = (1 << 31) - 1
+_rng      = np.random.default_rng(MINHASH_SEED)
+_PERM_A   = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_PERM_B   = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+_PARAMS   = f"minhash shingle={SHINGLE} perm={NUM_PERM} seed={MINHASH_SEED} rows={BAND_ROWS}"
+
+
+def minhash(text: str, shingle: int = SHINGLE) -> object:
+    """Signature MinHash (NUM_PERM uint32) du texte normalisé, None s'il n'a aucun mot."""
+    words = _WORD_RE.findall(_DIGIT_RE.sub("0", text.lower()))
+    if not words:
+        return None
+    shingles = {" ".join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1))}
+    h = np.fromiter((zlib.crc32(s.encode("utf-8", "surrogatepass")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # h < 2^32 et a < 2^31 : a·h + b tient dans un uint64
+    return ((h[:, None] * _PERM_A + _PERM_B) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+def band_keys(sig: np.ndarray, rows: int = BAND_ROWS) -> list:
+    """Une clé 63 bits par bande (numéro de bande + ses minima) ; une collision fortuite est écartée par le Jaccard."""
+    return [
+        int.from_bytes(hashlib.blake2b(bytes([band]) + values.tobytes(), digest_size=8).digest(), "big") >> 1
+        for band, values in enumerate(sig.reshape(-1, rows))
+    ]
+
+
+def jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    """Jaccard estimé : part des minima égaux."""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+class ChunkFingerprintIndex:
+    def __init__(
+        self,
+        path: Path = DEFAULT_FINGERPRINTS_PATH,
+        min_docs: int = BOILERPLATE_MIN_DOCS,
+        near_jaccard: float = NEAR_JACCARD,
+    ):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.min_docs = min_docs
+        self.near_jaccard = near_jaccard
+        # Utilisé par le thread principal d'ingest.py seulement (chunking).
+        self._db = sqlite3.connect(str(path))
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " id INTEGER PRIMARY KEY,"
+            " doc TEXT,"                         # NULL : entrée boilerplate
+            " sig BLOB NOT NULL,"
+            " docs INTEGER,"                     # boilerplate : documents distincts au classement
+            " hits INTEGER NOT NULL DEFAULT 0,"  # boilerplate : chunks non embeddés depuis
+            " sample TEXT"
+            ")"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_entries_doc ON entries (doc)")
+        # Les bandes d'une entrée oubliée restent : elles ne joignent plus rien (purgées par --rebuild).
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS bands (key INTEGER NOT NULL, id INTEGER NOT NULL, PRIMARY KEY (key, id)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT NOT NULL)")
+        row = self._db.execute("SELECT v FROM meta WHERE k = 'params'").fetchone()
+        if row is not None and row[0] != _PARAMS:
+            print("  [empreintes] paramètres MinHash modifiés : index vidé.", flush=True)
+            self.clear()
+        self._db.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('params', ?)", (_PARAMS,))
+        self._db.commit()
+        self._pending: dict = {}   # doc → (entrées à ajouter, ids boilerplate touchés)
+
+    # ── Interne ───────────────────────────────────────────────────────────────
+
+    def _near(self, sig: np.ndarray, keys: list) -> list:
+        """(id, doc) des entrées à Jaccard estimé >= near_jaccard."""
+        rows = self._db.execute(
+            "SELECT DISTINCT e.id, e.doc, e.sig FROM bands b JOIN entries e ON e.id = b.id"
+            f" WHERE b.key IN ({','.join('?' * len(keys))})",
+            keys,
+        ).fetchall()
+        return [
+            (i, doc) for i, doc, blob in rows
+            if jaccard(np.frombuffer(blob, dtype=np.uint32), sig) >= self.near_jaccard
+        ]
+
+    # ── API ───────────────────────────────────────────────────────────────────
+
+    def forget(self, doc: str) -> None:
+        """Oublie les empreintes d'un document (ré-ingestion, reprise)."""
+        self._pending.pop(doc, None)
+        self._db.execute("DELETE FROM entries WHERE doc = ?", (doc,))
+        self._db.commit()
+
+    def classify(self, doc: str, texts: list) -> list:
+        """Statut de chaque texte ("keep", "near" ou "boilerplate"). Rien n'est écrit avant commit(doc)."""
+        entries, hits = self._pending.setdefault(doc, ([], []))
+        statuses = []
+        for text in texts:
+            sig = minhash(text)
+            if sig is None:
+                statuses.append("keep")
+                continue
+            keys = band_keys(sig)
+            near = self._near(sig, keys)
+            known = [i for i, d in near if d is None]
+            if known:
+                hits.append(known[0])
+                statuses.append("boilerplate")
+                continue
+            others = {d for _, d in near if d != doc}
+            if len(others) + 1 >= self.min_docs:
+                entries.append((None, sig, keys, len(others) + 1, 1, text[:SAMPLE_CHARS]))
+                statuses.append("boilerplate")
+                continue
+            statuses.append("near" if others else "keep")
+            entries.append((doc, sig, keys, None, 0, None))
+        return statuses
+
+    def commit(self, doc: str) -> None:
+        """Chunking du document terminé : ajoute ses empreintes et les boilerplate qu'il a révélés."""
+        entries, hits = self._pending.pop(doc, ([], []))
+        seen: set = set()
+        for owner, sig, keys, docs, n, sample in entries:
+            blob = sig.tobytes()
+            if owner is not None:
+                if blob in seen:
+                    continue  # même signature déjà ajoutée pour ce document (en-tête répété…)
+                seen.add(blob)
+            cur = self._db.execute(
+                "INSERT INTO entries (doc, sig, docs, hits, sample) VALUES (?, ?, ?, ?, ?)",
+                (owner, blob, docs, n, sample),
+            )
+            self._db.executemany("INSERT OR IGNORE INTO bands (key, id) VALUES (?, ?)", [(k, cur.lastrowid) for k in keys])
+        self._db.executemany("UPDATE entries SET hits = hits + 1 WHERE id = ?", [(i,) for i in hits])
+        self._db.commit()
+
+    def summary(self) -> str:
+        docs, chunks = self._db.execute("SELECT count(DISTINCT doc), count(doc) FROM entries").fetchone()
+        bp, hits = self._db.execute("SELECT count(*), coalesce(sum(hits), 0) FROM entries WHERE doc IS NULL").fetchone()
+        return f"{chunks} empreintes ({docs} documents), {bp} boilerplate connus ({hits} chunks non embeddés au total)"
+
+    def top_boilerplate(self, limit: int = 20) -> list:
+        return self._db.execute(
+            "SELECT hits, docs, sample FROM entries WHERE doc IS NULL ORDER BY hits DESC, docs DESC LIMIT ?", (limit,)
+        ).fetchall()
+
+    def clear(self) -> None:
+        self._db.execute("DELETE FROM entries")
+        self._db.execute("DELETE FROM bands")
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
+
+
+# ── CLI ───────────────────────────────────────────────────────────────────────
+
+def rebuild(index: ChunkFingerprintIndex, db_url: str) -> None:
+    """Vide l'index puis le remplit avec les chunks des documents done, document par document.
+
+    Les chunks déjà en base ne sont pas modifiés : le bilan indique seulement ce
+    qu'ingest.py aurait écarté ou signalé.
+    """
+    import psycopg2
+
+    index.clear()
+    conn = psycopg2.connect(db_url)
+    counts = {"keep": 0, "near": 0, "boilerplate": 0}
+    docs = 0
+    t0 = time.monotonic()
+    try:
+        with conn.cursor(name="chunk_fingerprints") as cur:  # curseur serveur : pas tout le corpus en mémoire
+            cur.itersize = 5000
+            cur.execute(
+                "SELECT d.storage_path, c.content FROM public.chunks c"
+                " JOIN public.documents d ON d.id = c.document_id"
+                " WHERE d.status = 'done' AND d.storage_path IS NOT NULL"
+                " ORDER BY c.document_id, c.position"
+            )
+            for path, rows in itertools.groupby(cur, key=lambda r: r[0]):
+                for status in index.classify(path, [r[1] or "" for r in rows]):
+                    counts[status] += 1
+                index.commit(path)
+                docs += 1
+                if docs % 500 == 0:
+                    print(f"  {docs} documents, {sum(counts.values())} chunks ({time.monotonic() - t0:.0f}s)...", flush=True)
+    finally:
+        conn.close()
+    total = max(sum(counts.values()), 1)
+    print(
+        f"✅  {docs} documents, {sum(counts.values())} chunks en {time.monotonic() - t0:.0f}s : "
+        f"{counts['boilerplate']} boilerplate ({counts['boilerplate'] / total:.1%}), "
+        f"{counts['near']} quasi-doublons ({counts['near'] / total:.1%})."
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index d'empreintes des chunks (boilerplate, quasi-doublons)")
+    parser.add_argument("--stats", action="store_true", help="Résumé de l'index et boilerplate le plus fréquent")
+    parser.add_argument("--rebuild", action="store_true", help="Reconstruit l'index depuis les chunks en base (SUPABASE_DB_URL)")
+    parser.add_argument("--top", type=int, default=20, help="Boilerplate affichés avec --stats (défaut: 20)")
+    args = parser.parse_args()
+    if not (args.stats or args.rebuild):
+        parser.error("--stats ou --rebuild")
+
+    index = ChunkFingerprintIndex()
+    try:
+        if args.rebuild:
+            from db_conn import get_db_url
+
+            rebuild(index, get_db_url())
+        print(f"🧹  {index.summary()}")
+        if args.stats:
+            for hits, docs, sample in index.top_boilerplate(args.top):
+                print(f"  {hits:>7} × ({docs} docs) {sample[:100]!r}")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Découpage d'une page en chunks pour ingest.py, budgeté en tokens du modèle d'embeddings.
+
+all-MiniLM-L6-v2 tronque silencieusement au-delà de 256 word-pieces ([CLS] et
+[SEP] compris) : la fin d'un chunk trop long n'est jamais embeddée. Le découpage
+reste celui d'avant (lignes, titres de section, cible CHUNK_SIZE caractères,
+recouvrement CHUNK_OVERLAP), mais un chunk est fermé avant que l'ajout d'une
+ligne ne dépasse CHUNK_MAX_TOKENS ; une ligne qui dépasse seule le budget est
+coupée entre deux mots.
+
+Une seule passe sur les lignes : longueurs en caractères et en tokens tenues à
+jour incrémentalement, tokens comptés en un appel au tokenizer par page. Chaque
+chunk porte ses offsets [char_start, char_end) dans le texte de sa page :
+page_text[char_start:char_end] == contenu du chunk.
+
+Le tokenizer est un tokenizer.json local, figé : les frontières de chunks ne
+dépendent ni du réseau ni d'une mise à jour du Hub (PIPELINE_VERSION, reprise du
+journal et benchmark supposent un découpage déterministe). Ordre de recherche :
+TOKENIZER_PATH (data/.tokenizer/tokenizer.json, ou CHUNK_TOKENIZER_PATH), celui
+exporté par embedder.py à côté du modèle ONNX, puis le cache Hugging Face sans
+réseau (copié alors dans TOKENIZER_PATH). Introuvable : erreur, sauf
+CHUNK_TOKENS_APPROX=1 (nombre de tokens estimé, voir approx_token_counts).
+token_counter_name() identifie le compteur utilisé (ingestion_log, journal).
+
+Usage :
+    cd scripts && python3 chunking.py --fetch-tokenizer     # télécharge et fige tokenizer.json (réseau)
+
+Politique de sections : les chunks dont la section commence par un préfixe de
+FTS_ONLY_SECTIONS (References, Acknowledgments) sont stockés sans embedding —
+recherche plein texte seulement, hors index HNSW (fts_only, appliqué par ingest.py
+et rétroactivement par apply_section_policy.py).
+"""
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+
+TOKENIZER_MODEL  = "sentence-transformers/all-MiniLM-L6-v2"
+TOKENIZER_PATH   = Path(os.environ.get("CHUNK_TOKENIZER_PATH") or project_root / "data" / ".tokenizer" / "tokenizer.json")
+CHUNK_SIZE       = 600   # cible en caractères (inchangée)
+CHUNK_OVERLAP    = 100   # recouvrement en caractères entre deux chunks consécutifs
+CHUNK_MAX_TOKENS = 254   # max_seq_length 256 du modèle − [CLS] − [SEP]
+FTS_ONLY_SECTIONS = ("references", "acknowledg")  # préfixes de sections sans embedding (References, Acknowledg(e)ments)
+
+SECTION_RE = re.compile(
+    r"^(?:\d+\.?\s*)?"
+    r"(Abstract|Introduction|Methods?|Materials?\s+and\s+Methods?|Results?|Discussion"
+    r"|Conclusions?|References|Acknowledgm?ents?|Experimental|Background|Summary)"
+    r"(?:\s+and\s+Discussion)?\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+_SECTION_NUM_RE = re.compile(r"^\d+\.?\s*")  # même motif que section_sql (apply_section_policy.py)
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+_WORD_RE = re.compile(r"\S+")
+
+_counter = None
+
+
+# ── Politique de sections ────────────────────────────────────────────────────
+
+def section_key(title: object) -> str:
+    """Titre de section normalisé : sans numéro, minuscules ("5. REFERENCES" → "references")."""
+    return _SECTION_NUM_RE.sub("", (title or "").strip()).lower()
+
+
+def fts_only(title: object, sections: tuple = FTS_ONLY_SECTIONS) -> bool:
+    """True si un chunk de cette section est stocké sans embedding (FTS seule)."""
+    key = section_key(title)
+    return bool(key) and bool(sections) and key.startswith(tuple(sections))
+
+
+# ── Comptage de tokens ───────────────────────────────────────────────────────
+
+def approx_token_counts(texts: list) -> list:
+    """Estimation sans tokenizer : un token par mot ou signe de ponctuation, plus un par 10 caractères (mots longs découpés)."""
+    return [len(_PIECE_RE.findall(t)) + len(t) // 10 for t in texts]
+
+
+def _tokenizer_file() -> object:
+    """tokenizer.json local (figé, ONNX exporté, cache Hub hors ligne), sinon None."""
+    if TOKENIZER_PATH.exists():
+        return TOKENIZER_PATH
+    from embedder import onnx_model_dir
+
+    exported = onnx_model_dir(TOKENIZER_MODEL) / "tokenizer.json"
+    if exported.exists():
+        return exported
+    try:
+        from huggingface_hub import hf_hub_download
+
+        cached = Path(hf_hub_download(TOKENIZER_MODEL, "tokenizer.json", local_files_only=True))
+    except Exception:
+        return None
+    TOKENIZER_PATH.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(cached, TOKENIZER_PATH)  # figé : une mise à jour du cache ne change plus le découpage
+    return TOKENIZER_PATH
+
+
+def get_token_counter():
+    """Fonction list[str] → list[int] (tokens sans [CLS]/[SEP]), chargée une fois par processus.
+
+    Lève RuntimeError si aucun tokenizer.json local n'est trouvé (sauf CHUNK_TOKENS_APPROX=1).
+    """
+    global _counter
+    if _counter is None:
+        path = _tokenizer_file()
+        if path is None:
+            if os.environ.get("CHUNK_TOKENS_APPROX") != "1":
+                raise RuntimeError(
+                    f"tokenizer.json de {TOKENIZER_MODEL} introuvable ({TOKENIZER_PATH}) : "
+                    "python3 scripts/chunking.py --fetch-tokenizer, ou CHUNK_TOKENS_APPROX=1 pour estimer les tokens"
+                )
+            print("  [chunks] ⚠️   CHUNK_TOKENS_APPROX=1 : tokens estimés (découpage différent du tokenizer).", flush=True)
+            approx_token_counts.name = "approx"
+            _counter = approx_token_counts
+        else:
+            # lib tokenizers seule (Rust) : ni transformers ni torch à importer pour chunker
+            from tokenizers import Tokenizer
+
+            tokenizer = Tokenizer.from_file(str(path))
+            tokenizer.no_truncation()
+            tokenizer.no_padding()
+
+            def count(texts: list) -> list:
+                return [len(e.ids) for e in tokenizer.encode_batch(texts, add_special_tokens=False)]
+            count.name = "tokenizer:" + hashlib.sha256(path.read_bytes()).hexdigest()[:12]
+            _counter = count
+    return _counter
+
+
+def token_counter_name() -> str:
+    """'tokenizer:<sha256 du tokenizer.json>' ou 'approx' : à enregistrer avec les chunks produits."""
+    return get_token_counter().name
+
+
+# ── Découpage ────────────────────────────────────────────────────────────────
+
+def _units(text: str, count, max_tokens: int) -> list:
+    """Lignes de la page : [start, end, tokens, titre de section ou None].
+
+    Une ligne de plus de max_tokens tokens est découpée en groupes de mots.
+    """
+    spans, pos = [], 0
+    for line in text.split("\n"):
+        spans.append((pos, pos + len(line)))
+        pos += len(line) + 1
+    lines = [text[s:e] for s, e in spans]
+    tokens = count(lines)
+    units = []
+    for (s, e), line, n in zip(spans, lines, tokens):
+        stripped = line.strip()
+        if stripped and SECTION_RE.match(stripped):
+            units.append([s, e, n, stripped])
+        elif n <= max_tokens:
+            units.append([s, e, n, None])
+        else:
+            words = [(m.start() + s, m.end() + s) for m in _WORD_RE.finditer(line)]
+            word_tokens = count([text[ws:we] for ws, we in words])
+            group_start, group_end, group_tokens = words[0][0], words[0][0], 0
+            for (ws, we), wn in zip(words, word_tokens):
+                if group_tokens and group_tokens + wn > max_tokens:
+                    units.append([group_start, group_end, group_tokens, None])
+                    group_start, group_tokens = ws, 0
+                group_end = we
+                group_tokens += wn
+            units.append([group_start, group_end, group_tokens, None])
+    return units
+
+
+def chunk_page(
+    text: str,
+    count=None,
+    size: int = CHUNK_SIZE,
+    overlap: int = CHUNK_OVERLAP,
+    max_tokens: int = CHUNK_MAX_TOKENS,
+) -> list:
+    """[(contenu, section, char_start, char_end)] pour le texte d'une page.
+
+    count : fonction de comptage de tokens (défaut : tokenizer du modèle).
+    """
+    if count is None:
+        count = get_token_counter()
+    units = _units(text, count, max_tokens)
+    out = []
+    section = None
+    first, cur_tokens, fresh = 0, 0, False   # chunk courant = units[first:i]
+
+    def emit(i0: int, i1: int) -> None:
+        raw = text[units[i0][0]:units[i1 - 1][1]]
+        block = raw.strip()
+        if block:
+            start = units[i0][0] + len(raw) - len(raw.lstrip())
+            out.append((block, section, start, start + len(block)))
+
+    def overlap_start(i0: int, i1: int) -> int:
+        """Premières lignes du recouvrement : les dernières de units[i0:i1] totalisant >= overlap caractères."""
+        j, length = i1, 0
+        while j > i0:
+            j -= 1
+            length += units[j][1] - units[j][0] + 1
+            if length >= overlap:
+                break
+        return j
+
+    for i, (start, end, n, header) in enumerate(units):
+        if header is not None:
+            if fresh:
+                emit(first, i)
+            first, cur_tokens, fresh, section = i, n, True, header
+            continue
+        if first < i and cur_tokens + n > max_tokens:
+            # la ligne ferait dépasser le budget du modèle : on ferme le chunk avant elle
+            if fresh:
+                emit(first, i)
+                first = overlap_start(first, i)
+                cur_tokens = sum(u[2] for u in units[first:i])
+            while first < i and cur_tokens + n > max_tokens:
+                cur_tokens -= units[first][2]
+                first += 1
+        cur_tokens += n
+        fresh = True
+        if end - units[first][0] + 1 >= size:
+            emit(first, i + 1)
+            first = overlap_start(first, i + 1)
+            cur_tokens = sum(u[2] for u in units[first:i + 1])
+            fresh = False
+    if fresh:
+        emit(first, len(units))
+    return out
+
+
+# ── CLI ───────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokenizer du découpage en chunks")
+    parser.add_argument("--fetch-tokenizer", action="store_true", help=f"Télécharge et fige {TOKENIZER_PATH}")
+    args = parser.parse_args()
+    if not args.fetch_tokenizer:
+        parser.error("--fetch-tokenizer")
+    from huggingface_hub import hf_hub_download
+
+    try:
+        downloaded = hf_hub_download(TOKENIZER_MODEL, "tokenizer.json")
+    except Exception as e:
+        sys.exit(f"❌  Téléchargement impossible : {str(e)[:200]}")
+    TOKENIZER_PATH.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(downloaded, TOKENIZER_PATH)
+    print(f"✅  {TOKENIZER_PATH} ({token_counter_name()}).")
+
+
+if __name__ == "__main__":
+    main()
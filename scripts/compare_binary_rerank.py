@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Rappel et latence de match_chunks_bq (préfiltre binaire + rerank exact) vs HNSW halfvec.
+
+À lancer avant d'activer rag_settings.use_binary_prefilter, pour choisir
+binary_candidates : un échantillon de chunks est copié dans une table de travail
+UNLOGGED (embedding halfvec(384) + embedding_bit = binary_quantize(embedding)), avec
+les deux index HNSW de production (halfvec_cosine_ops et bit_hamming_ops, m=16,
+ef_construction=64). On mesure :
+  - référence : ORDER BY embedding <=> q LIMIT k (index halfvec, ef_search 40) ;
+  - deux phases, pour chaque nombre de candidats : les N plus proches en distance
+    de Hamming (hnsw.ef_search = N, comme dans la RPC), rerankés en cosinus exact ;
+avec pour chacun le rappel@k par rapport au top-k exact (cosinus float32, numpy),
+la latence p50 / p95, et la taille des deux index.
+
+Usage :
+    cd scripts && python3 compare_binary_rerank.py                  # 100k chunks, 200 requêtes, k=20
+    cd scripts && python3 compare_binary_rerank.py --candidates 100,200,400 --rows 300000
+
+Prérequis : SUPABASE_DB_URL, pgvector >= 0.7.0 (binary_quantize, bit_hamming_ops).
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from compare_halfvec import QUERIES, ROWS, TOP_K, check_pgvector, exact_top_k, fetch_matrix
+from db_conn import MAINTENANCE_MEM, get_conn
+
+TABLE       = "_bench_emb_bq"
+CANDIDATES  = "40,100,200,400,800"  # candidate_count testés (max 1000 = plafond de hnsw.ef_search)
+BASELINE_EF = 40                    # hnsw.ef_search de la référence (défaut pgvector)
+
+
+def build_table(cur, rows: int) -> dict:
+    cur.execute(f"DROP TABLE IF EXISTS public.{TABLE}")
+    cur.execute(
+        f"CREATE UNLOGGED TABLE public.{TABLE} AS"
+        " SELECT id, embedding::halfvec(384) AS embedding,"
+        " binary_quantize(embedding::halfvec(384))::bit(384) AS embedding_bit FROM public.chunks"
+        " WHERE embedding IS NOT NULL AND (is_temp = false OR is_temp IS NULL)"
+        " ORDER BY id LIMIT %s",
+        (rows,),
+    )
+    cur.execute("SET maintenance_work_mem = %s", (MAINTENANCE_MEM,))
+    stats = {}
+    for name, column, opclass in (("halfvec", "embedding", "halfvec_cosine_ops"), ("bit", "embedding_bit", "bit_hamming_ops")):
+        t0 = time.monotonic()
+        cur.execute(
+            f"CREATE INDEX {TABLE}_{name} ON public.{TABLE}"
+            f" USING hnsw ({column} {opclass}) WITH (m = 16, ef_construction = 64)"
+        )
+        build_s = time.monotonic() - t0
+        cur.execute("SELECT pg_relation_size(%s::regclass)", (f"public.{TABLE}_{name}",))
+        stats[name] = {"build_s": build_s, "index_mb": cur.fetchone()[0] / 1e6}
+    cur.execute(f"ANALYZE public.{TABLE}")
+    return stats
+
+
+def measure(cur, sql: str, ef: int, queries: list, truth: list, k: int) -> dict:
+    """Rappel@k et latence de `sql` (chaque %s reçoit le littéral de la requête)."""
+    cur.execute(f"SET hnsw.ef_search = {int(ef)}")
+    n_params = sql.count("%s")
+    for q in queries[:10]:  # chauffe du cache
+        cur.execute(sql, (q,) * n_params)
+        cur.fetchall()
+    latencies, recalls = [], []
+    for q, expected in zip(queries, truth):
+        t0 = time.perf_counter()
+        cur.execute(sql, (q,) * n_params)
+        got = {r[0] for r in cur.fetchall()}
+        latencies.append((time.perf_counter() - t0) * 1000)
+        recalls.append(len(got & expected) / k)
+    return {
+        "recall": float(np.mean(recalls)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rappel/latence préfiltre binaire + rerank vs HNSW halfvec")
+    parser.add_argument("--rows", type=int, default=ROWS, help=f"Chunks dans l'échantillon (défaut: {ROWS})")
+    parser.add_argument("--queries", type=int, default=QUERIES, help=f"Requêtes (défaut: {QUERIES})")
+    parser.add_argument("--k", type=int, default=TOP_K, help=f"Top-k évalué (défaut: {TOP_K})")
+    parser.add_argument("--candidates", default=CANDIDATES, help=f"Nombres de candidats Hamming, séparés par des virgules (défaut: {CANDIDATES})")
+    parser.add_argument("--keep", action="store_true", help=f"Garde la table de travail ({TABLE})")
+    args = parser.parse_args()
+    candidates = [min(int(x), 1000) for x in args.candidates.split(",") if x.strip()]
+
+    conn = get_conn()
+    cur = conn.cursor()
+    version = check_pgvector(cur)
+    print(f"🧪  pgvector {version} — échantillon {args.rows} chunks, {args.queries} requêtes, k={args.k}.", flush=True)
+
+    try:
+        print("🏗   Copie + index HNSW halfvec et bit...", flush=True)
+        stats = build_table(cur, args.rows)
+
+        base_ids, base = fetch_matrix(cur, f"SELECT id, embedding::vector(384)::text FROM public.{TABLE}")
+        if len(base_ids) <= args.k:
+            sys.exit("❌  Échantillon trop petit pour ce k.")
+        _, queries = fetch_matrix(
+            cur,
+            "SELECT id, embedding::vector(384)::text FROM public.chunks"
+            " WHERE embedding IS NOT NULL AND (is_temp = false OR is_temp IS NULL)"
+            " ORDER BY id DESC LIMIT %s",
+            (args.queries,),
+        )
+        print(f"🎯  Top-{args.k} exact (numpy, float32) pour {len(queries)} requêtes...", flush=True)
+        top = exact_top_k(base, queries, args.k)
+        truth = [{base_ids[i] for i in row} for row in top]
+        literals = ["[" + ",".join(map(str, q.tolist())) + "]" for q in queries]
+
+        k = int(args.k)
+        baseline_sql = f"SELECT id FROM public.{TABLE} ORDER BY embedding <=> %s::halfvec(384) LIMIT {k}"
+        print(f"\n{'méthode':<14} {'candidats':>9} {'rappel@' + str(k):>10} {'p50 ms':>8} {'p95 ms':>8}")
+        r = measure(cur, baseline_sql, BASELINE_EF, literals, truth, k)
+        print(f"{'halfvec HNSW':<14} {'-':>9} {r['recall']:>10.4f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f}")
+        for n in candidates:
+            n = max(n, k)
+            sql = (
+                f"SELECT id FROM ("
+                f" SELECT id, embedding FROM public.{TABLE}"
+                f" ORDER BY embedding_bit <~> binary_quantize(%s::halfvec(384))::bit(384) LIMIT {n}"
+                f") cand ORDER BY embedding <=> %s::halfvec(384) LIMIT {k}"
+            )
+            r = measure(cur, sql, max(n, 40), literals, truth, k)
+            print(f"{'bit + rerank':<14} {n:>9} {r['recall']:>10.4f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f}")
+
+        half, bit = stats["halfvec"], stats["bit"]
+        print(
+            f"\n📦  Index HNSW : halfvec {half['index_mb']:.1f} Mo ({half['build_s']:.1f} s), "
+            f"bit {bit['index_mb']:.1f} Mo ({bit['build_s']:.1f} s) — "
+            f"{bit['index_mb'] / max(half['index_mb'], 1e-9):.0%} de halfvec."
+        )
+    finally:
+        if not args.keep:
+            cur.execute(f"DROP TABLE IF EXISTS public.{TABLE}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Rappel et latence de la recherche HNSW : embeddings fp32 (vector) vs halfvec (float16).
+
+À lancer avant la migration 20261018110000_chunks_embedding_halfvec.sql (ou après,
+pour contrôle) : un échantillon de chunks est copié dans deux tables de travail
+UNLOGGED, l'une en vector(384), l'autre en halfvec(384), chacune avec le même index
+HNSW que la production (m=16, ef_construction=64). Pour chaque table et chaque
+valeur de hnsw.ef_search :
+  - rappel@k par rapport au top-k exact (cosinus en float32, calculé en numpy) ;
+  - latence p50 / p95 d'un ORDER BY embedding <=> q LIMIT k ;
+  - taille de la table, taille de l'index et durée de construction.
+Les requêtes sont des chunks pris à l'autre bout de l'ordre des id (hors
+échantillon dès que le corpus dépasse --rows + --queries). Les tables de travail
+sont supprimées à la fin (--keep pour les garder).
+
+Usage :
+    cd scripts && python3 compare_halfvec.py                     # 100k chunks, 200 requêtes, k=20
+    cd scripts && python3 compare_halfvec.py --rows 300000 --ef-search 40,100,200
+
+Prérequis : SUPABASE_DB_URL, pgvector >= 0.7.0 (halfvec).
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from db_conn import MAINTENANCE_MEM, get_conn
+from vector_format import parse_vector
+
+ROWS            = 100_000   # chunks copiés dans chaque table de travail
+QUERIES         = 200
+TOP_K           = 20
+EF_SEARCH       = "40,100"  # hnsw.ef_search testés (40 = défaut pgvector)
+VARIANTS        = (
+    # nom, table, type SQL, opclass
+    ("fp32",    "_bench_emb_fp32", "vector(384)",  "vector_cosine_ops"),
+    ("halfvec", "_bench_emb_half", "halfvec(384)", "halfvec_cosine_ops"),
+)
+
+
+def check_pgvector(cur) -> str:
+    cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+    row = cur.fetchone()
+    if row is None:
+        sys.exit("❌  Extension pgvector absente.")
+    if tuple(int(x) for x in row[0].split(".")[:2]) < (0, 7):
+        sys.exit(f"❌  pgvector {row[0]} : halfvec requiert >= 0.7.0 (ALTER EXTENSION vector UPDATE).")
+    return row[0]
+
+
+def fetch_matrix(cur, sql: str, params: tuple = ()) -> tuple:
+    """(ids, matrice float32) pour une requête SELECT id, embedding."""
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    ids = [r[0] for r in rows]
+    matrix = np.vstack([parse_vector(r[1]) for r in rows]) if rows else np.zeros((0, 384), dtype=np.float32)
+    return ids, matrix
+
+
+def exact_top_k(base: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Indices du top-k cosinus exact (float32), par requête."""
+    base = base / np.maximum(np.linalg.norm(base, axis=1, keepdims=True), 1e-12)
+    queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    sims = queries @ base.T
+    top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    return top
+
+
+def build_variant(cur, table: str, sql_type: str, opclass: str, rows: int) -> dict:
+    cur.execute(f"DROP TABLE IF EXISTS public.{table}")
+    if sql_type.startswith("vector"):
+        cur.execute(
+            f"CREATE UNLOGGED TABLE public.{table} AS"
+            f" SELECT id, embedding::{sql_type} AS embedding FROM public.chunks"
+            " WHERE embedding IS NOT NULL AND (is_temp = false OR is_temp IS NULL)"
+            " ORDER BY id LIMIT %s",
+            (rows,),
+        )
+    else:
+        # même échantillon que la table fp32, arrondi en float16 par Postgres
+        cur.execute(
+            f"CREATE UNLOGGED TABLE public.{table} AS"
+            f" SELECT id, embedding::{sql_type} AS embedding FROM public.{VARIANTS[0][1]}"
+        )
+    cur.execute("SET maintenance_work_mem = %s", (MAINTENANCE_MEM,))
+    t0 = time.monotonic()
+    cur.execute(
+        f"CREATE INDEX {table}_hnsw ON public.{table}"
+        f" USING hnsw (embedding {opclass}) WITH (m = 16, ef_construction = 64)"
+    )
+    build_s = time.monotonic() - t0
+    cur.execute(f"ANALYZE public.{table}")
+    cur.execute(
+        "SELECT pg_table_size(%s::regclass), pg_relation_size(%s::regclass)",
+        (f"public.{table}", f"public.{table}_hnsw"),
+    )
+    table_bytes, index_bytes = cur.fetchone()
+    return {"build_s": build_s, "table_mb": table_bytes / 1e6, "index_mb": index_bytes / 1e6}
+
+
+def run_queries(cur, table: str, sql_type: str, queries: list, truth: list, k: int, ef: int) -> dict:
+    cur.execute(f"SET hnsw.ef_search = {int(ef)}")
+    sql = f"SELECT id FROM public.{table} ORDER BY embedding <=> %s::{sql_type} LIMIT {int(k)}"
+    cur.execute("EXPLAIN " + sql, (queries[0],))
+    plan = " ".join(r[0] for r in cur.fetchall())
+    if "Index Scan" not in plan:
+        print(f"  ⚠️   {table} : l'index HNSW n'est pas utilisé ({plan[:80]})", flush=True)
+    for q in queries[:10]:  # chauffe du cache
+        cur.execute(sql, (q,))
+        cur.fetchall()
+    latencies, recalls = [], []
+    for q, expected in zip(queries, truth):
+        t0 = time.perf_counter()
+        cur.execute(sql, (q,))
+        got = {r[0] for r in cur.fetchall()}
+        latencies.append((time.perf_counter() - t0) * 1000)
+        recalls.append(len(got & expected) / k)
+    return {
+        "recall": float(np.mean(recalls)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rappel/latence HNSW fp32 vs halfvec sur un échantillon du corpus")
+    parser.add_argument("--rows", type=int, default=ROWS, help=f"Chunks dans l'échantillon (défaut: {ROWS})")
+    parser.add_argument("--queries", type=int, default=QUERIES, help=f"Requêtes (défaut: {QUERIES})")
+    parser.add_argument("--k", type=int, default=TOP_K, help=f"Top-k évalué (défaut: {TOP_K})")
+    parser.add_argument("--ef-search", default=EF_SEARCH, help=f"Valeurs de hnsw.ef_search, séparées par des virgules (défaut: {EF_SEARCH})")
+    parser.add_argument("--keep", action="store_true", help="Garde les tables de travail (_bench_emb_*)")
+    args = parser.parse_args()
+    ef_values = [int(x) for x in args.ef_search.split(",") if x.strip()]
+
+    conn = get_conn()
+    cur = conn.cursor()
+    version = check_pgvector(cur)
+    print(f"🧪  pgvector {version} — échantillon {args.rows} chunks, {args.queries} requêtes, k={args.k}.", flush=True)
+
+    try:
+        stats = {}
+        for name, table, sql_type, opclass in VARIANTS:
+            print(f"🏗   {name} : copie + index HNSW ({opclass})...", flush=True)
+            stats[name] = build_variant(cur, table, sql_type, opclass, args.rows)
+
+        base_ids, base = fetch_matrix(cur, f"SELECT id, embedding::vector(384)::text FROM public.{VARIANTS[0][1]}")
+        if len(base_ids) <= args.k:
+            sys.exit("❌  Échantillon trop petit pour ce k.")
+        _, queries = fetch_matrix(
+            cur,
+            "SELECT id, embedding::vector(384)::text FROM public.chunks"
+            " WHERE embedding IS NOT NULL AND (is_temp = false OR is_temp IS NULL)"
+            " ORDER BY id DESC LIMIT %s",
+            (args.queries,),
+        )
+        print(f"🎯  Top-{args.k} exact (numpy, float32) pour {len(queries)} requêtes...", flush=True)
+        top = exact_top_k(base, queries, args.k)
+        truth = [{base_ids[i] for i in row} for row in top]
+        literals = ["[" + ",".join(map(str, q.tolist())) + "]" for q in queries]
+
+        print(f"\n{'variante':<9} {'ef_search':>9} {'rappel@' + str(args.k):>10} {'p50 ms':>8} {'p95 ms':>8} {'table Mo':>9} {'index Mo':>9} {'build s':>8}")
+        for name, table, sql_type, _ in VARIANTS:
+            s = stats[name]
+            for ef in ef_values:
+                r = run_queries(cur, table, sql_type, literals, truth, args.k, ef)
+                print(
+                    f"{name:<9} {ef:>9} {r['recall']:>10.4f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+                    f"{s['table_mb']:>9.1f} {s['index_mb']:>9.1f} {s['build_s']:>8.1f}"
+                )
+        fp32, half = stats["fp32"], stats["halfvec"]
+        print(
+            f"\n📦  halfvec : table {half['table_mb'] / max(fp32['table_mb'], 1e-9):.0%} de fp32, "
+            f"index {half['index_mb'] / max(fp32['index_mb'], 1e-9):.0%}."
+        )
+    finally:
+        if not args.keep:
+            for _, table, _, _ in VARIANTS:
+                cur.execute(f"DROP TABLE IF EXISTS public.{table}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,41 @@
 Calcule les coordonnées UMAP 2D à partir des embeddings existants dans Supabase
 et les écrit dans les colonnes chunks.umap_x / chunks.umap_y.
 
+Un calcul complet (refit) enregistre le reducer UMAP ajusté et les ids de son
+échantillon d'entraînement dans data/.umap (ou UMAP_MODEL_DIR). --incremental
+recharge ce reducer et place seulement les nouveaux chunks (umap_x IS NULL) dans
+la carte existante (reducer.transform) : les points déjà placés ne bougent pas.
+Le périmètre (1 chunk/doc ou --all) est celui du modèle. Un refit complet
+périodique reste nécessaire quand le corpus change de visage (la projection
+n'apprend rien des nouveaux documents).
+
 Usage:
-    cd scripts && python3 compute_umap.py           # 1 chunk/doc (~3700 points, rapide)
-    cd scripts && python3 compute_umap.py --all     # tous les chunks (848k, très long)
+    cd scripts && python3 compute_umap.py                   # 1 chunk/doc (~3700 points, rapide)
+    cd scripts && python3 compute_umap.py --all             # tous les chunks (848k, ~1,3 Go de matrice, très long)
+    cd scripts && python3 compute_umap.py --incremental     # nouveaux chunks seulement, carte inchangée (secondes)
+    cd scripts && python3 compute_umap.py --batch-write     # écriture UPDATE ligne à ligne (comparaison)
+    cd scripts && python3 compute_umap.py --all --no-knn-cache   # graphe kNN recalculé par UMAP
+    cd scripts && python3 compute_umap.py --all --snapshot       # embeddings lus dans la copie locale
+
+--snapshot : les embeddings viennent de la copie memmap d'embedding_snapshot.py
+(data/.embed_snapshot), synchronisée au début du run.
+
+Refit : le graphe kNN (l'essentiel du temps de calcul) vient de knn_graph.py,
+en cache sous data/.knn tant que les embeddings ne changent pas.
+
+Écriture : COPY des coordonnées dans une table temporaire, puis un seul
+UPDATE … FROM (durée affichée par mode).
 
 Prérequis:
     pip install umap-learn psycopg2-binary
 """
+import io
 import os
 import sys
+import json
 import math
+import pickle
+import time
 from pathlib import Path
 
 project_root = Path(__file__).resolve().parent.parent
@@ -23,78 +48,184 @@ if env_path.exists():
     from dotenv import load_dotenv
     load_dotenv(env_path)
 
-import json
 import numpy as np
 import umap
 import psycopg2
 import psycopg2.extras
 
-UPDATE_BATCH = 500
+import embedding_snapshot
+from db_conn import get_conn
+from knn_graph import get_graph
+from vector_format import decode_send_rows, send_function
+
+UPDATE_BATCH = 500     # --batch-write : lignes par execute_batch
+COPY_BATCH   = 100000  # lignes par COPY vers la table temporaire
+FETCH_PAGE   = 20000   # lignes par aller-retour du curseur serveur (~8 Mo en halfvec)
+EMBED_DIM    = 384
 ALL_CHUNKS = "--all" in sys.argv
+INCREMENTAL = "--incremental" in sys.argv
+BATCH_WRITE = "--batch-write" in sys.argv
+NO_KNN_CACHE = "--no-knn-cache" in sys.argv
+SNAPSHOT = "--snapshot" in sys.argv
+KNN_MIN_POINTS = 4096  # en dessous, UMAP calcule les distances exactes (rapide, pas de graphe approché)
 
+UMAP_MODEL_DIR = Path(os.environ.get("UMAP_MODEL_DIR") or project_root / "data" / ".umap")
+UMAP_PARAMS = dict(n_components=2, n_neighbors=15, min_dist=0.1, metric="cosine")
 
-def get_conn():
-    db_url = (os.environ.get("SUPABASE_DB_URL") or "").strip()
-    if not db_url:
-        sys.exit("❌  SUPABASE_DB_URL manquant dans .env.local")
-    conn = psycopg2.connect(db_url)
-    conn.autocommit = True
-    with conn.cursor() as cur:
-        cur.execute("SET statement_timeout = 0;")
-    return conn
 
+def fetch_embeddings(conn, all_chunks=ALL_CHUNKS, only_new=False):
+    """Récupère les embeddings — 1 chunk par doc (position=0) par défaut, ou tous avec --all.
 
-def fetch_embeddings(conn):
-    """Récupère les embeddings — 1 chunk par doc (position=0) par défaut, ou tous avec --all."""
-    if ALL_CHUNKS:
+    only_new : seulement les chunks sans coordonnées (umap_x IS NULL), pour --incremental.
+
+    Curseur serveur (FETCH_PAGE lignes par aller-retour) dans une transaction
+    REPEATABLE READ : le COUNT(*) et la lecture voient le même instantané, la
+    matrice float32 est allouée une fois et remplie page par page depuis la sortie
+    binaire de vector_send / halfvec_send. Avec --all (848k × 384) : ~1,3 Go de
+    matrice, plus les ids.
+    """
+    if all_chunks:
         print("📥  Récupération de TOUS les embeddings (mode --all)...")
-        sql = """
-            SELECT id, embedding FROM chunks
-            WHERE embedding IS NOT NULL AND (is_temp = false OR is_temp IS NULL)
-        """
+        where = "embedding IS NOT NULL AND (is_temp = false OR is_temp IS NULL)"
     else:
         print("📥  Récupération d'1 chunk par document (position=0)...")
-        sql = """
-            SELECT id, embedding FROM chunks
-            WHERE embedding IS NOT NULL AND position = 0 AND (is_temp = false OR is_temp IS NULL)
-        """
-
-    ids, embeddings = [], []
-    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-        cur.execute(sql)
-        rows = cur.fetchall()
-        for r in rows:
-            ids.append(str(r["id"]))
-            emb = r["embedding"]
-            if isinstance(emb, str):
-                emb = json.loads(emb)
-            embeddings.append(emb)
-
-    print(f"✅  {len(ids)} embeddings chargés.")
-    return ids, embeddings
-
-
-def compute_umap(embeddings):
-    n = len(embeddings)
+        where = "embedding IS NOT NULL AND position = 0 AND (is_temp = false OR is_temp IS NULL)"
+    if only_new:
+        where += " AND umap_x IS NULL"
+
+    conn.autocommit = False  # un curseur nommé vit dans une transaction
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            cur.execute(
+                "SELECT format_type(atttypid, atttypmod) FROM pg_attribute"
+                " WHERE attrelid = 'public.chunks'::regclass AND attname = 'embedding'"
+            )
+            send, dtype = send_function(cur.fetchone()[0])
+            cur.execute(f"SELECT count(*) FROM chunks WHERE {where}")
+            total = cur.fetchone()[0]
+
+        ids = []
+        matrix = np.empty((total, EMBED_DIM), dtype=np.float32)
+        t0 = time.monotonic()
+        with conn.cursor(name="compute_umap_embeddings") as cur:
+            cur.itersize = FETCH_PAGE
+            # ORDER BY id : ordre stable d'un run à l'autre (empreinte du graphe kNN, ids.npy trié)
+            cur.execute(f"SELECT id::text, {send}(embedding) FROM chunks WHERE {where} ORDER BY id")
+            while True:
+                rows = cur.fetchmany(FETCH_PAGE)
+                if not rows:
+                    break
+                start = len(ids)
+                decode_send_rows([r[1] for r in rows], EMBED_DIM, dtype, matrix[start:start + len(rows)])
+                ids.extend(r[0] for r in rows)
+                pct = round(len(ids) / max(total, 1) * 100)
+                print(f"   {len(ids)}/{total} ({pct}%, {time.monotonic() - t0:.0f}s)", end="\r", flush=True)
+        conn.commit()
+    finally:
+        conn.autocommit = True
+
+    print(f"\n✅  {len(ids)} embeddings chargés ({matrix.nbytes / 1e9:.2f} Go).")
+    return ids, matrix
+
+
+def snapshot_embeddings(conn, all_chunks=ALL_CHUNKS, only_new=False):
+    """Comme fetch_embeddings, depuis la copie locale (embedding_snapshot.py) synchronisée d'abord.
+
+    Seuls les chunks modifiés depuis la dernière synchro passent par le réseau ;
+    avec --all, la matrice est le memmap de la copie (pas de chargement).
+    """
+    stats = embedding_snapshot.sync(conn)
+    print(f"🗂   Copie locale : synchro {stats['mode']} en {stats['seconds']:.0f}s ({stats['fetched']} chunks relus).")
+    snap = embedding_snapshot.EmbeddingSnapshot()
+    chunk_ids = None
+    if only_new:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id::text FROM chunks WHERE umap_x IS NULL AND embedding IS NOT NULL"
+                " AND (is_temp = false OR is_temp IS NULL)"
+            )
+            chunk_ids = [r[0] for r in cur.fetchall()]
+    ids, matrix = snap.select(first_only=not all_chunks, chunk_ids=chunk_ids)
+    print(f"✅  {len(ids)} embeddings lus dans la copie locale.")
+    return ids, matrix
+
+
+def compute_umap(matrix, ids=None):
+    """Refit complet : (coordonnées, reducer ajusté).
+
+    Avec les ids et au moins KNN_MIN_POINTS points, le graphe kNN vient du cache
+    knn_graph (construit une fois par état du corpus) et UMAP ne le recalcule pas.
+    """
+    n = len(matrix)
+    matrix = np.asarray(matrix, dtype=np.float32)  # déjà float32 : pas de copie
+    extra = {}
+    if ids is not None and n >= KNN_MIN_POINTS and not NO_KNN_CACHE:
+        graph = get_graph(ids, matrix, k=UMAP_PARAMS["n_neighbors"])
+        extra["precomputed_knn"] = (np.array(graph.indices), np.array(graph.distances), graph.search_index())
     print(f"🔄  Calcul UMAP sur {n} points...")
-    matrix = np.array(embeddings, dtype=np.float32)
-    reducer = umap.UMAP(
-        n_components=2,
-        n_neighbors=15,
-        min_dist=0.1,
-        metric="cosine",
-        verbose=True,
-    )
+    reducer = umap.UMAP(**UMAP_PARAMS, **extra, verbose=True)
     coords = reducer.fit_transform(matrix)
     print("✅  UMAP calculé.")
+    return coords, reducer
+
+
+# ── Modèle persistant (--incremental) ─────────────────────────────────────────
+
+def save_model(reducer, ids, all_chunks):
+    """reducer.pkl + train_ids.npy + meta.json dans UMAP_MODEL_DIR, remplacés d'un coup.
+
+    Le reducer garde ses données d'entraînement (transform cherche leurs voisins) :
+    compter ~la taille de la matrice sur disque (1,3 Go avec --all).
+    """
+    UMAP_MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    t0 = time.monotonic()
+    meta = {
+        "all_chunks": all_chunks,
+        "n_train": len(ids),
+        "fitted_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "params": UMAP_PARAMS,
+        "umap_version": getattr(umap, "__version__", None),
+    }
+    files = {
+        "reducer.pkl": lambda f: pickle.dump(reducer, f, protocol=pickle.HIGHEST_PROTOCOL),
+        "train_ids.npy": lambda f: np.save(f, np.asarray(ids, dtype="U36")),
+        "meta.json": lambda f: f.write(json.dumps(meta, indent=2).encode()),
+    }
+    for name, write in files.items():
+        tmp = UMAP_MODEL_DIR / f"{name}.tmp"
+        with open(tmp, "wb") as f:
+            write(f)
+    for name in files:
+        os.replace(UMAP_MODEL_DIR / f"{name}.tmp", UMAP_MODEL_DIR / name)
+    size = (UMAP_MODEL_DIR / "reducer.pkl").stat().st_size
+    print(f"💾  Reducer enregistré dans {UMAP_MODEL_DIR} ({size / 1e6:.0f} Mo, {time.monotonic() - t0:.0f}s).")
+
+
+def load_model():
+    """(reducer, meta) du dernier refit complet, sinon arrêt."""
+    meta_path = UMAP_MODEL_DIR / "meta.json"
+    if not meta_path.exists():
+        sys.exit(f"❌  Aucun reducer dans {UMAP_MODEL_DIR} : lancer d'abord un calcul complet (sans --incremental).")
+    meta = json.loads(meta_path.read_text())
+    with open(UMAP_MODEL_DIR / "reducer.pkl", "rb") as f:
+        reducer = pickle.load(f)
+    print(f"📂  Reducer du {meta['fitted_at']} ({meta['n_train']} points, {'--all' if meta['all_chunks'] else '1 chunk/doc'}).")
+    return reducer, meta
+
+
+def project_new(matrix, reducer):
+    """Place de nouveaux points dans la carte existante sans la modifier."""
+    print(f"🔄  Projection de {len(matrix)} nouveaux points...")
+    coords = reducer.transform(np.asarray(matrix, dtype=np.float32))
+    print("✅  Projection terminée.")
     return coords
 
 
-def write_back(conn, ids, coords):
+def _write_back_batch(conn, ids, coords):
+    """Ancien chemin : UPDATE ligne à ligne (execute_batch, UPDATE_BATCH par aller-retour)."""
     total = len(ids)
     batches = math.ceil(total / UPDATE_BATCH)
-    print(f"💾  Écriture de {total} coordonnées en {batches} batches...")
-
     with conn.cursor() as cur:
         for b in range(batches):
             start = b * UPDATE_BATCH
@@ -108,16 +239,70 @@ def write_back(conn, ids, coords):
             )
             pct = round(end / total * 100)
             print(f"   batch {b + 1}/{batches} ({pct}%)", end="\r")
+    print()
+    return total
+
+
+def _write_back_copy(conn, ids, coords):
+    """COPY dans une table temporaire (non journalisée), puis un seul UPDATE … FROM.
 
-    print(f"\n✅  {total} chunks mis à jour.")
+    Une transaction : la carte change d'un coup. Les lignes dont les coordonnées
+    n'ont pas bougé ne sont pas réécrites ; les triggers FTS de chunks ne se
+    déclenchent que sur content / content_fr, et le contenu TOASTé n'est pas recopié.
+    """
+    total = len(ids)
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("CREATE TEMP TABLE umap_stage (id uuid, x float8, y float8) ON COMMIT DROP")
+            for start in range(0, total, COPY_BATCH):
+                end = min(start + COPY_BATCH, total)
+                xy = coords[start:end].astype(np.float64).tolist()
+                buf = io.StringIO("".join(f"{ids[i]}\t{x!r}\t{y!r}\n" for i, (x, y) in zip(range(start, end), xy)))
+                cur.copy_expert("COPY umap_stage (id, x, y) FROM STDIN", buf)
+                print(f"   COPY {end}/{total} ({round(end / total * 100)}%)", end="\r")
+            print()
+            cur.execute("ANALYZE umap_stage")
+            cur.execute(
+                "UPDATE chunks c SET umap_x = s.x, umap_y = s.y FROM umap_stage s"
+                " WHERE c.id = s.id AND (c.umap_x IS DISTINCT FROM s.x OR c.umap_y IS DISTINCT FROM s.y)"
+            )
+            updated = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+    return updated
+
+
+def write_back(conn, ids, coords):
+    mode = "batch" if BATCH_WRITE else "copy"
+    print(f"💾  Écriture de {len(ids)} coordonnées (mode {mode})...")
+    t0 = time.monotonic()
+    updated = (_write_back_batch if BATCH_WRITE else _write_back_copy)(conn, ids, coords)
+    dt = time.monotonic() - t0
+    print(f"✅  {updated} chunks mis à jour en {dt:.1f}s (mode {mode}, {len(ids) / max(dt, 1e-9):.0f} lignes/s).")
 
 
 def main():
     conn = get_conn()
-    ids, embeddings = fetch_embeddings(conn)
-    if not ids:
-        sys.exit("❌  Aucun embedding trouvé en base.")
-    coords = compute_umap(embeddings)
+    fetch = snapshot_embeddings if SNAPSHOT else fetch_embeddings
+    if INCREMENTAL:
+        reducer, meta = load_model()
+        ids, matrix = fetch(conn, all_chunks=meta["all_chunks"], only_new=True)
+        if not ids:
+            conn.close()
+            print("✅  Aucun nouveau chunk à placer.")
+            return
+        coords = project_new(matrix, reducer)
+    else:
+        ids, matrix = fetch(conn)
+        if not ids:
+            sys.exit("❌  Aucun embedding trouvé en base.")
+        coords, reducer = compute_umap(matrix, ids)
+        save_model(reducer, ids, ALL_CHUNKS)
     write_back(conn, ids, coords)
     conn.close()
     print("🎉  compute_umap.py terminé.")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Connexion Postgres directe (SUPABASE_DB_URL) commune aux scripts de maintenance.
+
+ingest.py passe par PostgREST (supabase-py) ; les scripts qui lisent ou réécrivent
+en masse (COPY, index HNSW, empreintes, UMAP, copie locale des embeddings) ouvrent
+une connexion psycopg2 sur SUPABASE_DB_URL, lue dans .env.local (ou .env) à la
+racine du projet si elle n'est pas déjà dans l'environnement.
+
+Usage :
+    from db_conn import MAINTENANCE_MEM, get_conn, get_db_url
+    conn = get_conn()                   # autocommit, sans statement_timeout
+    db_url = get_db_url("--writer copy")  # pour ouvrir ses propres connexions
+"""
+import os
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+
+
+def load_env() -> None:
+    """Charge .env.local (ou .env) sans écraser les variables déjà définies."""
+    env_path = project_root / ".env.local"
+    if not env_path.exists():
+        env_path = project_root / ".env"
+    if env_path.exists():
+        from dotenv import load_dotenv
+        load_dotenv(env_path)
+
+
+load_env()  # avant les constantes : INGEST_MAINTENANCE_WORK_MEM peut venir de .env.local
+
+MAINTENANCE_MEM = os.environ.get("INGEST_MAINTENANCE_WORK_MEM") or "2GB"  # construction d'index HNSW (--bulk-index, --reindex)
+
+
+def get_db_url(required_for: str = "") -> str:
+    """SUPABASE_DB_URL, ou sortie en erreur si elle manque (required_for : option qui l'exige)."""
+    db_url = (os.environ.get("SUPABASE_DB_URL") or "").strip()
+    if not db_url:
+        hint = f" (requis pour {required_for})" if required_for else ""
+        sys.exit(f"❌  SUPABASE_DB_URL manquant dans .env.local{hint}")
+    return db_url
+
+
+def get_conn(required_for: str = ""):
+    """Connexion psycopg2 en autocommit, statement_timeout désactivé (requêtes longues)."""
+    import psycopg2
+
+    conn = psycopg2.connect(get_db_url(required_for))
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("SET statement_timeout = 0;")
+    return conn
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Empreintes des documents pour ingest.py : même article sous un autre fichier.
+
+Preprint et version publiée, copie dans data/pdfs et dans « Articles auteur »,
+doublons __dup laissés par reorganize_pdfs.py : quand le DOI n'est pas extrait (ou
+diffère), la dédup DOI / storage_path ne voit rien. Juste après l'extraction, le
+début du texte (HEAD_CHARS, les premières pages) reçoit une signature MinHash sur
+les trigrammes de mots (chunk_fingerprints.minhash : minuscules, chiffres → 0) ;
+un document dont le Jaccard estimé avec un document déjà indexé atteint
+NEAR_JACCARD est un quasi-doublon : ni chunking ni embeddings, passé en done sans
+chunks, avec ingestion_log.duplicate_of (id, storage_path, jaccard).
+
+Mesuré sur les 10 000 premiers caractères : documents sans rapport ~0,0–0,03 ;
+même texte avec 1 à 6 % de mots modifiés et un en-tête d'éditeur ajouté 0,5–0,9.
+Candidats par LSH : bandes de BAND_ROWS = 2 minima (Jaccard 0,5 → candidat à
+99,99 % ; il y a peu de documents, la vérification Jaccard ne coûte rien).
+
+La signature est gardée à deux endroits :
+  - documents.text_minhash (int4[], écrit à l'insert du document) : la référence ;
+  - data/.doc_fingerprints.sqlite (ou DOC_FINGERPRINTS_PATH) : index LSH local
+    lu par ingest.py, reconstruit depuis la base avec --rebuild.
+
+Usage :
+    index = DocumentFingerprintIndex()
+    sig = document_minhash(full_text)
+    index.forget(rel_path)
+    match = index.find(sig, alive=lambda path: ...)    # (storage_path, jaccard) ou None
+    index.add(rel_path, sig)
+
+    cd scripts && python3 doc_fingerprints.py --stats
+    cd scripts && python3 doc_fingerprints.py --rebuild     # index local depuis documents.text_minhash (SUPABASE_DB_URL)
+"""
+import argparse
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+
+from chunk_fingerprints import MINHASH_SEED, NUM_PERM, band_keys, jaccard, minhash
+
+project_root = Path(__file__).resolve().parent.parent
+
+DEFAULT_DOC_FINGERPRINTS_PATH = Path(os.environ.get("DOC_FINGERPRINTS_PATH") or project_root / "data" / ".doc_fingerprints.sqlite")
+HEAD_CHARS   = 10000  # début du texte signé (= METADATA_HEAD_CHARS d'ingest.py : disponible aussi en mode flux)
+SHINGLE      = 3      # mots par shingle
+BAND_ROWS    = 2      # minima par bande LSH
+NEAR_JACCARD = 0.5    # similarité estimée à partir de laquelle deux documents sont « le même »
+
+_PARAMS = f"minhash head={HEAD_CHARS} shingle={SHINGLE} perm={NUM_PERM} seed={MINHASH_SEED} rows={BAND_ROWS}"
+
+
+def document_minhash(text: str) -> object:
+    """Signature du début du texte (None s'il n'a aucun mot)."""
+    return minhash(text[:HEAD_CHARS], SHINGLE)
+
+
+def to_db(sig: object) -> object:
+    """Signature → valeur de documents.text_minhash (minima < 2^31 - 1 : tiennent dans un int4)."""
+    return None if sig is None else [int(v) for v in sig]
+
+
+def from_db(values: object) -> object:
+    if not values or len(values) != NUM_PERM:
+        return None  # absente, ou calculée avec d'autres paramètres
+    return np.asarray(values, dtype=np.uint32)
+
+
+class DocumentFingerprintIndex:
+    def __init__(self, path: Path = DEFAULT_DOC_FINGERPRINTS_PATH, near_jaccard: float = NEAR_JACCARD):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.near_jaccard = near_jaccard
+        # Utilisé par le thread principal d'ingest.py seulement (préparation des documents).
+        self._db = sqlite3.connect(str(path))
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS docs (path TEXT PRIMARY KEY, sig BLOB NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS bands (key INTEGER NOT NULL, path TEXT NOT NULL, PRIMARY KEY (key, path)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_bands_path ON bands (path)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT NOT NULL)")
+        row = self._db.execute("SELECT v FROM meta WHERE k = 'params'").fetchone()
+        if row is not None and row[0] != _PARAMS:
+            print("  [empreintes documents] paramètres MinHash modifiés : index vidé (--rebuild pour le remplir).", flush=True)
+            self.clear()
+        self._db.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('params', ?)", (_PARAMS,))
+        self._db.commit()
+
+    def forget(self, path: str) -> None:
+        """Oublie un document (ré-ingestion : il ne doit pas se trouver lui-même)."""
+        self._db.execute("DELETE FROM docs WHERE path = ?", (path,))
+        self._db.execute("DELETE FROM bands WHERE path = ?", (path,))
+        self._db.commit()
+
+    def find(self, sig: np.ndarray, alive=None) -> object:
+        """(storage_path, jaccard) du document indexé le plus proche au-delà du seuil, sinon None.
+
+        alive(path) : écarte les documents qui ne sont plus en base (supprimés, en erreur).
+        """
+        keys = band_keys(sig, BAND_ROWS)
+        rows = self._db.execute(
+            "SELECT DISTINCT d.path, d.sig FROM bands b JOIN docs d ON d.path = b.path"
+            f" WHERE b.key IN ({','.join('?' * len(keys))})",
+            keys,
+        ).fetchall()
+        best = None
+        for path, blob in rows:
+            score = jaccard(np.frombuffer(blob, dtype=np.uint32), sig)
+            if score >= self.near_jaccard and (best is None or score > best[1]) and (alive is None or alive(path)):
+                best = (path, score)
+        return best
+
+    def add(self, path: str, sig: np.ndarray) -> None:
+        self._db.execute("INSERT OR REPLACE INTO docs (path, sig) VALUES (?, ?)", (path, sig.tobytes()))
+        self._db.executemany(
+            "INSERT OR IGNORE INTO bands (key, path) VALUES (?, ?)", [(k, path) for k in band_keys(sig, BAND_ROWS)]
+        )
+        self._db.commit()
+
+    def count(self) -> int:
+        return self._db.execute("SELECT count(*) FROM docs").fetchone()[0]
+
+    def clear(self) -> None:
+        self._db.execute("DELETE FROM docs")
+        self._db.execute("DELETE FROM bands")
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
+
+
+# ── CLI ───────────────────────────────────────────────────────────────────────
+
+def rebuild(index: DocumentFingerprintIndex, db_url: str) -> None:
+    """Vide l'index local puis le remplit depuis documents.text_minhash (documents done, hors quasi-doublons).
+
+    Les documents ingérés avant la colonne n'ont pas de signature : elle est calculée
+    depuis leurs chunks (contenu concaténé par position, HEAD_CHARS premiers
+    caractères) et écrite en base. Les paires proches trouvées au passage sont
+    listées ; rien n'est supprimé.
+    """
+    import psycopg2
+
+    index.clear()
+    conn = psycopg2.connect(db_url)
+    loaded, backfilled, pairs = 0, 0, []
+    t0 = time.monotonic()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id, storage_path, text_minhash FROM public.documents"
+                " WHERE status = 'done' AND storage_path IS NOT NULL"
+                " AND (ingestion_log IS NULL OR NOT ingestion_log ? 'duplicate_of')"
+                " ORDER BY created_at, id"
+            )
+            docs = cur.fetchall()
+            for doc_id, path, values in docs:
+                sig = from_db(values)
+                if sig is None:
+                    cur.execute(
+                        "SELECT content FROM public.chunks WHERE document_id = %s ORDER BY position", (doc_id,)
+                    )
+                    head, size = [], 0
+                    for (content,) in cur:
+                        head.append(content or "")
+                        size += len(content or "") + 1
+                        if size >= HEAD_CHARS:
+                            break
+                    sig = document_minhash("\n".join(head))
+                    if sig is None:
+                        continue
+                    cur.execute("UPDATE public.documents SET text_minhash = %s WHERE id = %s", (to_db(sig), doc_id))
+                    backfilled += 1
+                match = index.find(sig)
+                if match is not None:
+                    pairs.append((path, match[0], match[1]))
+                index.add(path, sig)
+                loaded += 1
+                if loaded % 1000 == 0:
+                    conn.commit()
+                    print(f"  {loaded}/{len(docs)} documents ({time.monotonic() - t0:.0f}s)...", flush=True)
+        conn.commit()
+    finally:
+        conn.close()
+    print(
+        f"✅  {loaded} documents indexés en {time.monotonic() - t0:.0f}s "
+        f"({backfilled} signatures calculées depuis les chunks), {len(pairs)} quasi-doublons déjà en base."
+    )
+    for path, other, score in pairs:
+        print(f"  {score:.2f}  {path}  ≈  {other}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index d'empreintes des documents (quasi-doublons)")
+    parser.add_argument("--stats", action="store_true", help="Nombre de documents dans l'index local")
+    parser.add_argument("--rebuild", action="store_true", help="Reconstruit l'index depuis la base (SUPABASE_DB_URL)")
+    args = parser.parse_args()
+    if not (args.stats or args.rebuild):
+        parser.error("--stats ou --rebuild")
+
+    index = DocumentFingerprintIndex()
+    try:
+        if args.rebuild:
+            from db_conn import get_db_url
+
+            rebuild(index, get_db_url())
+        print(f"📑  {index.count()} documents dans l'index d'empreintes.")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
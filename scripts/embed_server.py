@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Service local d'embeddings : le modèle est chargé une fois, les scripts s'y connectent.
+
+Sans lui, chaque script de maintenance paie l'import de torch et le chargement du
+modèle (plusieurs secondes) et garde sa propre copie en RAM. Ici un seul processus
+tient le modèle (backend torch ou onnx, cf. embedder.py) et écoute sur un socket
+unix ; les requêtes de tous les clients sont fusionnées en micro-batches (jusqu'à
+--batch textes ou --flush-ms d'attente), comme EmbeddingBatcher dans ingest.py.
+
+Côté client : `--embed-backend server` dans ingest.py, fix_spaced_chunks.py et
+bench_ingest.py (RemoteEmbedder dans embedder.py, aucun import de torch).
+
+Protocole (une connexion persistante par client, messages préfixés par leur longueur
+sur 4 octets big-endian) :
+  requête   JSON {"op": "hello"|"encode", "model": ..., "texts": [...], "normalize": bool}
+  réponse   JSON {"ok": true, ...} ; pour "encode", suivi d'un message float32 (n × dim)
+  erreur    JSON {"ok": false, "error": ...} (JSON invalide, texts mal formés, modèle
+            différent) ; la connexion reste ouverte, sauf pour un message de plus de
+            MAX_MSG octets (longueur aberrante : plus de resynchronisation possible)
+
+Usage :
+  python3 scripts/embed_server.py                         # torch, socket data/.embed_server.sock
+  python3 scripts/embed_server.py --backend onnx --threads 4
+"""
+import argparse
+import json
+import os
+import queue
+import signal
+import socket
+import socketserver
+import struct
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from embedder import EMBED_MODEL, hf_model_id, load_embedder
+
+project_root = Path(__file__).resolve().parent.parent
+
+SOCKET_PATH = Path(os.environ.get("EMBED_SERVER_SOCKET") or project_root / "data" / ".embed_server.sock")
+BATCH       = 256    # textes max par forward pass, tous clients confondus
+FLUSH_MS    = 20     # attente max pour compléter un batch
+MAX_MSG     = 64 << 20  # octets max d'une requête
+
+
+# ── Framing ──────────────────────────────────────────────────────────────────
+
+def send_msg(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(struct.pack("!I", len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        part = sock.recv(min(n - len(buf), 1 << 20))
+        if not part:
+            raise ConnectionError("connexion fermée")
+        buf += part
+    return bytes(buf)
+
+
+def recv_msg(sock: socket.socket, limit: int = 0) -> bytes:
+    """Message suivant ; ValueError si limit > 0 et que la longueur annoncée le dépasse."""
+    (n,) = struct.unpack("!I", _recv_exact(sock, 4))
+    if 0 < limit < n:
+        raise ValueError(f"message de {n} octets (max {limit})")
+    return _recv_exact(sock, n)
+
+
+# ── Micro-batching ───────────────────────────────────────────────────────────
+
+class Request:
+    def __init__(self, texts: list, normalize: bool):
+        self.texts = texts
+        self.normalize = normalize
+        self.done = threading.Event()
+        self.vectors = None
+        self.error = None
+
+
+class Batcher:
+    """Fusionne les requêtes de tous les clients ; un seul thread appelle le modèle."""
+
+    def __init__(self, embedder, batch_size: int, flush_s: float):
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.flush_s = flush_s
+        self.q: queue.Queue = queue.Queue()
+        self.texts = 0
+        self.batches = 0
+        self.seconds = 0.0
+        threading.Thread(target=self._loop, name="batcher", daemon=True).start()
+
+    def submit(self, texts: list, normalize: bool) -> np.ndarray:
+        req = Request(texts, normalize)
+        self.q.put(req)
+        req.done.wait()
+        if req.error is not None:
+            raise RuntimeError(req.error)
+        return req.vectors
+
+    def _loop(self) -> None:
+        while True:
+            pending = [self.q.get()]
+            size = len(pending[0].texts)
+            deadline = time.monotonic() + self.flush_s
+            while size < self.batch_size:
+                try:
+                    req = self.q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                pending.append(req)
+                size += len(req.texts)
+            for normalize in (False, True):
+                group = [r for r in pending if r.normalize == normalize]
+                if group:
+                    self._encode(group, normalize)
+
+    def _encode(self, group: list, normalize: bool) -> None:
+        texts = [t for r in group for t in r.texts]
+        t0 = time.monotonic()
+        try:
+            vectors = np.asarray(self.embedder.encode(
+                texts, batch_size=max(1, min(len(texts), self.batch_size)),
+                show_progress_bar=False, normalize_embeddings=normalize,
+            ), dtype=np.float32)
+        except Exception as e:
+            for r in group:
+                r.error = str(e)[:1000]
+                r.done.set()
+            return
+        self.seconds += time.monotonic() - t0
+        self.texts += len(texts)
+        self.batches += 1
+        start = 0
+        for r in group:
+            r.vectors = vectors[start:start + len(r.texts)]
+            start += len(r.texts)
+            r.done.set()
+
+
+# ── Serveur ──────────────────────────────────────────────────────────────────
+
+def parse_request(frame: bytes) -> dict:
+    """Requête JSON validée ; ValueError (JSONDecodeError compris) si elle est mal formée."""
+    req = json.loads(frame)
+    if not isinstance(req, dict):
+        raise ValueError("objet JSON attendu")
+    texts = req.get("texts") or []
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        raise ValueError("texts : liste de chaînes attendue")
+    return req
+
+
+class Handler(socketserver.BaseRequestHandler):
+    def error(self, message: str) -> None:
+        send_msg(self.request, json.dumps({"ok": False, "error": message}).encode())
+
+    def handle(self) -> None:
+        server = self.server
+        while True:
+            try:
+                frame = recv_msg(self.request, MAX_MSG)
+            except ValueError as e:
+                self.error(str(e))
+                return
+            except (ConnectionError, OSError):
+                return
+            try:
+                req = parse_request(frame)
+            except ValueError as e:  # un texts mal formé ferait échouer le batch des autres clients
+                self.error(f"requête invalide : {e}")
+                continue
+            if req.get("model") and hf_model_id(req["model"]) != hf_model_id(server.model_name):
+                self.error(f"modèle servi : {server.model_name}, demandé : {req['model']}")
+                continue
+            if req.get("op") == "hello":
+                send_msg(self.request, json.dumps({
+                    "ok": True, "model": server.model_name, "backend": server.embedder.backend,
+                    "threads": server.embedder.threads,
+                }).encode())
+                continue
+            texts = req.get("texts") or []
+            if not texts:
+                send_msg(self.request, json.dumps({"ok": True, "n": 0, "dim": 0}).encode())
+                send_msg(self.request, b"")
+                continue
+            try:
+                vectors = server.batcher.submit(texts, bool(req.get("normalize")))
+            except Exception as e:
+                self.error(str(e))
+                continue
+            send_msg(self.request, json.dumps({"ok": True, "n": int(vectors.shape[0]), "dim": int(vectors.shape[1])}).encode())
+            send_msg(self.request, np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+
+
+class EmbedServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _clear_stale_socket(path: Path) -> None:
+    if not path.exists():
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(str(path))
+    except OSError:
+        path.unlink()  # socket d'un serveur mort
+        return
+    finally:
+        probe.close()
+    raise SystemExit(f"❌  Un serveur écoute déjà sur {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service local d'embeddings (socket unix, micro-batches)")
+    parser.add_argument("--model", default=EMBED_MODEL)
+    parser.add_argument("--backend", choices=("torch", "onnx"), default="torch")
+    parser.add_argument("--threads", type=int, default=0, help="Threads intra-op (0 = défaut du backend)")
+    parser.add_argument("--socket", type=Path, default=SOCKET_PATH, help=f"Chemin du socket (défaut: {SOCKET_PATH})")
+    parser.add_argument("--batch", type=int, default=BATCH, help=f"Textes max par batch (défaut: {BATCH})")
+    parser.add_argument("--flush-ms", type=int, default=FLUSH_MS, help=f"Attente max d'un batch incomplet (défaut: {FLUSH_MS})")
+    args = parser.parse_args()
+
+    _clear_stale_socket(args.socket)
+    args.socket.parent.mkdir(parents=True, exist_ok=True)
+    print(f"🤖  Chargement du modèle {args.model} (backend {args.backend})...", flush=True)
+    embedder = load_embedder(args.backend, args.model, args.threads)
+
+    old_umask = os.umask(0o177)  # socket créé en 0600 : aucune fenêtre entre bind et chmod
+    try:
+        server = EmbedServer(str(args.socket), Handler)
+    finally:
+        os.umask(old_umask)
+    server.model_name = args.model
+    server.embedder = embedder
+    server.batcher = Batcher(embedder, args.batch, args.flush_ms / 1000)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f"✅  Prêt sur {args.socket} ({embedder.threads} threads, batch {args.batch}, flush {args.flush_ms} ms).", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        args.socket.unlink(missing_ok=True)
+        b = server.batcher
+        rate = b.texts / b.seconds if b.seconds else 0.0
+        print(f"\n👋  Arrêt : {b.texts} textes en {b.batches} batches ({rate:.0f} textes/s).", flush=True)
+
+
+if __name__ == "__main__":
+    main()
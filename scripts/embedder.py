@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Embedder commun à ingest.py, fix_spaced_chunks.py et bench_ingest.py.
+
+Trois backends derrière la même méthode encode() (signature de SentenceTransformer.encode) :
+  torch   sentence-transformers, PyTorch fp32 (historique)
+  onnx    ONNX Runtime, modèle quantifié int8 (poids dynamiques), CPU uniquement
+  server  client du service local embed_server.py (modèle chargé une fois, partagé)
+torch et onnx font le même mean pooling sur les tokens (max 256 word-pieces) suivi
+d'une normalisation L2 (module Normalize du modèle sentence-transformers : vecteurs
+unitaires même sans normalize_embeddings) ; server renvoie ceux du backend qu'il
+charge. Le nombre de threads intra-op est fixé explicitement (--embed-threads) pour
+ne pas se battre avec les processus d'extraction d'ingest.py.
+
+Les vecteurs int8 ne sont pas bit-identiques aux vecteurs fp32 : chaque backend a
+son propre nom dans le cache disque (cache_name), et `compare` vérifie l'accord
+cosinus et les normes avec les vecteurs déjà en base avant de basculer.
+
+Modèle ONNX : exporté une fois depuis le modèle HF (torch + transformers + onnx requis
+pour l'export seulement), puis quantifié. À l'exécution : onnxruntime + tokenizers.
+Fichiers : data/.onnx/<modèle>/ (ou EMBED_ONNX_DIR).
+
+Usage :
+  python3 scripts/embedder.py export                      # exporte + quantifie le modèle
+  python3 scripts/embedder.py compare --sample 2000       # parité (vs base) + débit torch / onnx
+  python3 scripts/embedder.py compare --texts chunks.txt  # sans base : un texte par ligne
+"""
+import argparse
+import inspect
+import json
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from vector_format import parse_vector
+
+project_root = Path(__file__).resolve().parent.parent
+
+HF_ORG           = "sentence-transformers"
+EMBED_MODEL      = "all-MiniLM-L6-v2"   # nom court : clé historique du cache disque (backend torch)
+EMBED_NORMALIZE  = False                # normalize_embeddings d'ingest.py (clé du cache aussi)
+EMBED_DIM        = 384
+MAX_SEQ_LENGTH   = 256
+ONNX_DIR         = Path(os.environ.get("EMBED_ONNX_DIR") or project_root / "data" / ".onnx")
+ONNX_OPSET       = 14
+PARITY_MEAN      = 0.99   # cosinus moyen minimal onnx-int8 vs vecteurs en base
+PARITY_MIN       = 0.95   # cosinus minimal toléré sur l'échantillon
+PARITY_NORM      = 0.01   # écart max de norme (halfvec en base : ~1e-3 d'arrondi)
+BACKENDS         = ("torch", "onnx")   # backends locaux comparés par `compare`
+
+
+def hf_model_id(model_name: str) -> str:
+    """'all-MiniLM-L6-v2' → 'sentence-transformers/all-MiniLM-L6-v2' (comme SentenceTransformer)."""
+    return model_name if "/" in model_name else f"{HF_ORG}/{model_name}"
+
+
+def onnx_model_dir(model_name: str) -> Path:
+    return ONNX_DIR / re.sub(r"[^A-Za-z0-9._-]+", "_", hf_model_id(model_name))
+
+
+# ── Backends ─────────────────────────────────────────────────────────────────
+
+class TorchEmbedder:
+    backend = "torch"
+
+    def __init__(self, model_name: str, threads: int = 0):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.model.max_seq_length = MAX_SEQ_LENGTH
+        self.cache_name = model_name  # clé historique du cache disque
+        self.threads = torch.get_num_threads()
+
+    def encode(self, texts: list, batch_size: int = 32, show_progress_bar: bool = False,
+               normalize_embeddings: bool = False, **_) -> np.ndarray:
+        return np.asarray(self.model.encode(
+            texts, batch_size=batch_size, show_progress_bar=show_progress_bar,
+            normalize_embeddings=normalize_embeddings, convert_to_numpy=True,
+        ), dtype=np.float32)
+
+
+class OnnxEmbedder:
+    backend = "onnx"
+
+    def __init__(self, model_name: str, threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = onnx_model_dir(model_name)
+        model_path = model_dir / "model_int8.onnx"
+        if not model_path.exists():
+            export_onnx(model_name)
+        self.threads = threads if threads > 0 else (os.cpu_count() or 1)
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = self.threads
+        opts.inter_op_num_threads = 1
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(model_path), opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+        self.cache_name = f"{model_name}-onnx-int8-l2"  # -l2 : les anciens vecteurs non normalisés ne sont plus lus
+
+    def encode(self, texts: list, batch_size: int = 32, show_progress_bar: bool = False,
+               normalize_embeddings: bool = False, **_) -> np.ndarray:
+        out = None
+        # Tri par longueur (comme sentence-transformers) : moins de padding par batch.
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        for start in range(0, len(texts), max(1, batch_size)):
+            idx = order[start:start + batch_size]
+            encs = self.tokenizer.encode_batch([texts[i] for i in idx])
+            mask = np.array([e.attention_mask for e in encs], dtype=np.int64)
+            feeds = {
+                "input_ids":      np.array([e.ids for e in encs], dtype=np.int64),
+                "attention_mask": mask,
+                "token_type_ids": np.array([e.type_ids for e in encs], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+            m = mask[..., None].astype(np.float32)
+            emb = (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+            # Toujours, comme le module Normalize du pipeline sentence-transformers (torch).
+            emb /= np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+            if out is None:
+                out = np.empty((len(texts), emb.shape[1]), dtype=np.float32)
+            out[idx] = emb
+        return out if out is not None else np.zeros((0, 0), dtype=np.float32)
+
+
+class RemoteEmbedder:
+    """Client de embed_server.py : modèle partagé, démarrage instantané (ni torch ni poids chargés ici)."""
+
+    backend = "server"
+
+    def __init__(self, model_name: str, socket_path: object = None):
+        import socket
+        from embed_server import SOCKET_PATH
+
+        path = Path(socket_path or SOCKET_PATH)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(str(path))
+        except OSError as e:
+            raise SystemExit(f"❌  Service d'embeddings injoignable sur {path} ({e}) — lancer python3 scripts/embed_server.py")
+        self._lock = threading.Lock()
+        self.model_name = model_name
+        hello = self._request({"op": "hello"})
+        self.threads = hello["threads"]
+        self.server_backend = hello["backend"]
+        # même clé de cache que le backend servi en local
+        self.cache_name = model_name if hello["backend"] == "torch" else f"{model_name}-{hello['backend']}-int8-l2"
+
+    def _request(self, payload: dict) -> dict:
+        from embed_server import recv_msg, send_msg
+
+        send_msg(self.sock, json.dumps(dict(payload, model=self.model_name)).encode())
+        header = json.loads(recv_msg(self.sock))
+        if not header.get("ok"):
+            raise RuntimeError(header.get("error") or "erreur du service d'embeddings")
+        return header
+
+    def encode(self, texts: list, batch_size: int = 32, show_progress_bar: bool = False,
+               normalize_embeddings: bool = False, **_) -> np.ndarray:
+        from embed_server import recv_msg
+
+        with self._lock:
+            header = self._request({"op": "encode", "texts": list(texts), "normalize": bool(normalize_embeddings)})
+            data = recv_msg(self.sock)
+        return np.frombuffer(data, dtype=np.float32).reshape(header["n"], header["dim"]).copy()
+
+
+def load_embedder(backend: str, model_name: str, threads: int = 0):
+    if backend == "server":
+        return RemoteEmbedder(model_name)
+    if backend == "onnx":
+        return OnnxEmbedder(model_name, threads)
+    return TorchEmbedder(model_name, threads)
+
+
+# ── Export ONNX ──────────────────────────────────────────────────────────────
+
+def export_onnx(model_name: str) -> Path:
+    """Exporte le transformer HF en ONNX (fp32) puis le quantifie en int8 (poids)."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    hf_id = hf_model_id(model_name)
+    model_dir = onnx_model_dir(model_name)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    fp32_path = model_dir / "model.onnx"
+    int8_path = model_dir / "model_int8.onnx"
+    print(f"📦  Export ONNX de {hf_id} → {model_dir}...", flush=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(hf_id)
+    tokenizer.save_pretrained(str(model_dir))  # tokenizer.json pour le runtime (lib tokenizers)
+    model = AutoModel.from_pretrained(hf_id).eval()
+
+    class Encoder(torch.nn.Module):
+        """Arguments nommés explicites : l'ordre positionnel de forward() varie selon la version de transformers."""
+
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.inner(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids,
+            ).last_hidden_state
+
+    dummy = tokenizer(["exemple de chunk"], return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    axes = {n: {0: "batch", 1: "sequence"} for n in names}
+    axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    # torch >= 2.9 exporte par défaut via dynamo (onnxscript) : on garde l'exporteur TorchScript.
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            Encoder(model), tuple(dummy[n] for n in names), str(fp32_path),
+            input_names=names, output_names=["last_hidden_state"],
+            dynamic_axes=axes, opset_version=ONNX_OPSET, **legacy,
+        )
+    quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+    print(
+        f"✅  {fp32_path.name} ({fp32_path.stat().st_size / 1e6:.0f} Mo) → "
+        f"{int8_path.name} ({int8_path.stat().st_size / 1e6:.0f} Mo).",
+        flush=True,
+    )
+    return int8_path
+
+
+# ── Parité & débit ───────────────────────────────────────────────────────────
+
+def _fetch_sample(n: int) -> tuple:
+    """(textes, vecteurs en base) : échantillon reproductible de chunks via SUPABASE_DB_URL."""
+    import psycopg2
+    from db_conn import get_db_url
+
+    conn = psycopg2.connect(get_db_url("compare sans --texts"))
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT content, embedding::text FROM public.chunks TABLESAMPLE SYSTEM (1) REPEATABLE (42)"
+                " WHERE embedding IS NOT NULL LIMIT %s",
+                (n,),
+            )
+            rows = cur.fetchall()
+    finally:
+        conn.close()
+    texts = [r[0] for r in rows]
+    vectors = np.stack([parse_vector(r[1]) for r in rows]) if rows else np.zeros((0, EMBED_DIM), np.float32)
+    return texts, vectors
+
+
+def _cosines(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return (a * b).sum(axis=1)
+
+
+def _throughput(embedder, texts: list, batch_size: int) -> tuple:
+    embedder.encode(texts[:batch_size], batch_size=batch_size)  # échauffement
+    t0 = time.perf_counter()
+    vectors = embedder.encode(texts, batch_size=batch_size)
+    return vectors, len(texts) / (time.perf_counter() - t0)
+
+
+def compare(model_name: str, sample: int, texts_file: object, threads: int, batch_size: int) -> bool:
+    if texts_file is not None:
+        texts = [ln.strip() for ln in Path(texts_file).read_text(encoding="utf-8").splitlines() if ln.strip()][:sample]
+        reference = None
+    else:
+        texts, reference = _fetch_sample(sample)
+    print(f"📊  {len(texts)} chunks | batch {batch_size} | {threads or 'auto'} thread(s)\n")
+
+    results = {}
+    for backend in BACKENDS:
+        try:
+            embedder = load_embedder(backend, model_name, threads)
+        except ImportError as e:
+            print(f"  {backend:<6} indisponible ({e})")
+            continue
+        vectors, rate = _throughput(embedder, texts, batch_size)
+        results[backend] = vectors
+        print(f"  {backend:<6} {rate:8.1f} chunks/s  ({embedder.threads} threads)")
+
+    if reference is None:
+        reference = results.get("torch")
+        ref_label = "torch fp32"
+    else:
+        ref_label = "vecteurs en base"
+    if reference is None or "onnx" not in results:
+        print("\n⚠️   Parité non vérifiée (référence ou backend onnx indisponible).")
+        return False
+    cos = _cosines(results["onnx"], reference)
+    # Le cosinus ignore la norme : des vecteurs non normalisés passeraient le test.
+    norm_gap = np.abs(np.linalg.norm(results["onnx"], axis=1) - np.linalg.norm(reference, axis=1))
+    ok = cos.mean() >= PARITY_MEAN and cos.min() >= PARITY_MIN and norm_gap.max() <= PARITY_NORM
+    print(
+        f"\n🎯  Cosinus onnx-int8 vs {ref_label} : moyenne {cos.mean():.4f} | p1 {np.percentile(cos, 1):.4f} | "
+        f"min {cos.min():.4f} (seuils : moyenne ≥ {PARITY_MEAN}, min ≥ {PARITY_MIN})"
+    )
+    print(f"📏  Écart de norme max : {norm_gap.max():.4f} (seuil ≤ {PARITY_NORM})")
+    print("✅  Parité OK." if ok else "❌  Parité insuffisante : rester sur --embed-backend torch.")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedder torch / ONNX int8 : export et comparaison")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="Exporte et quantifie le modèle ONNX")
+    p_export.add_argument("--model", default=EMBED_MODEL)
+    p_cmp = sub.add_parser("compare", help="Parité cosinus et débit torch vs onnx")
+    p_cmp.add_argument("--model", default=EMBED_MODEL)
+    p_cmp.add_argument("--sample", type=int, default=2000, help="Chunks échantillonnés (défaut: 2000)")
+    p_cmp.add_argument("--texts", help="Fichier texte (un chunk par ligne) au lieu de la base")
+    p_cmp.add_argument("--threads", type=int, default=0, help="Threads intra-op (0 = défaut du backend)")
+    p_cmp.add_argument("--batch", type=int, default=64, help="Taille de batch (défaut: 64)")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx(args.model)
+    elif not compare(args.model, args.sample, args.texts, args.threads, args.batch):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Cache disque des embeddings, adressé par contenu — partagé par ingest.py et
+fix_spaced_chunks.py.
+
+Un même texte de chunk donne toujours le même vecteur pour un modèle donné :
+on ne le recalcule pas. Ré-ingérer un PDF en status error/processing ou relancer
+un script de réparation ne coûte plus que les textes réellement modifiés.
+
+Clé  : (nom du modèle, flag normalize_embeddings, SHA-256 du texte).
+       Un sous-dossier par couple (modèle, normalisation), la clé stockée est le SHA-256.
+Stockage (par sous-dossier) :
+  vectors.f32   fichier float32 append-only, lu en memmap (1 ligne = 1 vecteur)
+  index.sqlite  index compact : sha256 (32 octets) → slot, last_used
+Éviction : quand vectors.f32 dépasse max_bytes, on compacte en gardant les
+vecteurs les plus récemment utilisés (COMPACT_RATIO de la taille max).
+
+Usage :
+    cache = EmbeddingCache("all-MiniLM-L6-v2", normalize=False, dim=384)
+    vectors = encode_cached(model, texts, cache, show_progress_bar=False)
+    print(cache.summary())
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).resolve().parent.parent
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("EMBED_CACHE_DIR") or project_root / "data" / ".embed_cache")
+DEFAULT_MAX_MB    = int(os.environ.get("EMBED_CACHE_MAX_MB") or 2048)
+COMPACT_RATIO     = 0.8   # après éviction, le fichier occupe 80 % de max_bytes
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8", "surrogatepass")).digest()
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        model_name: str,
+        normalize: bool,
+        dim: int,
+        root: Path = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+    ):
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name)
+        self.dir = Path(root) / f"{slug}-norm{int(bool(normalize))}"
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.row_bytes = dim * 4
+        self.max_rows = max(1, max_bytes // self.row_bytes)
+        self.vectors_path = self.dir / "vectors.f32"
+        self.vectors_path.touch(exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._mmap = None
+        self._mmap_rows = 0
+        # check_same_thread=False : l'étage embeddings d'ingest.py tourne dans un thread dédié.
+        self._db = sqlite3.connect(str(self.dir / "index.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key BLOB PRIMARY KEY, slot INTEGER NOT NULL, last_used INTEGER NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v INTEGER NOT NULL)")
+        self._db.commit()
+        self._clock = self._meta("clock")
+        self._drop_orphans()
+
+    # ── Interne ───────────────────────────────────────────────────────────────
+
+    def _meta(self, k: str) -> int:
+        row = self._db.execute("SELECT v FROM meta WHERE k = ?", (k,)).fetchone()
+        return row[0] if row else 0
+
+    def _rows_on_disk(self) -> int:
+        return self.vectors_path.stat().st_size // self.row_bytes
+
+    def _drop_orphans(self) -> None:
+        """Remet l'index et le fichier en cohérence après un crash (append ou compaction interrompus)."""
+        if self._meta("compacting"):
+            print("  [cache] compaction interrompue détectée : cache vidé.", flush=True)
+            self._db.execute("DELETE FROM entries")
+            self._db.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('compacting', 0)")
+            with open(self.vectors_path, "wb"):
+                pass
+        rows = self._rows_on_disk()
+        if self.vectors_path.stat().st_size != rows * self.row_bytes:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(rows * self.row_bytes)
+        self._db.execute("DELETE FROM entries WHERE slot >= ?", (rows,))
+        self._db.commit()
+
+    def _matrix(self) -> np.ndarray:
+        rows = self._rows_on_disk()
+        if self._mmap is None or rows != self._mmap_rows:
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+            self._mmap_rows = rows
+        return self._mmap
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    # ── API ───────────────────────────────────────────────────────────────────
+
+    def get_many(self, texts: list) -> tuple:
+        """Retourne (vectors (n, dim) float32, indices des textes absents du cache)."""
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        keys = [text_key(t) for t in texts]
+        with self._lock:
+            found: dict = {}
+            for i in range(0, len(keys), 500):
+                part = list(set(keys[i:i + 500]))
+                q = f"SELECT key, slot FROM entries WHERE key IN ({','.join('?' * len(part))})"
+                found.update(self._db.execute(q, part).fetchall())
+            matrix = self._matrix() if found else None
+            missing = []
+            for i, k in enumerate(keys):
+                slot = found.get(k)
+                if slot is None:
+                    missing.append(i)
+                else:
+                    out[i] = matrix[slot]
+            if found:
+                now = self._tick()
+                self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                self._db.commit()
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return out, missing
+
+    def put_many(self, texts: list, vectors) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(texts), self.dim)
+        with self._lock:
+            known = set()
+            keys = [text_key(t) for t in texts]
+            for i in range(0, len(keys), 500):
+                part = list(set(keys[i:i + 500]))
+                q = f"SELECT key FROM entries WHERE key IN ({','.join('?' * len(part))})"
+                known.update(r[0] for r in self._db.execute(q, part).fetchall())
+            new_rows, entries, seen = [], [], set()
+            start = self._rows_on_disk()
+            now = self._tick()
+            for k, vec in zip(keys, vectors):
+                if k in known or k in seen:
+                    continue
+                seen.add(k)
+                entries.append((k, start + len(new_rows), now))
+                new_rows.append(vec)
+            if not new_rows:
+                return
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.stack(new_rows).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self._db.executemany("INSERT OR REPLACE INTO entries (key, slot, last_used) VALUES (?, ?, ?)", entries)
+            self._db.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('clock', ?)", (self._clock,))
+            self._db.commit()
+            if start + len(new_rows) > self.max_rows:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Réécrit vectors.f32 avec les entrées les plus récemment utilisées (appelé sous verrou)."""
+        keep = int(self.max_rows * COMPACT_RATIO)
+        rows = self._db.execute(
+            "SELECT key, slot, last_used FROM entries ORDER BY last_used DESC LIMIT ?", (keep,)
+        ).fetchall()
+        rows.sort(key=lambda r: r[1])  # lecture séquentielle du memmap
+        matrix = self._matrix()
+        tmp = self.vectors_path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            for i in range(0, len(rows), 4096):
+                slots = [r[1] for r in rows[i:i + 4096]]
+                f.write(np.ascontiguousarray(matrix[slots]).tobytes())
+        self._mmap, self._mmap_rows = None, 0
+        # Fenêtre entre os.replace et commit : un crash ici laisserait des slots faux.
+        # Le flag "compacting" permet de la détecter à l'ouverture suivante (→ cache vidé).
+        self._db.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('compacting', 1)")
+        self._db.commit()
+        self._db.execute("DELETE FROM entries")
+        self._db.executemany(
+            "INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+            [(k, i, used) for i, (k, _, used) in enumerate(rows)],
+        )
+        os.replace(tmp, self.vectors_path)
+        self._db.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('compacting', 0)")
+        self._db.commit()
+        print(f"  [cache] éviction : {len(rows)} vecteurs conservés (max {self.max_rows}).", flush=True)
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = 100 * self.hits / total if total else 0.0
+        return f"{self.hits} hits / {self.misses} calculés ({rate:.0f} % servis par le cache, {self._rows_on_disk()} vecteurs sur disque)"
+
+    def close(self) -> None:
+        with self._lock:
+            self._mmap = None
+            self._db.close()
+
+
+def encode_cached(model, texts: list, cache, **encode_kwargs) -> np.ndarray:
+    """model.encode() qui ne calcule que les textes absents du cache. cache=None → encode direct."""
+    if cache is None:
+        return np.asarray(model.encode(texts, **encode_kwargs), dtype=np.float32)
+    vectors, missing = cache.get_many(texts)
+    if missing:
+        todo = [texts[i] for i in missing]
+        computed = np.asarray(model.encode(todo, **encode_kwargs), dtype=np.float32)
+        vectors[missing] = computed
+        cache.put_many(todo, computed)
+    return vectors
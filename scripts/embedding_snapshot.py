@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Copie locale des embeddings des chunks, en colonnes memmap, synchronisée par filigrane.
+
+UMAP, audits, clustering : chaque job hors ligne relisait les 848k vecteurs depuis
+Postgres. Ce script les range une fois sous data/.embed_snapshot (ou
+EMBED_SNAPSHOT_DIR), une colonne par fichier .npy, lignes triées par id :
+  - ids.npy          : U36, ids des chunks (triés : recherche par searchsorted) ;
+  - document_ids.npy : U36 ;
+  - positions.npy    : int32 ;
+  - embeddings.npy   : float32 (n, 384) ;
+  - meta.json        : n, filigrane, date et durée de la dernière synchro.
+Périmètre : chunks avec embedding, hors chunks temporaires (is_temp) — les
+sections FTS seule (embedding NULL) n'y sont pas.
+
+Ouverture en memmap (EmbeddingSnapshot) : rien n'est lu avant usage, un job
+démarre sans temps de chargement.
+
+Synchro (--sync) : relit seulement les chunks dont embedding_updated_at (migration
+20261018140000) dépasse le filigrane précédent moins SYNC_OVERLAP (transactions
+encore ouvertes au moment du filigrane), plus la liste des ids en base pour
+retirer les chunks supprimés ; un chunk du périmètre absent de la copie (colonne
+ajoutée après coup, trigger contourné) est relu par id. Les fichiers sont réécrits
+dans un répertoire temporaire puis échangés d'un coup : un lecteur en cours garde
+l'ancienne version.
+
+Usage :
+    snap = EmbeddingSnapshot()
+    ids, matrix = snap.select(first_only=True)       # 1 chunk/doc (position 0), copie
+    ids, matrix = snap.select()                      # tout : matrix est le memmap
+    rows = snap.rows(["<chunk_id>", ...])            # lignes de ces chunks (-1 si absents)
+
+    cd scripts && python3 embedding_snapshot.py --sync          # crée ou met à jour la copie
+    cd scripts && python3 embedding_snapshot.py --sync --full   # réexport complet
+    cd scripts && python3 embedding_snapshot.py --stats
+
+Prérequis : SUPABASE_DB_URL.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from vector_format import decode_send_rows, send_function
+
+project_root = Path(__file__).resolve().parent.parent
+
+DEFAULT_SNAPSHOT_DIR = Path(os.environ.get("EMBED_SNAPSHOT_DIR") or project_root / "data" / ".embed_snapshot")
+EMBED_DIM    = 384
+FETCH_PAGE   = 20000         # lignes par aller-retour du curseur serveur
+ID_BATCH     = 10000         # ids par requête pour les chunks relus par id
+SYNC_OVERLAP = "10 minutes"  # marge sous le filigrane : transactions validées après lui
+SCOPE_SQL    = "embedding IS NOT NULL AND (is_temp = false OR is_temp IS NULL)"
+
+_COLUMNS = ("ids", "document_ids", "positions", "embeddings")
+
+
+class EmbeddingSnapshot:
+    def __init__(self, path: Path = DEFAULT_SNAPSHOT_DIR):
+        self.path = Path(path)
+        if not (self.path / "meta.json").exists():
+            raise FileNotFoundError(f"pas de copie des embeddings dans {self.path} (embedding_snapshot.py --sync)")
+        self.meta = json.loads((self.path / "meta.json").read_text())
+        self.ids = np.load(self.path / "ids.npy", mmap_mode="r")
+        self.document_ids = np.load(self.path / "document_ids.npy", mmap_mode="r")
+        self.positions = np.load(self.path / "positions.npy", mmap_mode="r")
+        self.embeddings = np.load(self.path / "embeddings.npy", mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows(self, chunk_ids) -> np.ndarray:
+        """Ligne de chaque id dans la copie (-1 si absent)."""
+        chunk_ids = np.asarray(chunk_ids, dtype="U36")
+        rows = np.searchsorted(self.ids, chunk_ids)
+        found = rows < len(self.ids)
+        found[found] = self.ids[rows[found]] == chunk_ids[found]
+        return np.where(found, rows, -1)
+
+    def select(self, first_only: bool = False, chunk_ids=None) -> tuple:
+        """(ids, matrice) triés par id : tout (memmap, sans copie), 1 chunk/doc, ou ces chunks."""
+        if chunk_ids is None and not first_only:
+            return self.ids.tolist(), self.embeddings
+        mask = np.ones(len(self.ids), dtype=bool) if chunk_ids is None else np.zeros(len(self.ids), dtype=bool)
+        if chunk_ids is not None:
+            rows = self.rows(chunk_ids)
+            mask[rows[rows >= 0]] = True
+        if first_only:
+            mask &= np.asarray(self.positions) == 0
+        rows = np.flatnonzero(mask)
+        return self.ids[rows].tolist(), np.asarray(self.embeddings[rows], dtype=np.float32)
+
+
+# ── Lecture en base ───────────────────────────────────────────────────────────
+
+def _fetch(conn, send: str, dtype: str, where: str, params: tuple, out_dir: object = None) -> dict:
+    """Colonnes des chunks qui vérifient where, triés par id (dans out_dir en memmap si donné)."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM public.chunks WHERE {where}", params)
+        total = cur.fetchone()[0]
+    if out_dir is None:
+        cols = {
+            "ids": np.empty(total, dtype="U36"),
+            "document_ids": np.empty(total, dtype="U36"),
+            "positions": np.empty(total, dtype=np.int32),
+            "embeddings": np.empty((total, EMBED_DIM), dtype=np.float32),
+        }
+    else:
+        open_memmap = np.lib.format.open_memmap
+        cols = {
+            "ids": open_memmap(out_dir / "ids.npy", mode="w+", dtype="U36", shape=(total,)),
+            "document_ids": open_memmap(out_dir / "document_ids.npy", mode="w+", dtype="U36", shape=(total,)),
+            "positions": open_memmap(out_dir / "positions.npy", mode="w+", dtype=np.int32, shape=(total,)),
+            "embeddings": open_memmap(out_dir / "embeddings.npy", mode="w+", dtype=np.float32, shape=(total, EMBED_DIM)),
+        }
+    t0 = time.monotonic()
+    done = 0
+    with conn.cursor(name="embedding_snapshot") as cur:
+        cur.itersize = FETCH_PAGE
+        cur.execute(
+            f"SELECT id::text, document_id::text, position, {send}(embedding) FROM public.chunks"
+            f" WHERE {where} ORDER BY id",
+            params,
+        )
+        while True:
+            rows = cur.fetchmany(FETCH_PAGE)
+            if not rows:
+                break
+            end = done + len(rows)
+            cols["ids"][done:end] = [r[0] for r in rows]
+            cols["document_ids"][done:end] = [r[1] for r in rows]
+            cols["positions"][done:end] = [r[2] for r in rows]
+            decode_send_rows([r[3] for r in rows], EMBED_DIM, dtype, cols["embeddings"][done:end])
+            done = end
+            if total > FETCH_PAGE:
+                print(f"   {done}/{total} ({round(done / total * 100)}%, {time.monotonic() - t0:.0f}s)", end="\r", flush=True)
+    if total > FETCH_PAGE:
+        print()
+    return cols
+
+
+def _fetch_ids(conn, send: str, dtype: str, chunk_ids: np.ndarray) -> dict:
+    parts = [
+        _fetch(conn, send, dtype, f"{SCOPE_SQL} AND id = ANY(%s::uuid[])", (chunk_ids[i:i + ID_BATCH].tolist(),))
+        for i in range(0, len(chunk_ids), ID_BATCH)
+    ]
+    return {name: np.concatenate([p[name] for p in parts]) for name in _COLUMNS}
+
+
+def _live_ids(conn) -> np.ndarray:
+    ids = []
+    with conn.cursor(name="embedding_snapshot_ids") as cur:
+        cur.itersize = FETCH_PAGE * 5
+        cur.execute(f"SELECT id::text FROM public.chunks WHERE {SCOPE_SQL} ORDER BY id")
+        for (chunk_id,) in cur:
+            ids.append(chunk_id)
+    return np.asarray(ids, dtype="U36")
+
+
+def _merge(old: EmbeddingSnapshot, keep: np.ndarray, fresh: dict, out_dir: Path) -> int:
+    """Lignes gardées de la copie + lignes relues, triées par id, écrites dans out_dir."""
+    kept_ids = old.ids[keep]
+    ids = np.concatenate([kept_ids, fresh["ids"]])
+    order = np.argsort(ids, kind="stable")
+    ids = ids[order]
+    np.save(out_dir / "ids.npy", ids)
+    np.save(out_dir / "document_ids.npy", np.concatenate([old.document_ids[keep], fresh["document_ids"]])[order])
+    np.save(out_dir / "positions.npy", np.concatenate([old.positions[keep], fresh["positions"]])[order])
+
+    # Embeddings : placés par blocs dans le nouveau memmap, jamais toute la matrice en RAM
+    out = np.lib.format.open_memmap(out_dir / "embeddings.npy", mode="w+", dtype=np.float32, shape=(len(ids), EMBED_DIM))
+    kept_rows = np.flatnonzero(keep)
+    dest = np.searchsorted(ids, kept_ids)
+    for start in range(0, len(kept_rows), FETCH_PAGE * 5):
+        block = slice(start, start + FETCH_PAGE * 5)
+        out[dest[block]] = old.embeddings[kept_rows[block]]
+    out[np.searchsorted(ids, fresh["ids"])] = fresh["embeddings"]
+    out.flush()
+    return len(ids)
+
+
+def sync(conn, path: Path = DEFAULT_SNAPSHOT_DIR, full: bool = False) -> dict:
+    """Crée ou met à jour la copie locale ; renvoie le bilan de la synchro."""
+    path = Path(path)
+    old = None
+    if not full and (path / "meta.json").exists():
+        old = EmbeddingSnapshot(path)
+
+    t0 = time.monotonic()
+    stats = {"mode": "incrémentale" if old is not None else "complète", "fetched": 0, "removed": 0}
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    autocommit = conn.autocommit
+    conn.autocommit = False  # curseurs nommés ; un seul instantané pour toutes les lectures
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            cur.execute(
+                "SELECT format_type(atttypid, atttypmod) FROM pg_attribute"
+                " WHERE attrelid = 'public.chunks'::regclass AND attname = 'embedding'"
+            )
+            send, dtype = send_function(cur.fetchone()[0])
+            cur.execute(
+                "SELECT 1 FROM pg_attribute WHERE attrelid = 'public.chunks'::regclass"
+                " AND attname = 'embedding_updated_at' AND NOT attisdropped"
+            )
+            has_watermark = cur.fetchone() is not None
+            cur.execute("SELECT now()")  # début de la transaction : tout ce qui précède est visible
+            watermark = cur.fetchone()[0]
+
+        if old is not None and not has_watermark:
+            print("  [snapshot] colonne chunks.embedding_updated_at absente : synchro complète.", flush=True)
+            old, stats["mode"] = None, "complète"
+
+        if old is None:
+            n = len(_fetch(conn, send, dtype, SCOPE_SQL, (), out_dir=tmp)["ids"])
+            stats["fetched"] = n
+        else:
+            since = old.meta["watermark"]
+            fresh = _fetch(
+                conn, send, dtype,
+                f"{SCOPE_SQL} AND embedding_updated_at > %s::timestamptz - %s::interval", (since, SYNC_OVERLAP),
+            )
+            live = _live_ids(conn)
+            keep = np.isin(old.ids, live, assume_unique=True) & ~np.isin(old.ids, fresh["ids"], assume_unique=True)
+            missing = live[~np.isin(live, np.concatenate([old.ids[keep], fresh["ids"]]), assume_unique=True)]
+            if len(missing):
+                extra = _fetch_ids(conn, send, dtype, missing)
+                fresh = {name: np.concatenate([fresh[name], extra[name]]) for name in _COLUMNS}
+            stats["fetched"] = len(fresh["ids"])
+            stats["removed"] = int(len(old.ids) - keep.sum() - np.isin(fresh["ids"], old.ids, assume_unique=True).sum())
+            if stats["fetched"] == 0 and keep.all():
+                for name in _COLUMNS:  # rien n'a changé : liens durs, pas de réécriture
+                    os.link(path / f"{name}.npy", tmp / f"{name}.npy")
+                n = len(old.ids)
+            else:
+                n = _merge(old, keep, fresh, tmp)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    finally:
+        conn.autocommit = autocommit
+
+    meta = {
+        "n": n,
+        "dim": EMBED_DIM,
+        "watermark": watermark.isoformat(),
+        "synced_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "sync_mode": stats["mode"],
+        "sync_seconds": round(time.monotonic() - t0, 1),
+    }
+    (tmp / "meta.json").write_text(json.dumps(meta, indent=2))
+    old = None  # memmaps de l'ancienne version fermés avant l'échange
+    previous = path.with_name(path.name + ".old")
+    shutil.rmtree(previous, ignore_errors=True)
+    if path.exists():
+        os.replace(path, previous)
+    os.replace(tmp, path)
+    shutil.rmtree(previous, ignore_errors=True)
+    stats.update(n=n, seconds=meta["sync_seconds"])
+    return stats
+
+
+# ── CLI ───────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Copie locale (memmap) des embeddings des chunks")
+    parser.add_argument("--sync", action="store_true", help="Crée ou met à jour la copie (SUPABASE_DB_URL)")
+    parser.add_argument("--full", action="store_true", help="Avec --sync : réexport complet")
+    parser.add_argument("--stats", action="store_true", help="Taille et filigrane de la copie")
+    args = parser.parse_args()
+    if not (args.sync or args.stats):
+        parser.error("--sync ou --stats")
+
+    if args.sync:
+        from db_conn import get_conn
+
+        conn = get_conn()
+        try:
+            stats = sync(conn, full=args.full)
+        finally:
+            conn.close()
+        print(
+            f"✅  Synchro {stats['mode']} en {stats['seconds']:.0f}s : {stats['fetched']} chunks relus, "
+            f"{stats['removed']} retirés, {stats['n']} dans la copie."
+        )
+    if args.stats:
+        try:
+            snap = EmbeddingSnapshot()
+        except FileNotFoundError as e:
+            sys.exit(f"❌  {e}")
+        size = sum(f.stat().st_size for f in snap.path.iterdir())
+        print(
+            f"🗂   {len(snap)} chunks, {len(np.unique(snap.document_ids))} documents, {size / 1e9:.2f} Go "
+            f"— filigrane {snap.meta['watermark']} (synchro {snap.meta['sync_mode']} du {snap.meta['synced_at']})."
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -18,26 +18,29 @@ Usage :
     python3 fix_spaced_chunks.py --apply
     python3 fix_spaced_chunks.py --apply --limit 500     # batch partiel
     python3 fix_spaced_chunks.py --apply --author-only   # articles auteur seulement
+    python3 fix_spaced_chunks.py --apply --no-cache      # sans le cache disque des embeddings
+    python3 fix_spaced_chunks.py --apply --embed-backend onnx   # ONNX Runtime int8
+    python3 fix_spaced_chunks.py --apply --embed-backend server # service local (démarrage instantané)
+
+Les embeddings passent par le cache disque partagé avec ingest.py
+(embedding_cache.py) : même modèle et même normalisation (EMBED_MODEL,
+EMBED_NORMALIZE d'embedder.py), une relance ne recalcule que les textes nouveaux.
 """
 
 import argparse
-import os
 import re
 import sys
 import time
-from pathlib import Path
 from typing import Optional
 
-import psycopg2
 import psycopg2.extras
-from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
 
-# ── Config ────────────────────────────────────────────────────────────────────
-load_dotenv(Path(__file__).parent.parent / ".env.local")
+from db_conn import get_conn
+from embedder import EMBED_DIM, EMBED_MODEL, EMBED_NORMALIZE, load_embedder
+from embedding_cache import EmbeddingCache, encode_cached
+from vector_format import bit_text, halfvec_text
 
-DB_URL      = os.environ.get("SUPABASE_DB_URL")
-MODEL_NAME  = "sentence-transformers/all-MiniLM-L6-v2"
+# ── Config ────────────────────────────────────────────────────────────────────
 EMBED_BATCH = 64    # chunks par batch d'embedding
 UPDATE_BATCH = 50   # chunks par batch d'update DB
 
@@ -115,19 +118,19 @@ def main():
     parser.add_argument("--apply",       action="store_true", help="Applique les corrections")
     parser.add_argument("--limit",       type=int, default=0, help="Nombre max de chunks à traiter (0 = tous)")
     parser.add_argument("--author-only", action="store_true", help="Traite uniquement les articles auteur")
+    parser.add_argument("--no-cache",    action="store_true", help="Désactive le cache disque des embeddings")
+    parser.add_argument("--embed-backend", choices=("torch", "onnx", "server"), default="torch",
+                        help="torch (défaut), onnx (ONNX Runtime int8, cf. embedder.py) ou server (embed_server.py)")
+    parser.add_argument("--embed-threads", type=int, default=0, help="Threads intra-op (0 = tous les cœurs)")
     args = parser.parse_args()
 
     if not args.dry_run and not args.apply:
         parser.print_help()
         sys.exit(1)
 
-    if not DB_URL:
-        print("ERREUR : SUPABASE_DB_URL non défini dans .env.local")
-        sys.exit(1)
-
     print(f"Connexion à la DB...")
-    conn = psycopg2.connect(DB_URL)
-    conn.autocommit = False
+    conn = get_conn("fix_spaced_chunks")
+    conn.autocommit = False  # un commit par batch d'update
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
 
     # ── 1. Compter et récupérer les chunks affectés ─────────────────────────
@@ -184,9 +187,10 @@ def main():
         return
 
     # ── 3. Apply : corriger + re-embed + update DB ───────────────────────────
-    print(f"\nChargement du modèle {MODEL_NAME}...")
-    model = SentenceTransformer(MODEL_NAME)
-    print(f"Modèle chargé.")
+    print(f"\nChargement du modèle {EMBED_MODEL} (backend {args.embed_backend})...")
+    model = load_embedder(args.embed_backend, EMBED_MODEL, args.embed_threads)
+    print(f"Modèle chargé ({model.threads} threads).")
+    cache = None if args.no_cache else EmbeddingCache(model.cache_name, EMBED_NORMALIZE, EMBED_DIM)
 
     # Filtre les chunks réellement améliorables
     to_fix = [
@@ -212,7 +216,8 @@ def main():
 
         # Génère les nouveaux embeddings
         texts      = [item["fixed"] for item in batch]
-        embeddings = model.encode(texts, normalize_embeddings=True).tolist()
+        vectors    = encode_cached(model, texts, cache, normalize_embeddings=EMBED_NORMALIZE)
+        embeddings = [(halfvec_text(e), bit_text(e)) for e in vectors]
 
         # Update DB par sous-batch
         for j in range(0, len(batch), UPDATE_BATCH):
@@ -221,8 +226,9 @@ def main():
             try:
                 for k, item in enumerate(sub):
                     cur.execute(
-                        "UPDATE public.chunks SET content = %s, embedding = %s WHERE id = %s",
-                        (item["fixed"], sub_emb[k], item["id"])
+                        "UPDATE public.chunks SET content = %s, embedding = %s::halfvec(384),"
+                        " embedding_bit = %s::bit(384) WHERE id = %s",
+                        (item["fixed"], *sub_emb[k], item["id"])
                     )
                 conn.commit()
                 fixed_count += len(sub)
@@ -240,6 +246,9 @@ def main():
     print(f"  Corrigés avec succès : {fixed_count}")
     print(f"  Erreurs              : {errors_count}")
     print(f"  Non améliorables     : {not_improvable}")
+    if cache is not None:
+        print(f"  Cache embeddings     : {cache.summary()}")
+        cache.close()
     print()
     print("Note : le trigger content_tsv a été mis à jour automatiquement.")
     print("L'index IVFFlat ne nécessite PAS de rebuild (les embeddings changent")
@@ -6,17 +6,38 @@ Ingestion Alexandria : data/pdfs/**/*.pdf → documents + chunks (Supabase).
 - Métadonnées : titre, auteurs, DOI, journal, published_at.
 - Dédup par DOI en priorité, puis par storage_path.
 - Chunking par section ou par taille.
-- Embeddings 384D (sentence-transformers). Pas de traduction EN→FR.
+- Embeddings 384D (sentence-transformers ou ONNX Runtime int8, cf. embedder.py). Pas de traduction EN→FR.
+- Pipeline par étages : extraction (pool de processus) → chunking → embeddings → writer,
+  reliés par des files bornées.
 
 Modes :
   python3 ingest.py                   # corpus général (data/pdfs2/)
   python3 ingest.py --author          # articles du chercheur (data/Articles auteur/)
+  python3 ingest.py --workers 4       # 4 processus d'extraction PDF en parallèle
+  python3 ingest.py --range-workers 6 # gros PDF (>= RANGE_MIN_PAGES pages) : 6 processus par document, par tranches de pages
+  python3 ingest.py --incremental     # seulement les PDF nouveaux/modifiés (manifest local)
+  python3 ingest.py --stream          # mode flux (mémoire bornée) pour tous les PDF
+  python3 ingest.py --no-journal      # sans journal de reprise (data/.ingest_journal.sqlite)
+  python3 ingest.py --no-dedup        # sans filtre boilerplate / quasi-doublons (chunks et documents, data/.*_fingerprints.sqlite)
+  python3 ingest.py --fts-only-sections ""  # embedde aussi References / Acknowledgments (défaut : FTS seule)
+  python3 ingest.py --embed-backend onnx  # embeddings ONNX Runtime int8 (scripts/embedder.py)
+  python3 ingest.py --embed-backend server   # service local d'embeddings (scripts/embed_server.py)
+  python3 ingest.py --writer async --inflight 8   # PostgREST asyncio, 8 batches en vol
+  python3 ingest.py --writer copy     # COPY binaire Postgres (SUPABASE_DB_URL), 1 transaction/document
+  python3 ingest.py --writer copy --bulk-index   # + DROP/rebuild de l'index HNSW autour du run
 """
 import argparse
+import collections
+import hashlib
+import itertools
+import multiprocessing
 import os
+import queue
 import re
 import sys
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
 from pathlib import Path
 
@@ -29,16 +50,41 @@ if env_path.exists():
     load_dotenv(env_path)
 
 import fitz  # PyMuPDF
+import numpy as np
 from supabase import create_client
 
+from chunk_fingerprints import ChunkFingerprintIndex
+from chunking import FTS_ONLY_SECTIONS, chunk_page, fts_only, token_counter_name
+from doc_fingerprints import DocumentFingerprintIndex, document_minhash, to_db
+from embedder import EMBED_DIM, EMBED_MODEL, EMBED_NORMALIZE, load_embedder
+from embedding_cache import EmbeddingCache, encode_cached
+from ingest_journal import IngestJournal
+from ingest_manifest import IngestManifest, file_fingerprint
+from vector_format import bit_text, halfvec_text
+
+PIPELINE_VERSION     = 3  # à incrémenter quand extraction/chunking/embedding changent (→ ré-ingestion en --incremental)
 PDF_DIR              = project_root / "data" / "pdfs2"
 AUTHOR_ARTICLES_DIR  = project_root / "data" / "Articles auteur"
-EMBED_DIM           = 384
-CHUNK_SIZE          = 600
-CHUNK_OVERLAP       = 100
 MIN_TEXT_PER_PAGE   = 50    # chars en dessous desquels on tente l'OCR
+OCR_WORKERS         = 2     # threads Tesseract par processus d'extraction
+OCR_TARGET_PX       = 2200  # pixels visés sur le grand côté d'une page OCRisée (A4 ≈ 190 dpi)
+OCR_MIN_DPI         = 100
+OCR_MAX_DPI         = 300
+METADATA_HEAD_CHARS = 10000  # les métadonnées ne lisent que le début du texte
+STREAM_MIN_PAGES    = 300   # au-delà : pages → chunks → embeddings → insert en flux
+STREAM_SEGMENT      = 256   # chunks par segment transmis à l'étage embeddings en mode flux
 INSERT_BATCH        = 50    # chunks par requête Supabase (index HNSW droppé)
 INSERT_PAUSE        = 0.1  # secondes entre chaque batch
+INSERT_INFLIGHT     = 4     # batches en vol avec --writer async (défaut de --inflight)
+EXTRACT_WORKERS     = max(1, (os.cpu_count() or 2) - 1)  # processus d'extraction (défaut de --workers)
+RANGE_MIN_PAGES     = 100   # à partir de ce nombre de pages, un PDF peut être extrait par tranches en parallèle
+RANGE_PAGES         = 25    # pages par tranche (la première, lue sur place, sert à mesurer la vitesse)
+RANGE_MIN_SECONDS   = 10.0  # temps séquentiel estimé pour le reste du PDF au-delà duquel on découpe
+RANGE_WORKERS       = EXTRACT_WORKERS  # processus par PDF découpé (défaut de --range-workers, 1 = séquentiel)
+                                       # dans un worker du pool : plafonné à cpu // --workers (pool_range_workers)
+QUEUE_SIZE          = 8     # documents en attente max entre deux étages du pipeline
+EMBED_BATCH         = 256   # chunks par forward pass, tous documents confondus (défaut de --embed-batch)
+EMBED_FLUSH_S       = 0.5   # attente max avant d'encoder un batch incomplet
 
 # Journaux connus dans le domaine chimie/magnétisme moléculaire
 _KNOWN_JOURNALS = [
@@ -68,18 +114,22 @@ _KNOWN_JOURNALS = [
 
 # ── Supabase ─────────────────────────────────────────────────────────────────
 
-def get_supabase():
+def supabase_credentials() -> tuple:
     url = (os.environ.get("NEXT_PUBLIC_SUPABASE_URL") or "").strip()
     key = (os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or "").strip()
     if not url or not key:
         sys.exit("❌  NEXT_PUBLIC_SUPABASE_URL ou SUPABASE_SERVICE_ROLE_KEY manquant dans .env.local")
-    return create_client(url, key)
+    return url, key
+
+
+def get_supabase():
+    return create_client(*supabase_credentials())
 
 
 # ── Texte & nettoyage ────────────────────────────────────────────────────────
 
 def clean(text: str) -> str:
-    return text.replace("\x00", " ").replace("", " ") if text else text
+    return text.replace("\x00", " ") if text else text
 
 
 def fix_spaced_text(s: str) -> str:
@@ -97,33 +147,229 @@ def fix_spaced_text(s: str) -> str:
     return ' '.join(''.join(w.split()) for w in words if w.strip())
 
 
-def extract_text_with_ocr_fallback(pdf_path: Path) -> tuple[str, dict[int, str], int]:
-    doc = fitz.open(pdf_path)
+def _ocr_dpi(page: fitz.Page) -> int:
+    """DPI de rendu OCR adapté à la taille de la page : ~OCR_TARGET_PX pixels sur le grand côté."""
+    long_side_in = max(page.rect.width, page.rect.height) / 72
+    if long_side_in <= 0:
+        return OCR_MAX_DPI
+    return int(min(OCR_MAX_DPI, max(OCR_MIN_DPI, OCR_TARGET_PX / long_side_in)))
+
+
+def _ocr_image(img) -> tuple[str, float]:
+    import pytesseract
+    t0 = time.monotonic()
+    text = pytesseract.image_to_string(img, lang="eng")
+    return text, time.monotonic() - t0
+
+
+def _ocr_pages(doc: fitz.Document, pages: list, page_texts: dict, ocr_log: object) -> None:
+    """OCR des pages `pages` (index 0-based) ; remplace leur texte dans page_texts."""
+    from PIL import Image
+
+    # Tesseract parallélise en interne via OpenMP : un thread par image suffit,
+    # le parallélisme vient du pool.
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    in_flight: dict = {}
+
+    def collect(fut) -> None:
+        i, dpi, render_s = in_flight.pop(fut)
+        try:
+            text, ocr_s = fut.result()
+        except Exception as e:
+            text, ocr_s = page_texts[i + 1] + f"\n[OCR non disponible: {e}]", 0.0
+        page_texts[i + 1] = text
+        if ocr_log is not None:
+            ocr_log.append({
+                "page": i + 1, "dpi": dpi,
+                "render_s": round(render_s, 3), "ocr_s": round(ocr_s, 3),
+                "chars": len(text.strip()),
+            })
+
+    with ThreadPoolExecutor(max_workers=OCR_WORKERS) as pool:
+        for i in pages:
+            # Borne le nombre d'images rendues en attente (mémoire).
+            while len(in_flight) >= OCR_WORKERS * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    collect(fut)
+            page = doc[i]
+            dpi = _ocr_dpi(page)
+            t0 = time.monotonic()
+            pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+            img = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+            del pix
+            in_flight[pool.submit(_ocr_image, img)] = (i, dpi, time.monotonic() - t0)
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                collect(fut)
+    if ocr_log is not None:
+        ocr_log.sort(key=lambda r: r["page"])
+
+
+def _read_pages(doc: fitz.Document, start: int, end: int, ocr_log: object, progress: bool = True) -> tuple[dict[int, str], int]:
+    """Texte brut des pages [start, end) (index 0-based) ; OCR des pages quasi vides.
+
+    Retourne ({numéro de page: texte}, nombre de pages OCRisées ou tentées).
+    """
     num_pages = len(doc)
-    full_text, page_texts, ocr_count = [], {}, 0
+    page_texts: dict[int, str] = {}
+    ocr_pages: list = []
+    for i in range(start, end):
+        if progress and ((i + 1) % 50 == 0 or i + 1 == num_pages):
+            print(f"  [extraction] page {i+1}/{num_pages}", flush=True)
+        text = doc[i].get_text()
+        page_texts[i + 1] = text
+        if len(text.strip()) < MIN_TEXT_PER_PAGE:
+            ocr_pages.append(i)
+    if ocr_pages:
+        try:
+            import pytesseract  # noqa: F401
+        except Exception as e:
+            for i in ocr_pages:
+                page_texts[i + 1] += f"\n[OCR non disponible: {e}]"
+        else:
+            _ocr_pages(doc, ocr_pages, page_texts, ocr_log)
+    return page_texts, len(ocr_pages)
+
+
+def _extract_range(pdf_path: str, start: int, end: int) -> tuple[dict[int, str], int, list]:
+    """Processus worker : pages [start, end) d'un gros PDF, avec son propre handle fitz."""
+    ocr_log: list = []
+    doc = fitz.open(pdf_path)
     try:
-        for i in range(num_pages):
-            if (i + 1) % 50 == 0 or i + 1 == num_pages:
-                print(f"  [extraction] page {i+1}/{num_pages}", flush=True)
-            page = doc[i]
-            text = page.get_text()
-            if len(text.strip()) < MIN_TEXT_PER_PAGE:
-                ocr_count += 1
-                try:
-                    import pdf2image, pytesseract
-                    img = pdf2image.convert_from_path(str(pdf_path), first_page=i+1, last_page=i+1, dpi=150)
-                    if img:
-                        text = pytesseract.image_to_string(img[0], lang="eng")
-                except Exception as e:
-                    text = text + f"\n[OCR non disponible: {e}]"
-            page_texts[i + 1] = text
-            full_text.append(text)
+        page_texts, ocr_count = _read_pages(doc, start, end, ocr_log, progress=False)
+    finally:
+        doc.close()
+    return page_texts, ocr_count, ocr_log
+
+
+def _worth_ranges(num_pages: int, done: int, elapsed: float, workers: int) -> bool:
+    """Découper le reste du PDF ? Seulement si sa lecture séquentielle, estimée sur les
+    `done` premières pages, dépasse RANGE_MIN_SECONDS (le démarrage d'un processus
+    spawn coûte ~1 s : inutile pour un PDF de texte simple, lu à des centaines de pages/s)."""
+    if workers <= 1 or num_pages < RANGE_MIN_PAGES or done <= 0 or done >= num_pages:
+        return False
+    return elapsed / done * (num_pages - done) >= RANGE_MIN_SECONDS
+
+
+def iter_page_ranges(pdf_path: Path, num_pages: int, workers: int, start: int = 0):
+    """Tranches de RANGE_PAGES pages à partir de `start`, extraites en parallèle et rendues dans l'ordre.
+
+    Chaque tranche passe par _extract_range dans un processus "spawn" (un document
+    fitz ne se partage ni entre threads ni entre processus). Au plus workers + 1
+    tranches en vol : le texte en attente reste borné, y compris en mode flux.
+    Produit (page_texts, ocr_count, ocr_log) par tranche.
+    """
+    ranges = iter([(s, min(s + RANGE_PAGES, num_pages)) for s in range(start, num_pages, RANGE_PAGES)])
+    n_workers = min(workers, -(-(num_pages - start) // RANGE_PAGES))
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=ctx) as pool:
+        in_flight: list = []
+        for start, end in itertools.islice(ranges, n_workers + 1):
+            in_flight.append((end, pool.submit(_extract_range, str(pdf_path), start, end)))
+        while in_flight:
+            end, fut = in_flight.pop(0)
+            result = fut.result()
+            nxt = next(ranges, None)
+            if nxt is not None:
+                in_flight.append((nxt[1], pool.submit(_extract_range, str(pdf_path), *nxt)))
+            print(f"  [extraction] page {end}/{num_pages} ({n_workers} processus)", flush=True)
+            yield result
+
+
+def extract_text_with_ocr_fallback(
+    pdf_path: Path, ocr_log: object = None, range_workers: int = RANGE_WORKERS,
+) -> tuple[str, dict[int, str], int]:
+    """Texte page par page ; OCR Tesseract pour les pages quasi vides (PDF scannés).
+
+    Les pages à OCRiser sont rendues directement depuis le document fitz déjà ouvert
+    (pixmap en niveaux de gris, en mémoire), puis Tesseract tourne sur OCR_WORKERS
+    threads (sous-processus tesseract → pas de contention GIL). Le rendu reste dans
+    le thread appelant : un document fitz ne se partage pas entre threads.
+    À partir de RANGE_MIN_PAGES pages, la première tranche (RANGE_PAGES) est lue
+    sur place et chronométrée ; si le reste est estimé à plus de RANGE_MIN_SECONDS,
+    il est découpé en tranches extraites par range_workers processus (iter_page_ranges).
+    ocr_log : liste optionnelle qui reçoit {page, dpi, render_s, ocr_s, chars} par page OCRisée.
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        num_pages = len(doc)
+        probe = RANGE_PAGES if range_workers > 1 and num_pages >= RANGE_MIN_PAGES else num_pages
+        t0 = time.monotonic()
+        page_texts, ocr_count = _read_pages(doc, 0, probe, ocr_log)
+        ranged = _worth_ranges(num_pages, probe, time.monotonic() - t0, range_workers)
+        if probe < num_pages and not ranged:
+            rest, n = _read_pages(doc, probe, num_pages, ocr_log)
+            page_texts.update(rest)
+            ocr_count += n
     finally:
         doc.close()
-    joined = clean("\n\n".join(full_text))
+    if ranged:
+        print(f"  [extraction] {num_pages - probe} pages restantes par tranches de {RANGE_PAGES}.", flush=True)
+        for texts, n, log in iter_page_ranges(pdf_path, num_pages, range_workers, start=probe):
+            page_texts.update(texts)
+            ocr_count += n
+            if ocr_log is not None:
+                ocr_log.extend(log)
+    joined = clean("\n\n".join(page_texts[k] for k in sorted(page_texts)))
     return joined, {k: clean(v) for k, v in page_texts.items()}, ocr_count
 
 
+def pool_range_workers(workers: int, range_workers: int) -> int:
+    """Processus par tranches pour un PDF extrait dans un worker du pool.
+
+    Chaque worker du pool ouvrirait sinon son propre pool de range_workers processus :
+    jusqu'à workers × range_workers interpréteurs, chacun avec OCR_WORKERS threads
+    Tesseract. Les cœurs sont partagés : cpu // workers par worker (1 = pas de
+    découpe, le cas avec --workers par défaut). Le thread principal (--workers 1,
+    mode flux) garde range_workers.
+    """
+    if workers <= 1:
+        return range_workers
+    return max(1, min(range_workers, (os.cpu_count() or 2) // workers))
+
+
+def iter_pages(doc: fitz.Document, ocr_log: list, range_workers: int = 1):
+    """Mode flux : (numéro de page, texte nettoyé) une page à la fois.
+
+    Rien n'est conservé entre deux pages ; les pages quasi vides sont OCRisées
+    au passage. ocr_log reçoit une entrée par page OCRisée (ou tentée).
+    Avec range_workers > 1, si les RANGE_PAGES premières pages annoncent un reste
+    plus long que RANGE_MIN_SECONDS, la suite arrive par tranches extraites en
+    parallèle (iter_page_ranges), toujours dans l'ordre.
+    """
+    num_pages = len(doc)
+    spent = 0.0  # temps d'extraction seul (hors traitement des pages par l'appelant)
+    try:
+        import pytesseract  # noqa: F401
+        ocr_error = None
+    except Exception as e:
+        ocr_error = e
+    for i in range(num_pages):
+        if i == RANGE_PAGES and _worth_ranges(num_pages, i, spent, range_workers):
+            print(f"  [extraction] {num_pages - i} pages restantes par tranches de {RANGE_PAGES}.", flush=True)
+            for texts, _, log in iter_page_ranges(Path(doc.name), num_pages, range_workers, start=i):
+                ocr_log.extend(log)
+                for page in sorted(texts):
+                    yield page, clean(texts[page])
+            return
+        if (i + 1) % 50 == 0 or i + 1 == num_pages:
+            print(f"  [extraction] page {i+1}/{num_pages}", flush=True)
+        t0 = time.monotonic()
+        text = doc[i].get_text()
+        if len(text.strip()) < MIN_TEXT_PER_PAGE:
+            if ocr_error is None:
+                page_text = {i + 1: text}
+                _ocr_pages(doc, [i], page_text, ocr_log)
+                text = page_text[i + 1]
+            else:
+                ocr_log.append({"page": i + 1, "error": str(ocr_error)[:200]})
+                text += f"\n[OCR non disponible: {ocr_error}]"
+        spent += time.monotonic() - t0
+        yield i + 1, clean(text)
+
+
 # ── Métadonnées ───────────────────────────────────────────────────────────────
 
 def _parse_authors(author_str: str) -> list[str]:
@@ -216,6 +462,7 @@ def _extract_journal(text: str) -> object:
 
 
 def extract_metadata(doc: fitz.Document, full_text: str, pdf_path: Path) -> dict:
+    full_text = full_text[:METADATA_HEAD_CHARS]  # rien au-delà n'est lu
     meta = doc.metadata or {}
     title = (meta.get("title") or "").strip()
     authors = _parse_authors(meta.get("author") or meta.get("authors") or "")
@@ -249,75 +496,983 @@ def extract_metadata(doc: fitz.Document, full_text: str, pdf_path: Path) -> dict
 
 # ── Chunking ─────────────────────────────────────────────────────────────────
 
-_SECTION_RE = re.compile(
-    r"^(?:\d+\.?\s*)?"
-    r"(Abstract|Introduction|Methods?|Materials?\s+and\s+Methods?|Results?|Discussion"
-    r"|Conclusions?|References|Acknowledgm?ents?|Experimental|Background|Summary)"
-    r"(?:\s+and\s+Discussion)?\s*$",
-    re.IGNORECASE | re.MULTILINE,
-)
-
-
-def _chunk_page(text: str) -> list:
-    out, current, current_len, section = [], [], 0, None
-    for line in text.split("\n"):
-        stripped = line.strip()
-        if stripped and _SECTION_RE.match(stripped):
-            if current:
-                block = "\n".join(current).strip()
-                if block:
-                    out.append((block, section))
-            current, current_len, section = [line], len(line) + 1, stripped
-            continue
-        current.append(line)
-        current_len += len(line) + 1
-        if current_len >= CHUNK_SIZE:
-            block = "\n".join(current).strip()
-            if block:
-                out.append((block, section))
-            overlap, overlap_len = [], 0
-            for ll in reversed(current):
-                overlap.insert(0, ll)
-                overlap_len += len(ll) + 1
-                if overlap_len >= CHUNK_OVERLAP:
-                    break
-            current = overlap
-            current_len = sum(len(ll) + 1 for ll in current)
-    if current:
-        block = "\n".join(current).strip()
-        if block:
-            out.append((block, section))
-    return out
+def iter_chunks(pages):
+    """(content, page, section_title, char_start, char_end) au fil des pages ; `pages` itère sur (page_num, texte).
 
-
-def chunk_text(text: str, page_texts: dict[int, str]) -> list:
-    if not page_texts:
-        return [(clean(c), 1, s) for c, s in _chunk_page(text)] or [(text[:8000].strip(), 1, None)]
-    out, last_section = [], None
-    for page_num in sorted(page_texts.keys()):
-        content = page_texts[page_num]
+    La section courante est propagée d'une page à l'autre. Offsets dans le texte de la page.
+    """
+    last_section = None
+    for page_num, content in pages:
         if not content.strip():
             continue
-        for c, s in _chunk_page(content):
+        for c, s, start, end in chunk_page(content):
             title = s if s is not None else last_section
             if s is not None:
                 last_section = s
-            out.append((clean(c), page_num, title))
-    return out or [(text[:8000].strip(), 1, None)]
+            yield clean(c), page_num, title, start, end
+
+
+def chunk_text(text: str, page_texts: dict[int, str]) -> list:
+    fallback = [(text[:8000].strip(), 1, None, None, None)]
+    if not page_texts:
+        return [(clean(c), 1, s, start, end) for c, s, start, end in chunk_page(text)] or fallback
+    out = list(iter_chunks((k, page_texts[k]) for k in sorted(page_texts)))
+    return out or fallback
 
 
 # ── Dédup ─────────────────────────────────────────────────────────────────────
 
-def already_indexed_by_doi(sb, doi: object) -> bool:
-    if not doi:
+PRELOAD_PAGE = 1000  # lignes documents par requête au préchargement
+
+
+class DocumentIndex:
+    """Copie locale de documents (id, doi, storage_path, status), chargée une fois au démarrage.
+
+    Remplace les deux requêtes PostgREST par PDF (DOI puis storage_path) : les
+    décisions de skip se prennent en mémoire, et un PDF déjà indexé (path, done)
+    est écarté avant même d'être ouvert. Partagé entre le thread principal et le
+    writer, d'où le verrou.
+    """
+
+    def __init__(self):
+        self.by_path: dict = {}   # storage_path → {"id", "status"}
+        self.done_dois: set = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, sb) -> "DocumentIndex":
+        index = cls()
+        offset = 0
+        while True:
+            r = (
+                sb.table("documents")
+                .select("id, doi, storage_path, status")
+                .order("id")
+                .range(offset, offset + PRELOAD_PAGE - 1)
+                .execute()
+            )
+            rows = r.data or []
+            for row in rows:
+                if row.get("storage_path"):
+                    index.by_path[row["storage_path"]] = {"id": row["id"], "status": row["status"], "doi": row.get("doi")}
+                if row.get("doi") and row.get("status") == "done":
+                    index.done_dois.add(row["doi"])
+            if len(rows) < PRELOAD_PAGE:
+                break
+            offset += PRELOAD_PAGE
+        return index
+
+    def is_done_path(self, storage_path: str) -> bool:
+        with self._lock:
+            existing = self.by_path.get(storage_path)
+            return bool(existing) and existing["status"] == "done"
+
+    def existing(self, storage_path: str) -> object:
+        with self._lock:
+            return self.by_path.get(storage_path)
+
+    def claim_doi(self, doi: object) -> bool:
+        """False si le DOI est déjà indexé (ou pris par un autre PDF de ce run) ; sinon le réserve."""
+        if not doi:
+            return True
+        with self._lock:
+            if doi in self.done_dois:
+                return False
+            self.done_dois.add(doi)
+            return True
+
+    def set_path(self, storage_path: str, document_id: object, status: str, doi: object = None) -> None:
+        with self._lock:
+            if document_id is None:
+                self.by_path.pop(storage_path, None)
+            else:
+                self.by_path[storage_path] = {"id": document_id, "status": status, "doi": doi}
+
+    def mark_stale(self, storage_path: str) -> None:
+        """Contenu modifié sur disque : le document sera supprimé puis ré-ingéré, son DOI libéré."""
+        with self._lock:
+            existing = self.by_path.get(storage_path)
+            if existing:
+                existing["status"] = "stale"
+                self.done_dois.discard(existing.get("doi"))
+
+
+# ── Étages du pipeline ────────────────────────────────────────────────────────
+#
+#   pool de processus (extraction + métadonnées)
+#        → thread principal (dédup, insert document, chunking)
+#        → thread embeddings
+#        → thread writer (insert chunks, finalisation)
+#
+# Les étages sont reliés par des files bornées (QUEUE_SIZE) : un étage lent
+# bloque l'amont au lieu d'accumuler des documents en mémoire. Le temps total
+# tend vers celui de l'étage le plus lent au lieu de la somme des étages.
+
+_STOP = None  # sentinelle de fin de file
+
+
+def _storage_path(pdf_path: Path) -> str:
+    # Normalise les séparateurs (ex: "Articles auteur") pour Supabase
+    return str(pdf_path.relative_to(project_root)).replace("\\", "/")
+
+
+def extract_document(
+    pdf_path: Path,
+    fingerprint: object = None,
+    stream_min_pages: object = STREAM_MIN_PAGES,
+    range_workers: int = RANGE_WORKERS,
+) -> dict:
+    """Étage 1 (processus worker) : texte + métadonnées d'un PDF.
+
+    fingerprint : size/mtime/sha256 déjà calculés par le diff --incremental (sinon calculés ici).
+    stream_min_pages : à partir de ce nombre de pages, rien n'est extrait ici ; le
+    document est marqué "streamed" et traité en flux (None = jamais).
+    range_workers : processus d'extraction par tranches au-delà de RANGE_MIN_PAGES pages.
+    """
+    if fingerprint is None:
+        fingerprint = file_fingerprint(pdf_path)
+    if stream_min_pages is not None:
+        doc_fitz = fitz.open(pdf_path)
+        try:
+            num_pages = len(doc_fitz)
+        finally:
+            doc_fitz.close()
+        if num_pages >= stream_min_pages:
+            # Gros document : extrait en flux par le thread principal (stream_document).
+            return {"streamed": True, "num_pages": num_pages, "fingerprint": fingerprint}
+    ocr_log: list = []
+    full_text, page_texts, ocr_count = extract_text_with_ocr_fallback(pdf_path, ocr_log, range_workers)
+    if not full_text.strip():
+        raise ValueError("Aucun texte extrait (PDF vide ou illisible).")
+    doc_fitz = fitz.open(pdf_path)
+    try:
+        meta = extract_metadata(doc_fitz, full_text, pdf_path)
+    finally:
+        doc_fitz.close()
+    return {
+        "full_text":  full_text,
+        "page_texts": page_texts,
+        "ocr_count":  ocr_count,
+        "meta":       meta,
+        "fingerprint": fingerprint,
+        "ocr_log":    ocr_log,
+        "minhash":    document_minhash(full_text),
+    }
+
+
+def chunk_rows(document_id: str, chunks_data: list, embeddings, start_pos: int = 0) -> list:
+    """Lignes chunks au format PostgREST (embedding en littéral halfvec + sa quantification binaire, cf. vector_format.py).
+
+    Une ligne d'embeddings NaN (section FTS seule, cf. EmbeddingBatcher) donne embedding = NULL.
+    """
+    return [
+        {
+            "document_id":  document_id,
+            "content":      content,
+            "position":     pos,
+            "page":         page,
+            "section_title": clean(section_title) if section_title else None,
+            "char_start":   char_start,
+            "char_end":     char_end,
+            "embedding":    None if np.isnan(emb[0]) else halfvec_text(emb),
+            "embedding_bit": None if np.isnan(emb[0]) else bit_text(emb),
+        }
+        for pos, ((content, page, section_title, char_start, char_end), emb) in enumerate(zip(chunks_data, embeddings), start_pos)
+    ]
+
+
+def insert_chunks(
+    sb, document_id: str, chunks_data: list, embeddings, tag: str = "", start_pos: int = 0, on_batch=None,
+) -> None:
+    """Insert par batches de INSERT_BATCH ; on_batch(start, end) après chaque batch acquitté."""
+    batch = []
+    for pos, row in enumerate(chunk_rows(document_id, chunks_data, embeddings, start_pos), start_pos):
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH or pos + 1 == start_pos + len(chunks_data):
+            for attempt in range(3):
+                try:
+                    sb.table("chunks").insert(batch).execute()
+                    break
+                except Exception as e:
+                    if attempt == 2:
+                        raise
+                    print(f"{tag}[insert] Retry {attempt+1}/3 après erreur: {str(e)[:60]}", flush=True)
+                    time.sleep(2 ** attempt)
+            print(f"{tag}[insert] {pos+1}/{start_pos + len(chunks_data)} chunks insérés.", flush=True)
+            if on_batch is not None:
+                on_batch(pos + 1 - len(batch), pos + 1)
+            batch = []
+            time.sleep(INSERT_PAUSE)
+
+
+def ingestion_log(job: dict) -> dict:
+    meta = job["meta"]
+    log = {
+        "chunks_count":        job.get("chunks_count", len(job["chunks"])),
+        "ocr_pages_count":     job["ocr_count"],
+        "ocr_pages":           job.get("ocr_log") or [],
+        "title_extracted":     bool(meta["title"]),
+        "doi_extracted":       bool(meta["doi"]),
+        "journal_extracted":   bool(meta["journal"]),
+        "year_extracted":      bool(meta["published_at"]),
+        "token_counter":       token_counter_name(),
+        "ingested_at":         datetime.now(timezone.utc).isoformat(),
+    }
+    dedup = job.get("dedup")
+    if dedup is not None:
+        log["boilerplate_positions"] = dedup["boilerplate"]
+        log["near_duplicate_positions"] = dedup["near_duplicates"]
+    if job.get("duplicate_of"):
+        log["duplicate_of"] = job["duplicate_of"]
+    return log
+
+
+def finalize_document(sb, job: dict, log: dict) -> None:
+    sb.table("documents").update({
+        "status": "done",
+        "error_message": None,
+        "ingestion_log": log,
+        "updated_at": log["ingested_at"],
+    }).eq("id", job["document_id"]).execute()
+
+
+class RestWriter:
+    """Writer par défaut : PostgREST (supabase-py), batches de INSERT_BATCH chunks."""
+
+    name = "rest"
+
+    def __init__(self, sb, journal: object = None):
+        self.sb = sb
+        self.journal = journal
+
+    def write_chunks(self, job: dict, tag: str = "") -> None:
+        on_batch = None
+        if self.journal is not None:
+            on_batch = lambda start, end: self.journal.ack(job["rel_path"], start, end)
+        insert_chunks(
+            self.sb, job["document_id"], job["chunks"], job["embeddings"],
+            tag=tag, start_pos=job.get("position_offset", 0), on_batch=on_batch,
+        )
+
+    def finalize(self, job: dict, log: dict) -> None:
+        finalize_document(self.sb, job, log)
+
+    def abort(self, job: dict) -> None:
+        pass  # pas de transaction : les chunks déjà insérés restent (nettoyés à la ré-ingestion)
+
+    def close(self) -> None:
+        pass
+
+
+def record_error(sb, rel_path: str, err: str) -> None:
+    """Passe le document en status=error (le crée si besoin). Ne lève jamais."""
+    time.sleep(1)  # pause avant de continuer
+    try:
+        ingested_at = datetime.now(timezone.utc).isoformat()
+        r = sb.table("documents").select("id").eq("storage_path", rel_path).execute()
+        if r.data:
+            sb.table("documents").update({
+                "status": "error",
+                "error_message": err,
+                "ingestion_log": {"error": err, "ingested_at": ingested_at},
+                "updated_at": ingested_at,
+            }).eq("id", r.data[0]["id"]).execute()
+        else:
+            sb.table("documents").insert({
+                "storage_path": rel_path,
+                "status": "error",
+                "error_message": err,
+                "ingestion_log": {"error": err, "ingested_at": ingested_at},
+            }).execute()
+    except Exception as e2:
+        print(f"  ⚠️   Log erreur non enregistré: {str(e2)[:80]}", flush=True)
+
+
+def prepare_document(
+    sb,
+    job: dict,
+    index: DocumentIndex,
+    is_author_article: bool,
+    stats: dict,
+    lock: threading.Lock,
+    doc_index: object = None,
+) -> bool:
+    """Étage 2 (thread principal) : dédup puis insert du document (status=processing).
+
+    Retourne False si le document est skippé. Un quasi-doublon d'un document déjà
+    indexé (doc_index, MinHash du début du texte) est inséré avec job["duplicate_of"] :
+    à l'appelant de le finaliser sans chunks.
+    """
+    tag, meta, rel_path = job["tag"], job["meta"], job["rel_path"]
+    print(f"{tag} [meta] titre: {repr((meta['title'] or '')[:80])}", flush=True)
+    print(f"{tag} [meta] journal: {repr(meta['journal'] or '(vide)')}", flush=True)
+    print(f"{tag} [meta] published_at: {meta['published_at'] or '(vide)'} | doi: {(meta['doi'] or '')[:40] or '(vide)'}", flush=True)
+
+    # Dédup DOI (en mémoire : DocumentIndex préchargé)
+    if not index.claim_doi(meta["doi"]):
+        print(f"{tag} ⏭   Déjà en base (DOI), skip.")
+        with lock:
+            stats["skipped"] += 1
         return False
-    r = sb.table("documents").select("id").eq("doi", doi).eq("status", "done").execute()
-    return bool(r.data)
+
+    # Dédup storage_path (les "done" ont déjà été écartés avant extraction)
+    existing = index.existing(rel_path)
+    if existing:
+        if existing["status"] == "done":
+            print(f"{tag} ⏭   Déjà indexé (path), skip.")
+            with lock:
+                stats["skipped"] += 1
+            return False
+        # error ou processing : on nettoie et on ré-ingère
+        doc_id = existing["id"]
+        sb.table("chunks").delete().eq("document_id", doc_id).execute()
+        sb.table("documents").delete().eq("id", doc_id).execute()
+        index.set_path(rel_path, None, "")
+        print(f"{tag} 🔄  Ré-ingestion (ancien status: {existing['status']}).")
+
+    # Dédup contenu (MinHash des premières pages) : même article sous un autre fichier
+    sig = job.get("minhash")
+    match = None
+    if doc_index is not None and sig is not None:
+        doc_index.forget(rel_path)
+        match = doc_index.find(sig, alive=lambda path: (index.existing(path) or {}).get("status") in ("done", "processing"))
+
+    # ── Insert document ───────────────────────────────────────────────────
+    doc_row = sb.table("documents").insert({
+        "title":              meta["title"],
+        "authors":            meta["authors"],
+        "doi":                meta["doi"],
+        "journal":            meta["journal"],
+        "published_at":       meta["published_at"],
+        "storage_path":       rel_path,
+        "status":             "processing",
+        "error_message":      None,
+        "is_author_article":  is_author_article,
+        "text_minhash":       to_db(sig),
+    }).execute()
+    job["document_id"] = doc_row.data[0]["id"]
+    index.set_path(rel_path, job["document_id"], "processing", meta["doi"])
+    if match is not None:
+        path, score = match
+        job["duplicate_of"] = {"id": index.existing(path)["id"], "storage_path": path, "jaccard": round(score, 3)}
+        print(f"{tag} ⏭   Quasi-doublon de {path} (Jaccard {score:.2f}) : ni chunking ni embeddings.", flush=True)
+        with lock:
+            stats["duplicate_docs"] += 1
+    elif doc_index is not None and sig is not None:
+        doc_index.add(rel_path, sig)
+    return True
+
+
+def journal_state(job: dict) -> dict:
+    """Ce qu'il faut au journal pour finaliser le document après une reprise (JSON)."""
+    return {
+        "meta":        job["meta"],
+        "fingerprint": job.get("fingerprint"),
+        "streamed":    bool(job.get("streamed")),
+        "num_pages":   job.get("num_pages"),
+        "ocr_count":   job.get("ocr_count", 0),
+        "ocr_log":     job.get("ocr_log") or [],
+        "dedup":       job.get("dedup"),
+        "token_counter": token_counter_name(),  # une reprise rejoue le découpage : même compteur exigé
+    }
 
 
-def find_existing_by_path(sb, storage_path: str) -> object:
-    r = sb.table("documents").select("id, status").eq("storage_path", storage_path).execute()
-    return r.data[0] if r.data else None
+def mark_duplicates(chunk_index, job: dict, chunks: list, position: int, stats: dict, lock: threading.Lock) -> None:
+    """Note dans job["dedup"] les positions des chunks boilerplate et quasi-doublons.
+
+    Rien n'est écarté : un chunk boilerplate est inséré sans embedding (NULL, FTS
+    seule, comme les sections de FTS_ONLY_SECTIONS), un quasi-doublon normalement.
+    position : position du premier chunk (segments successifs en mode flux).
+    La décision est prise contre l'index d'empreintes ; chunk_index.commit() reste à l'appelant.
+    """
+    if chunk_index is None:
+        return
+    dedup = job.setdefault("dedup", {"boilerplate": [], "near_duplicates": []})
+    boilerplate, near = 0, 0
+    for i, status in enumerate(chunk_index.classify(job["rel_path"], [c[0] for c in chunks])):
+        if status == "boilerplate":
+            dedup["boilerplate"].append(position + i)
+            boilerplate += 1
+        elif status == "near":
+            dedup["near_duplicates"].append(position + i)
+            near += 1
+    with lock:
+        stats["boilerplate_chunks"] += boilerplate
+        stats["near_duplicate_chunks"] += near
+
+
+def dedup_label(job: dict) -> str:
+    dedup = job.get("dedup")
+    if not dedup or not (dedup["boilerplate"] or dedup["near_duplicates"]):
+        return ""
+    return f" ({len(dedup['boilerplate'])} boilerplate sans embedding, {len(dedup['near_duplicates'])} quasi-doublons)"
+
+
+def stream_document(
+    sb,
+    job: dict,
+    index: DocumentIndex,
+    is_author_article: bool,
+    embed_q: queue.Queue,
+    stats: dict,
+    lock: threading.Lock,
+    journal: object = None,
+    chunk_index: object = None,
+    resume_from: object = None,
+    doc_index: object = None,
+    range_workers: int = RANGE_WORKERS,
+) -> None:
+    """Mode flux (gros PDF) : pages → chunks → embeddings → insert, mémoire bornée.
+
+    Seules les premières pages (METADATA_HEAD_CHARS) sont gardées le temps d'extraire
+    les métadonnées. Les chunks partent ensuite vers l'étage embeddings par segments
+    de STREAM_SEGMENT ; la file bornée freine la lecture des pages si l'aval sature.
+    Le writer ne passe le document en done qu'au segment final.
+
+    resume_from : reprise d'un flux interrompu (journal). Le document existe déjà en
+    base et les chunks de position < resume_from sont insérés : ils ne sont pas renvoyés.
+    Le filtre boilerplate est rejoué à l'identique (index d'empreintes commité au
+    segment final seulement) : les positions ne bougent pas.
+    """
+    tag = job["tag"]
+    rel_path = job["rel_path"]
+    pdf_path = project_root / rel_path
+    ocr_log: list = []
+    text_hash = hashlib.sha256()
+    doc = fitz.open(pdf_path)
+    try:
+        pages = iter_pages(doc, ocr_log, range_workers)
+        head, head_len = [], 0
+        for page in pages:
+            head.append(page)
+            head_len += len(page[1]) + 2
+            if head_len >= METADATA_HEAD_CHARS:
+                break
+        head_text = "\n\n".join(t for _, t in head)
+        job["meta"] = extract_metadata(doc, head_text, pdf_path)
+        if resume_from is None:
+            print(f"{tag} {job['num_pages']} pages, mode flux.", flush=True)
+            job["minhash"] = document_minhash(head_text)
+            if not prepare_document(sb, job, index, is_author_article, stats, lock, doc_index):
+                return
+            if job.get("duplicate_of"):
+                embed_q.put(dict(job, chunks=[], position_offset=0, final=True, chunks_count=0, ocr_count=len(ocr_log), ocr_log=ocr_log))
+                return
+            if journal is not None:
+                journal.start(rel_path, job["document_id"], pdf_path, PIPELINE_VERSION, journal_state(job))
+        else:
+            print(f"{tag} {job['num_pages']} pages, mode flux (reprise à la position {resume_from}).", flush=True)
+        skip_until = resume_from or 0
+        if chunk_index is not None:
+            chunk_index.forget(rel_path)
+            job["dedup"] = {"boilerplate": [], "near_duplicates": []}
+
+        position, segment, produced = 0, [], 0
+        sent = [False]  # un segment est déjà parti vers le writer
+
+        def send(final: bool) -> int:
+            """Transmet le segment courant ; retourne son nombre de chunks (positions)."""
+            mark_duplicates(chunk_index, job, segment, position, stats, lock)
+            if final and chunk_index is not None:
+                chunk_index.commit(rel_path)
+            skip = max(0, min(len(segment), skip_until - position))
+            seg = dict(job, chunks=segment[skip:], position_offset=position + skip, final=final)
+            if final:
+                seg.update(chunks_count=position + len(segment), ocr_count=len(ocr_log), ocr_log=ocr_log)
+            if journal is not None:
+                journal.add_chunks(rel_path, position, segment)
+                if final:
+                    journal.chunked(rel_path, text_hash.hexdigest(), seg["chunks_count"], journal_state(seg))
+            if seg["chunks"] or final:
+                embed_q.put(seg)  # bloque si l'étage embeddings est saturé
+                sent[0] = True
+            return len(segment)
+
+        def hashed(stream):
+            for page in stream:
+                text_hash.update(page[1].encode())
+                yield page
+
+        stream = hashed(itertools.chain(head, pages))
+        head = None  # la chaîne libère les pages de tête dès qu'elles sont consommées
+        try:
+            for chunk in iter_chunks(stream):
+                segment.append(chunk)
+                produced += 1
+                if len(segment) >= STREAM_SEGMENT:
+                    position += send(final=False)
+                    segment = []
+            if produced == 0:
+                raise ValueError("Aucun texte extrait (PDF vide ou illisible).")
+            position += send(final=True)
+        except Exception as e:
+            if not sent[0]:
+                raise
+            # Des segments sont déjà chez le writer : l'erreur les suit dans la file, et le
+            # writer annule le document (rollback de la transaction COPY, status=error).
+            embed_q.put(dict(job, chunks=[], position_offset=position, final=True, error=str(e)[:1000]))
+            return
+        print(f"{tag} [chunks] {position} chunks (flux){dedup_label(job)}.", flush=True)
+    finally:
+        doc.close()
+
+
+class EmbeddingBatcher:
+    """Regroupe les chunks de plusieurs documents en batches de taille fixe.
+
+    Un petit document (lettre de 3 pages → quelques chunks) ne remplit pas un
+    forward pass à lui seul : on accumule les chunks de documents successifs
+    jusqu'à `batch_size`, ou jusqu'à `flush_s` secondes d'attente. Les vecteurs
+    sont rangés dans le document propriétaire ; un document n'est transmis au
+    writer que lorsque tous ses vecteurs sont calculés.
+
+    batch_size <= 0 : un encode par document (comportement historique).
+    Les chunks d'une section de fts_sections (References…) et les chunks boilerplate
+    (positions job["dedup"]["boilerplate"]) ne sont pas encodés : leur ligne
+    d'embeddings vaut NaN, que les writers écrivent en NULL.
+
+    Les jobs sortent dans leur ordre d'arrivée, même ceux qui n'ont rien à encoder
+    (doublon, segment final fait seulement de References) : le segment final d'un
+    document en flux ne doit jamais atteindre le writer avant les précédents.
+    """
+
+    def __init__(
+        self, embed_model, out_q: queue.Queue, batch_size: int, flush_s: float, cache=None,
+        fts_sections: tuple = FTS_ONLY_SECTIONS,
+    ):
+        self.embed_model = embed_model
+        self.fts_sections = fts_sections
+        self.cache = cache
+        self.out_q = out_q
+        self.batch_size = batch_size
+        self.flush_s = flush_s
+        self.pending: list = []       # (job, index du chunk dans le job)
+        self.jobs = collections.deque()  # jobs pas encore transmis, dans l'ordre d'arrivée
+        self.oldest = 0.0             # arrivée du plus ancien chunk en attente
+        self.chunks = 0
+        self.seconds = 0.0
+        self.fts_only = 0             # chunks de sections FTS seule (jamais encodés)
+
+    def add(self, job: dict) -> None:
+        n = len(job["chunks"])
+        job["embeddings"] = np.zeros((n, EMBED_DIM), dtype=np.float32)
+        offset = job.get("position_offset", 0)
+        boilerplate = set((job.get("dedup") or {}).get("boilerplate", ()))
+        todo = []
+        for i, chunk in enumerate(job["chunks"]):
+            if fts_only(chunk[2], self.fts_sections):
+                job["embeddings"][i] = np.nan  # pas d'embedding : NULL en base, hors index HNSW
+                self.fts_only += 1
+            elif offset + i in boilerplate:
+                job["embeddings"][i] = np.nan  # boilerplate (mark_duplicates) : FTS seule
+            else:
+                todo.append(i)
+        job["_remaining"] = len(todo)
+        self.jobs.append(job)
+        if not todo:
+            self._emit_ready()
+            return
+        if not self.pending:
+            self.oldest = time.monotonic()
+        for k, i in enumerate(todo):
+            self.pending.append((job, i))
+            if 0 < self.batch_size <= len(self.pending):
+                self.flush()
+                if k + 1 < len(todo):
+                    self.oldest = time.monotonic()
+        if self.batch_size <= 0:
+            self.flush()
+
+    def timeout(self) -> object:
+        """Secondes restantes avant le flush forcé (None si rien en attente)."""
+        if not self.pending:
+            return None
+        return max(0.0, self.oldest + self.flush_s - time.monotonic())
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        texts = [job["chunks"][i][0] for job, i in batch]
+        t0 = time.monotonic()
+        try:
+            vectors = encode_cached(
+                self.embed_model, texts, self.cache,
+                batch_size=max(len(texts), 1), show_progress_bar=False, normalize_embeddings=EMBED_NORMALIZE,
+            )
+        except Exception as e:
+            vectors = None
+            for job, _ in batch:
+                job.setdefault("error", str(e)[:1000])
+        self.seconds += time.monotonic() - t0
+        self.chunks += len(texts)
+        for k, (job, i) in enumerate(batch):
+            if vectors is not None:
+                job["embeddings"][i] = vectors[k]
+            job["_remaining"] -= 1
+        self._emit_ready()
+
+    def _emit_ready(self) -> None:
+        """Transmet les jobs complets en tête de file (ordre d'arrivée conservé)."""
+        while self.jobs and self.jobs[0]["_remaining"] == 0:
+            job = self.jobs.popleft()
+            if job["chunks"] and not job.get("error"):
+                print(f"{job['tag']} [embed] {len(job['embeddings'])} embeddings produits.", flush=True)
+            self.out_q.put(job)
+
+
+def embed_stage(batcher: EmbeddingBatcher, in_q: queue.Queue, out_q: queue.Queue) -> None:
+    """Étage 3 (thread) : embeddings par micro-batches inter-documents."""
+    while True:
+        try:
+            job = in_q.get(timeout=batcher.timeout())
+        except queue.Empty:
+            batcher.flush()
+            continue
+        if job is _STOP:
+            batcher.flush()
+            out_q.put(_STOP)
+            return
+        batcher.add(job)
+
+
+def write_stage(
+    sb,
+    writer,
+    in_q: queue.Queue,
+    index: DocumentIndex,
+    manifest: object,
+    stats: dict,
+    lock: threading.Lock,
+    journal: object = None,
+) -> None:
+    """Étage 4 (thread) : insert chunks puis status=done (ou error).
+
+    Un document en mode flux arrive en plusieurs segments (final=False … final=True) ;
+    après une erreur sur un segment, les suivants du même document sont ignorés.
+    Un flux interrompu après l'envoi de segments se termine par un job final sans
+    chunks portant error : writer.abort annule le document (rollback de la
+    transaction COPY ; sans effet pour les writers REST) et il passe en error.
+    Avec un journal, les embeddings sont journalisés avant l'insert et l'entrée du
+    document est effacée une fois le status posé.
+    """
+    def save_embeddings(job: dict) -> None:
+        if journal is not None and not job.get("journaled") and not job.get("error"):
+            journal.save_embeddings(job["rel_path"], job.get("position_offset", 0), job["embeddings"])
+
+    def on_done(job: dict) -> None:
+        index.set_path(job["rel_path"], job["document_id"], "done", job["meta"]["doi"])
+        if manifest is not None:
+            manifest.record(job["rel_path"], job["fingerprint"], job["document_id"], PIPELINE_VERSION)
+        if journal is not None:
+            journal.finish(job["rel_path"])
+        meta = job["meta"]
+        print(f"{job['tag']} ✅  OK — {job.get('chunks_count', len(job['chunks']))} chunks | journal: {meta['journal'] or '-'} | année: {meta['published_at'] or '-'}")
+        with lock:
+            stats["done"] += 1
+
+    def on_error(job: dict, err: str) -> None:
+        print(f"{job['tag']} ❌  Erreur: {err}")
+        with lock:
+            stats["error"] += 1
+        if journal is not None:
+            journal.finish(job["rel_path"])
+
+    if hasattr(writer, "run"):
+        # Writer asynchrone : il gère lui-même inserts, status et erreurs (ingest_async.py).
+        def build_rows(job: dict) -> list:
+            save_embeddings(job)
+            return chunk_rows(job["document_id"], job["chunks"], job["embeddings"], job.get("position_offset", 0))
+
+        on_batch = None
+        if journal is not None:
+            on_batch = lambda job, start, end: journal.ack(job["rel_path"], start, end)
+        writer.run(in_q, _STOP, build_rows, ingestion_log, on_done, on_error, on_batch)
+        return
+
+    failed: set = set()
+    while True:
+        job = in_q.get()
+        if job is _STOP:
+            return
+        tag = job["tag"]
+        if job["document_id"] in failed:
+            continue
+        try:
+            if job.get("error"):
+                raise RuntimeError(job["error"])
+            save_embeddings(job)
+            writer.write_chunks(job, tag=f"{tag} ")
+            if not job.get("final", True):
+                continue
+            writer.finalize(job, ingestion_log(job))
+            on_done(job)
+        except Exception as e:
+            err = str(e)[:1000]
+            on_error(job, err)
+            failed.add(job["document_id"])
+            try:
+                writer.abort(job)
+            except Exception as e2:
+                print(f"{tag} ⚠️   Rollback impossible: {str(e2)[:80]}", flush=True)
+            record_error(sb, job["rel_path"], err)
+
+
+def apply_manifest_diff(sb, manifest: IngestManifest, index: DocumentIndex, pdf_files: list, fingerprints: dict, stats: dict) -> list:
+    """--incremental : ne garde que les PDF nouveaux ou modifiés depuis le dernier run.
+
+    Remplit `fingerprints` (Path → size/mtime/sha256) pour ne pas re-hasher dans les workers.
+    """
+    t0 = time.monotonic()
+    d = manifest.diff([(_storage_path(p), p) for p in pdf_files], PIPELINE_VERSION)
+    elapsed = time.monotonic() - t0
+
+    for rel_path, _, fp, row in d["unchanged"]:
+        if fp is not None:  # mtime changé, contenu identique
+            manifest.record(rel_path, fp, row["document_id"], PIPELINE_VERSION)
+
+    for rel_path, pdf_path, fp, twin in d["moved"]:
+        # Même contenu déjà ingéré sous un autre chemin : pas de ré-ingestion.
+        # Si l'ancien fichier a disparu (déplacement/renommage), storage_path suit le fichier.
+        if twin["document_id"] and not (project_root / twin["path"]).exists():
+            try:
+                sb.table("documents").update({"storage_path": rel_path}).eq("id", twin["document_id"]).execute()
+                existing = index.existing(twin["path"])
+                index.set_path(twin["path"], None, "")
+                if existing:
+                    index.set_path(rel_path, existing["id"], existing["status"], existing.get("doi"))
+                manifest.forget(twin["path"])
+                print(f"🚚  Déplacé : {twin['path']} → {rel_path}", flush=True)
+            except Exception as e:
+                print(f"  ⚠️   storage_path non mis à jour ({rel_path}): {str(e)[:80]}", flush=True)
+        manifest.record(rel_path, fp, twin["document_id"], PIPELINE_VERSION)
+
+    for rel_path, _, _, _ in d["changed"]:
+        index.mark_stale(rel_path)
+
+    todo = d["new"] + d["changed"]
+    for _, pdf_path, fp, _ in todo:
+        fingerprints[pdf_path] = fp
+    stats["skipped"] += len(d["unchanged"]) + len(d["moved"])
+    print(
+        f"🗂   Manifest : {len(d['unchanged'])} inchangés | {len(d['moved'])} déplacés | "
+        f"{len(d['changed'])} modifiés | {len(d['new'])} nouveaux (diff en {elapsed:.2f}s)",
+        flush=True,
+    )
+    return [pdf_path for _, pdf_path, _, _ in todo]
+
+
+def run_pipeline(
+    sb,
+    embed_model,
+    pdf_files: list,
+    source_dir: Path,
+    is_author_article: bool,
+    workers: int,
+    embed_batch: int = EMBED_BATCH,
+    cache=None,
+    index: object = None,
+    manifest: object = None,
+    incremental: bool = False,
+    stream_min_pages: object = STREAM_MIN_PAGES,
+    writer: object = None,
+    journal: object = None,
+    chunk_index: object = None,
+    doc_index: object = None,
+    fts_sections: tuple = FTS_ONLY_SECTIONS,
+    range_workers: int = RANGE_WORKERS,
+) -> dict:
+    stats = {
+        "done": 0, "skipped": 0, "error": 0, "resumed": 0,
+        "duplicate_docs": 0, "boilerplate_chunks": 0, "near_duplicate_chunks": 0,
+    }
+    if index is None:
+        index = DocumentIndex.load(sb)
+    lock = threading.Lock()
+    embed_q: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+    write_q: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+
+    batcher = EmbeddingBatcher(embed_model, write_q, embed_batch, EMBED_FLUSH_S, cache, fts_sections)
+    embedder = threading.Thread(target=embed_stage, args=(batcher, embed_q, write_q), name="embed", daemon=True)
+    # Client Supabase dédié au writer : le thread principal garde le sien pour la dédup.
+    writer_sb = get_supabase()
+    if writer is None:
+        writer = RestWriter(writer_sb, journal)
+    write_thread = threading.Thread(
+        target=write_stage, args=(writer_sb, writer, write_q, index, manifest, stats, lock, journal),
+        name="writer", daemon=True,
+    )
+    embedder.start()
+    write_thread.start()
+
+    fingerprints: dict = {}
+    if incremental and manifest is not None:
+        pdf_files = apply_manifest_diff(sb, manifest, index, pdf_files, fingerprints, stats)
+
+    # Skip par storage_path avant ouverture du PDF : un fichier déjà "done" ne coûte aucun parsing.
+    todo, skipped_by_path = [], 0
+    for pdf_path in pdf_files:
+        rel_path = _storage_path(pdf_path)
+        if index.is_done_path(rel_path):
+            skipped_by_path += 1
+            fp = fingerprints.get(pdf_path)
+            if fp is not None:
+                # Déjà en base mais absent du manifest (ingéré avant le manifest) : on l'adopte.
+                manifest.record(rel_path, fp, index.existing(rel_path)["id"], PIPELINE_VERSION)
+        else:
+            todo.append(pdf_path)
+    if skipped_by_path:
+        stats["skipped"] += skipped_by_path
+        print(f"⏭   {skipped_by_path} PDF déjà indexés (path, done) écartés sans parsing.", flush=True)
+    pdf_files = todo
+
+    # Reprise : documents restés en processing (crash) dont le journal décrit encore le fichier.
+    # Un document non streamé dont le chunking n'a pas été journalisé repart de zéro.
+    resumed: list = []
+    if journal is not None:
+        todo = []
+        for pdf_path in pdf_files:
+            rel_path = _storage_path(pdf_path)
+            existing = index.existing(rel_path)
+            entry = journal.get(rel_path) if existing and existing["status"] == "processing" else None
+            if (
+                entry is not None
+                and (entry["text_sha256"] is not None or entry["job"]["streamed"])
+                and journal.matches(entry, existing["id"], pdf_path, PIPELINE_VERSION)
+                and entry["job"].get("token_counter") == token_counter_name()
+            ):
+                resumed.append((pdf_path, dict(entry, document_id=existing["id"])))
+            else:
+                todo.append(pdf_path)
+        pdf_files = todo
+    total = len(resumed) + len(pdf_files)
+
+    def fail(tag: str, rel_path: str, e: Exception) -> None:
+        err = str(e)[:1000]
+        print(f"{tag} ❌  Erreur: {err}")
+        with lock:
+            stats["error"] += 1
+        record_error(sb, rel_path, err)
+        if journal is not None:
+            journal.finish(rel_path)
+
+    def handle(idx: int, pdf_path: Path, result: object, exc: object) -> None:
+        rel_path = _storage_path(pdf_path)
+        tag = f"[{idx}/{total}]"
+        print(f"{tag} {pdf_path.relative_to(source_dir)}", flush=True)
+        try:
+            if exc is not None:
+                raise exc
+            job = dict(result, idx=idx, tag=tag, rel_path=rel_path)
+            if job.get("streamed"):
+                stream_document(
+                    sb, job, index, is_author_article, embed_q, stats, lock, journal, chunk_index,
+                    doc_index=doc_index, range_workers=range_workers,
+                )
+                return
+            print(f"{tag} {len(job['page_texts'])} pages, {len(job['full_text'])} chars, OCR: {job['ocr_count']} pages.", flush=True)
+            if prepare_document(sb, job, index, is_author_article, stats, lock, doc_index):
+                if job.get("duplicate_of"):
+                    job.update(chunks=[], full_text="", page_texts={})
+                    embed_q.put(job)  # finalisé par le writer : done, 0 chunks
+                    return
+                job["chunks"] = chunk_text(job["full_text"], job["page_texts"])
+                if chunk_index is not None:
+                    chunk_index.forget(rel_path)
+                    mark_duplicates(chunk_index, job, job["chunks"], 0, stats, lock)
+                    chunk_index.commit(rel_path)
+                if journal is not None:
+                    state = journal_state(job)
+                    journal.start(rel_path, job["document_id"], pdf_path, PIPELINE_VERSION, state)
+                    journal.add_chunks(rel_path, 0, job["chunks"])
+                    text_sha256 = hashlib.sha256(job["full_text"].encode()).hexdigest()
+                    journal.chunked(rel_path, text_sha256, len(job["chunks"]), state)
+                # Le texte brut n'est plus utile en aval : on libère la mémoire tôt.
+                job["full_text"], job["page_texts"] = "", {}
+                print(f"{tag} [chunks] {len(job['chunks'])} chunks{dedup_label(job)}.", flush=True)
+                embed_q.put(job)  # bloque si l'étage embeddings est saturé
+        except Exception as e:
+            fail(tag, rel_path, e)
+
+    def resume(idx: int, pdf_path: Path, entry: dict) -> None:
+        """Document repris depuis le journal : ni parsing, ni chunking, ni chunks déjà acquittés."""
+        rel_path = _storage_path(pdf_path)
+        tag = f"[{idx}/{total}]"
+        acked = entry["acked"]
+        print(f"{tag} {pdf_path.relative_to(source_dir)}", flush=True)
+        try:
+            job = dict(entry["job"], idx=idx, tag=tag, rel_path=rel_path, document_id=entry["document_id"])
+            index.claim_doi(job["meta"]["doi"])
+            # Au-delà du front acquitté : batches terminés dans le désordre ou envoyés sans acquittement.
+            sb.table("chunks").delete().eq("document_id", job["document_id"]).gte("position", acked).execute()
+            with lock:
+                stats["resumed"] += 1
+            if entry["text_sha256"] is None:
+                stream_document(
+                    sb, job, index, is_author_article, embed_q, stats, lock, journal, chunk_index,
+                    resume_from=acked, range_workers=range_workers,
+                )
+                return
+            chunks, embeddings = journal.load_chunks(rel_path, acked, EMBED_DIM)
+            job.update(chunks=chunks, position_offset=acked, chunks_count=entry["chunks_count"], final=True)
+            source = "embeddings journalisés" if embeddings is not None else "embeddings à recalculer"
+            print(f"{tag} ♻️   Reprise : {acked}/{entry['chunks_count']} chunks déjà insérés, {source}.", flush=True)
+            if embeddings is None:
+                embed_q.put(job)
+            else:
+                job.update(embeddings=embeddings, journaled=True)
+                write_q.put(job)
+        except Exception as e:
+            fail(tag, rel_path, e)
+
+    try:
+        if resumed:
+            print(f"♻️   {len(resumed)} document(s) repris depuis le journal.", flush=True)
+        for idx, (pdf_path, entry) in enumerate(resumed, 1):
+            resume(idx, pdf_path, entry)
+        first = len(resumed) + 1
+        if workers <= 1:
+            # Extraction dans le thread principal ; embeddings et writes restent en parallèle.
+            for idx, pdf_path in enumerate(pdf_files, first):
+                try:
+                    result, exc = extract_document(pdf_path, fingerprints.get(pdf_path), stream_min_pages, range_workers), None
+                except Exception as e:
+                    result, exc = None, e
+                handle(idx, pdf_path, result, exc)
+        else:
+            # "spawn" : pas de fork d'un processus qui a déjà chargé torch.
+            ctx = multiprocessing.get_context("spawn")
+            pool_ranges = pool_range_workers(workers, range_workers)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                pending: dict = {}
+                files = iter(enumerate(pdf_files, first))
+                max_in_flight = workers * 2
+                while True:
+                    while len(pending) < max_in_flight:
+                        nxt = next(files, None)
+                        if nxt is None:
+                            break
+                        pending[pool.submit(
+                            extract_document, nxt[1], fingerprints.get(nxt[1]), stream_min_pages, pool_ranges,
+                        )] = nxt
+                    if not pending:
+                        break
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        idx, pdf_path = pending.pop(fut)
+                        exc = fut.exception()
+                        handle(idx, pdf_path, None if exc else fut.result(), exc)
+    finally:
+        embed_q.put(_STOP)
+        embedder.join()
+        write_thread.join()
+        writer.close()
+    stats["embedded_chunks"] = batcher.chunks
+    stats["fts_only_chunks"] = batcher.fts_only
+    stats["embed_seconds"] = batcher.seconds
+    # Estimation : coût moyen d'un chunk embeddé pendant ce run × chunks boilerplate non embeddés.
+    stats["embed_seconds_saved"] = stats["boilerplate_chunks"] * batcher.seconds / max(batcher.chunks, 1)
+    return stats
 
 
 # ── Main ──────────────────────────────────────────────────────────────────────
@@ -329,6 +1484,91 @@ def main():
         action="store_true",
         help="Ingérer les articles du chercheur (data/Articles auteur/) avec is_author_article=True",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=EXTRACT_WORKERS,
+        help=f"Processus d'extraction PDF en parallèle (défaut: {EXTRACT_WORKERS} ; 1 = extraction dans le processus principal)",
+    )
+    parser.add_argument(
+        "--range-workers",
+        type=int,
+        default=RANGE_WORKERS,
+        help=f"Processus par PDF d'au moins {RANGE_MIN_PAGES} pages, extrait par tranches de {RANGE_PAGES} pages"
+             f" (défaut: {RANGE_WORKERS} ; 1 = page par page). Dans les workers du pool : au plus cpu // --workers",
+    )
+    parser.add_argument(
+        "--embed-batch",
+        type=int,
+        default=EMBED_BATCH,
+        help=f"Chunks par batch d'embedding, tous documents confondus (défaut: {EMBED_BATCH} ; 0 = un batch par document)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Ne traite que les PDF nouveaux ou modifiés depuis le dernier run (manifest local data/.ingest_manifest.sqlite)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help=f"Mode flux (mémoire bornée) pour tous les PDF ; par défaut seulement à partir de {STREAM_MIN_PAGES} pages",
+    )
+    parser.add_argument(
+        "--writer",
+        choices=("rest", "async", "copy"),
+        default="rest",
+        help=(
+            "rest : PostgREST par batches (défaut) ; async : PostgREST asyncio, plusieurs batches en vol ; "
+            "copy : COPY binaire via SUPABASE_DB_URL, une transaction par document"
+        ),
+    )
+    parser.add_argument(
+        "--inflight",
+        type=int,
+        default=INSERT_INFLIGHT,
+        help=f"Batches de chunks envoyés en parallèle avec --writer async (défaut: {INSERT_INFLIGHT})",
+    )
+    parser.add_argument(
+        "--bulk-index",
+        action="store_true",
+        help="Supprime idx_chunks_embedding avant le run et le reconstruit à la fin (gros chargements ; requiert SUPABASE_DB_URL)",
+    )
+    parser.add_argument(
+        "--embed-backend",
+        choices=("torch", "onnx", "server"),
+        default="torch",
+        help=(
+            "torch : sentence-transformers fp32 (défaut) ; onnx : ONNX Runtime int8 (voir scripts/embedder.py compare) ; "
+            "server : service local scripts/embed_server.py (modèle partagé)"
+        ),
+    )
+    parser.add_argument(
+        "--embed-threads",
+        type=int,
+        default=0,
+        help="Threads intra-op du modèle d'embeddings (défaut : cœurs non utilisés par --workers)",
+    )
+    parser.add_argument(
+        "--no-journal",
+        action="store_true",
+        help="Désactive le journal de reprise (data/.ingest_journal.sqlite) : un document interrompu repart de zéro",
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="Désactive la dédup par contenu : boilerplate / quasi-doublons de chunks et documents quasi-doublons"
+             " (data/.chunk_fingerprints.sqlite, data/.doc_fingerprints.sqlite)",
+    )
+    parser.add_argument(
+        "--fts-only-sections",
+        default=",".join(FTS_ONLY_SECTIONS),
+        help="Préfixes de titres de section stockés sans embedding, FTS seule (défaut: %(default)s ; \"\" = tout embedder)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Désactive le cache disque des embeddings (data/.embed_cache/)",
+    )
     args = parser.parse_args()
 
     sb = get_supabase()
@@ -362,166 +1602,94 @@ def main():
     print(f"{mode_label}")
     print(f"📂  {len(pdf_files)} PDF trouvés — {label}.")
 
-    print("🤖  Chargement du modèle d'embeddings (all-MiniLM-L6-v2)...")
-    from sentence_transformers import SentenceTransformer
-    embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-    print("✅  Modèle prêt.\n")
-
-    stats = {"done": 0, "skipped": 0, "error": 0}
-
-    for idx, pdf_path in enumerate(pdf_files, 1):
-        rel_path = str(pdf_path.relative_to(project_root))
-        # Normalise les espaces dans le chemin (ex: "Articles auteur") pour Supabase
-        rel_path = rel_path.replace("\\", "/")
-        print(f"[{idx}/{len(pdf_files)}] {pdf_path.relative_to(source_dir)}")
-
-        try:
-            # ── Extraction texte ──────────────────────────────────────────
-            print("  [1/4] Extraction texte...", flush=True)
-            full_text, page_texts, ocr_count = extract_text_with_ocr_fallback(pdf_path)
-            print(f"  [1/4] {len(page_texts)} pages, {len(full_text)} chars, OCR: {ocr_count} pages.", flush=True)
-            if not full_text.strip():
-                raise ValueError("Aucun texte extrait (PDF vide ou illisible).")
-
-            # ── Métadonnées + dédup ───────────────────────────────────────
-            doc_fitz = fitz.open(pdf_path)
-            try:
-                meta = extract_metadata(doc_fitz, full_text, pdf_path)
-            finally:
-                doc_fitz.close()
-
-            print(f"  [meta] titre: {repr((meta['title'] or '')[:80])}", flush=True)
-            print(f"  [meta] journal: {repr(meta['journal'] or '(vide)')}", flush=True)
-            print(f"  [meta] published_at: {meta['published_at'] or '(vide)'} | doi: {(meta['doi'] or '')[:40] or '(vide)'}", flush=True)
-
-            # Dédup DOI
-            if already_indexed_by_doi(sb, meta["doi"]):
-                print(f"  ⏭   Déjà en base (DOI), skip.")
-                stats["skipped"] += 1
-                continue
-
-            # Dédup storage_path
-            existing = find_existing_by_path(sb, rel_path)
-            if existing:
-                if existing["status"] == "done":
-                    print(f"  ⏭   Déjà indexé (path), skip.")
-                    stats["skipped"] += 1
-                    continue
-                # error ou processing : on nettoie et on ré-ingère
-                doc_id = existing["id"]
-                sb.table("chunks").delete().eq("document_id", doc_id).execute()
-                sb.table("documents").delete().eq("id", doc_id).execute()
-                print(f"  🔄  Ré-ingestion (ancien status: {existing['status']}).")
-
-            # ── Insert document ───────────────────────────────────────────
-            doc_row = sb.table("documents").insert({
-                "title":              meta["title"],
-                "authors":            meta["authors"],
-                "doi":                meta["doi"],
-                "journal":            meta["journal"],
-                "published_at":       meta["published_at"],
-                "storage_path":       rel_path,
-                "status":             "processing",
-                "error_message":      None,
-                "is_author_article":  is_author_article,
-            }).execute()
-            document_id = doc_row.data[0]["id"]
-
-            # ── Chunking ──────────────────────────────────────────────────
-            print("  [2/4] Chunking...", flush=True)
-            chunks_data = chunk_text(full_text, page_texts)
-            print(f"  [2/4] {len(chunks_data)} chunks.", flush=True)
-
-            # ── Embeddings ────────────────────────────────────────────────
-            print("  [3/4] Embeddings...", flush=True)
-            contents = [c[0] for c in chunks_data]
-            embeddings = embed_model.encode(contents, show_progress_bar=False)
-            print(f"  [3/4] {len(embeddings)} embeddings produits.", flush=True)
-
-            # ── Insert chunks (batchs de INSERT_BATCH) ────────────────────
-            print(f"  [4/4] Insert chunks (batches de {INSERT_BATCH})...", flush=True)
-            batch = []
-            for pos, ((content, page, section_title), emb) in enumerate(zip(chunks_data, embeddings)):
-                batch.append({
-                    "document_id":  document_id,
-                    "content":      content,
-                    "position":     pos,
-                    "page":         page,
-                    "section_title": clean(section_title) if section_title else None,
-                    "embedding":    emb.tolist(),
-                })
-                if len(batch) >= INSERT_BATCH:
-                    for attempt in range(3):
-                        try:
-                            sb.table("chunks").insert(batch).execute()
-                            break
-                        except Exception as e:
-                            if attempt == 2:
-                                raise
-                            print(f"  [4/4] Retry {attempt+1}/3 après erreur: {str(e)[:60]}", flush=True)
-                            time.sleep(2 ** attempt)
-                    print(f"  [4/4] {min(pos+1, len(chunks_data))}/{len(chunks_data)} chunks insérés.", flush=True)
-                    batch = []
-                    time.sleep(INSERT_PAUSE)
-            if batch:
-                for attempt in range(3):
-                    try:
-                        sb.table("chunks").insert(batch).execute()
-                        break
-                    except Exception as e:
-                        if attempt == 2:
-                            raise
-                        time.sleep(2 ** attempt)
-            print(f"  [4/4] {len(chunks_data)}/{len(chunks_data)} chunks insérés.", flush=True)
-
-            # ── Finalisation document ─────────────────────────────────────
-            ingested_at = datetime.now(timezone.utc).isoformat()
-            sb.table("documents").update({
-                "status": "done",
-                "error_message": None,
-                "ingestion_log": {
-                    "chunks_count":        len(chunks_data),
-                    "ocr_pages_count":     ocr_count,
-                    "title_extracted":     bool(meta["title"]),
-                    "doi_extracted":       bool(meta["doi"]),
-                    "journal_extracted":   bool(meta["journal"]),
-                    "year_extracted":      bool(meta["published_at"]),
-                    "ingested_at":         ingested_at,
-                },
-                "updated_at": ingested_at,
-            }).eq("id", document_id).execute()
-
-            print(f"  ✅  OK — {len(chunks_data)} chunks | journal: {meta['journal'] or '-'} | année: {meta['published_at'] or '-'}")
-            stats["done"] += 1
-
-        except Exception as e:
-            err = str(e)[:1000]
-            print(f"  ❌  Erreur: {err}")
-            stats["error"] += 1
-            time.sleep(1)  # pause avant de continuer
-            try:
-                ingested_at = datetime.now(timezone.utc).isoformat()
-                r = sb.table("documents").select("id").eq("storage_path", rel_path).execute()
-                if r.data:
-                    sb.table("documents").update({
-                        "status": "error",
-                        "error_message": err,
-                        "ingestion_log": {"error": err, "ingested_at": ingested_at},
-                        "updated_at": ingested_at,
-                    }).eq("id", r.data[0]["id"]).execute()
-                else:
-                    sb.table("documents").insert({
-                        "storage_path": rel_path,
-                        "status": "error",
-                        "error_message": err,
-                        "ingestion_log": {"error": err, "ingested_at": ingested_at},
-                    }).execute()
-            except Exception as e2:
-                print(f"  ⚠️   Log erreur non enregistré: {str(e2)[:80]}", flush=True)
+    try:
+        print(f"✂️   Découpage : {token_counter_name()}.")
+    except RuntimeError as e:
+        sys.exit(f"❌  {e}")
+
+    workers = max(1, args.workers)
+    # Threads intra-op : les cœurs laissés libres par les processus d'extraction.
+    embed_threads = args.embed_threads or max(1, (os.cpu_count() or 2) - workers)
+    print(f"🤖  Chargement du modèle d'embeddings ({EMBED_MODEL}, backend {args.embed_backend})...")
+    embed_model = load_embedder(args.embed_backend, EMBED_MODEL, embed_threads)
+    print(f"✅  Modèle prêt ({embed_model.threads} threads).\n")
+    cache = None if args.no_cache else EmbeddingCache(embed_model.cache_name, EMBED_NORMALIZE, EMBED_DIM)
+
+    print("📥  Préchargement de l'index documents (dédup locale)...", flush=True)
+    index = DocumentIndex.load(sb)
+    print(f"✅  {len(index.by_path)} storage_path | {len(index.done_dois)} DOI done.\n")
+
+    manifest = IngestManifest()
+    journal = None if args.no_journal else IngestJournal()
+    chunk_index = None if args.no_dedup else ChunkFingerprintIndex()
+    doc_index = None if args.no_dedup else DocumentFingerprintIndex()
+    fts_sections = tuple(p.strip().lower() for p in args.fts_only_sections.split(",") if p.strip())
+    if doc_index is not None and doc_index.count() == 0 and any(e["status"] == "done" for e in index.by_path.values()):
+        print("💡  Index d'empreintes documents vide : python3 scripts/doc_fingerprints.py --rebuild pour y charger le corpus.\n")
+
+    print(
+        f"⚙️   Pipeline : {workers} worker(s) d'extraction, files bornées à {QUEUE_SIZE} documents ; "
+        f"PDF >= {RANGE_MIN_PAGES} pages par tranches sur {max(1, pool_range_workers(workers, args.range_workers))} "
+        f"processus par worker ({max(1, args.range_workers)} en mode flux).\n"
+    )
+    writer = None
+    db_url = None
+    if args.writer == "copy" or args.bulk_index:
+        import ingest_pg
+        from db_conn import get_db_url
+        db_url = get_db_url("--writer copy" if args.writer == "copy" else "--bulk-index")
+        if args.writer == "copy":
+            writer = ingest_pg.CopyWriter(db_url)
+        if args.bulk_index:
+            ingest_pg.drop_vector_index(db_url)
+    if args.writer == "async":
+        from ingest_async import AsyncRestWriter
+        writer = AsyncRestWriter(*supabase_credentials(), inflight=args.inflight, batch_size=INSERT_BATCH)
+    inflight_label = f" ({writer.inflight} batches en vol)" if args.writer == "async" else ""
+    print(f"✍️   Writer : {args.writer}{inflight_label}{' + index bulk' if args.bulk_index else ''}.\n")
+
+    started = time.monotonic()
+    try:
+        stats = run_pipeline(
+            sb, embed_model, pdf_files, source_dir, is_author_article, workers, args.embed_batch, cache, index,
+            manifest, args.incremental, 1 if args.stream else STREAM_MIN_PAGES, writer, journal, chunk_index, doc_index,
+            fts_sections, args.range_workers,
+        )
+    finally:
+        if args.bulk_index:
+            ingest_pg.rebuild_vector_index(db_url)
+    elapsed = time.monotonic() - started
 
     # ── Récap final ───────────────────────────────────────────────────────────
     print(f"\n{'='*60}")
     print(f"🎉  Ingestion terminée : {stats['done']} OK | {stats['skipped']} skippés | {stats['error']} erreurs")
+    if stats["resumed"]:
+        print(f"♻️   Reprises depuis le journal : {stats['resumed']} document(s)")
+    if doc_index is not None:
+        print(f"📑  Quasi-doublons (documents) : {stats['duplicate_docs']} passés en done sans chunks | {doc_index.count()} documents dans l'index")
+        doc_index.close()
+    print(f"⏱   Durée : {elapsed:.1f}s ({len(pdf_files) / max(elapsed, 1e-9):.2f} PDF/s)")
+    batch_label = f"batches de {args.embed_batch}" if args.embed_batch > 0 else "un batch par document"
+    print(
+        f"🧮  Embeddings : {stats['embedded_chunks']} chunks en {stats['embed_seconds']:.1f}s "
+        f"({stats['embedded_chunks'] / max(stats['embed_seconds'], 1e-9):.0f} chunks/s, {batch_label})"
+    )
+    if stats["fts_only_chunks"]:
+        print(f"📚  Sections FTS seule ({', '.join(fts_sections)}) : {stats['fts_only_chunks']} chunks sans embedding")
+    if chunk_index is not None:
+        print(
+            f"🧹  Boilerplate : {stats['boilerplate_chunks']} chunks sans embedding (FTS seule, "
+            f"≈ {stats['embed_seconds_saved']:.1f}s d'embedding évitées) | "
+            f"{stats['near_duplicate_chunks']} quasi-doublons signalés"
+        )
+        print(f"🧹  Index d'empreintes : {chunk_index.summary()}")
+        chunk_index.close()
+    if cache is not None:
+        print(f"🗄   Cache embeddings : {cache.summary()}")
+        cache.close()
+    manifest.close()
+    if journal is not None:
+        journal.close()
     try:
         r = sb.table("documents").select("id", count="exact").eq("status", "done").execute()
         n = r.count if hasattr(r, "count") and r.count else len(r.data or [])
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Writer asyncio pour ingest.py (--writer async) : PostgREST sans bloquer le pipeline.
+
+Avec le writer REST synchrone, chaque insert, chaque retry (time.sleep), chaque
+update de status et chaque log d'erreur bloque l'étage writer ; quand le réseau
+ralentit, la file se remplit et l'extraction / les embeddings s'arrêtent.
+Ici les batches de chunks partent en parallèle (au plus `inflight` requêtes en vol),
+chaque requête a ses propres retries avec backoff exponentiel + jitter, et le
+passage en status=done d'un document n'est envoyé qu'une fois tous ses batches
+acquittés. Tant que `inflight` batches sont en vol, la lecture de la file est
+suspendue : la contre-pression vers l'amont est conservée.
+
+Le writer tourne dans le thread writer d'ingest.py avec sa propre boucle asyncio.
+"""
+import asyncio
+import random
+from datetime import datetime, timezone
+
+from supabase import acreate_client
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 0.5   # secondes ; délai ≈ BACKOFF_BASE × 2^tentative × jitter [0.5, 1.5]
+
+
+async def with_retry(make_request, label: str):
+    """Exécute make_request() (coroutine factory) avec backoff exponentiel + jitter."""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return await make_request()
+        except Exception as e:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            delay = BACKOFF_BASE * (2 ** attempt) * random.uniform(0.5, 1.5)
+            print(f"{label} Retry {attempt+1}/{MAX_ATTEMPTS - 1} dans {delay:.1f}s après erreur: {str(e)[:60]}", flush=True)
+            await asyncio.sleep(delay)
+
+
+class AsyncRestWriter:
+    name = "async"
+
+    def __init__(self, url: str, key: str, inflight: int, batch_size: int):
+        self.url = url
+        self.key = key
+        self.inflight = max(1, inflight)
+        self.batch_size = batch_size
+
+    def run(self, in_q, stop, build_rows, build_log, on_done, on_error, on_batch=None) -> None:
+        """Consomme in_q jusqu'à `stop`.
+
+        build_rows(job) → lignes chunks ; build_log(job) → ingestion_log ;
+        on_done(job) / on_error(job, err) : bookkeeping local (stats, index, manifest) ;
+        on_batch(job, start, end) : batch de positions [start, end) inséré (ordre quelconque).
+        """
+        asyncio.run(self._main(in_q, stop, build_rows, build_log, on_done, on_error, on_batch))
+
+    def close(self) -> None:
+        pass  # le client async vit et meurt avec la boucle de run()
+
+    async def _main(self, in_q, stop, build_rows, build_log, on_done, on_error, on_batch) -> None:
+        client = await acreate_client(self.url, self.key)
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.inflight)
+        open_docs: dict = {}   # document_id → {"tasks": [...], "error": None ou message}
+        finishers: set = set()
+
+        async def insert_batch(job: dict, batch: list, label: str) -> None:
+            try:
+                await with_retry(lambda: client.table("chunks").insert(batch).execute(), label)
+                if on_batch is not None:
+                    on_batch(job, batch[0]["position"], batch[-1]["position"] + 1)
+            finally:
+                slots.release()
+
+        async def finish(job: dict, tasks: list, error: object) -> None:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            failures = [r for r in results if isinstance(r, BaseException)]
+            if error is None and failures:
+                error = str(failures[0])[:1000]
+            tag = f"{job['tag']} "
+            if error is None:
+                log = build_log(job)
+                try:
+                    await with_retry(
+                        lambda: client.table("documents").update({
+                            "status": "done",
+                            "error_message": None,
+                            "ingestion_log": log,
+                            "updated_at": log["ingested_at"],
+                        }).eq("id", job["document_id"]).execute(),
+                        f"{tag}[status]",
+                    )
+                    on_done(job)
+                    return
+                except Exception as e:
+                    error = str(e)[:1000]
+            on_error(job, error)
+            ingested_at = datetime.now(timezone.utc).isoformat()
+            try:
+                await with_retry(
+                    lambda: client.table("documents").update({
+                        "status": "error",
+                        "error_message": error,
+                        "ingestion_log": {"error": error, "ingested_at": ingested_at},
+                        "updated_at": ingested_at,
+                    }).eq("id", job["document_id"]).execute(),
+                    f"{tag}[status]",
+                )
+            except Exception as e2:
+                print(f"{tag}⚠️   Log erreur non enregistré: {str(e2)[:80]}", flush=True)
+
+        while True:
+            job = await loop.run_in_executor(None, in_q.get)
+            if job is stop:
+                break
+            doc = open_docs.setdefault(job["document_id"], {"tasks": [], "error": None})
+            if job.get("error"):
+                doc["error"] = doc["error"] or job["error"]
+            if doc["error"] is None:
+                rows = build_rows(job)
+                for i in range(0, len(rows), self.batch_size):
+                    await slots.acquire()  # au plus `inflight` batches en vol
+                    label = f"{job['tag']} [insert] batch {(job.get('position_offset', 0) + i) // self.batch_size + 1}"
+                    doc["tasks"].append(asyncio.create_task(insert_batch(job, rows[i:i + self.batch_size], label)))
+            if job.get("final", True):
+                del open_docs[job["document_id"]]
+                task = asyncio.create_task(finish(job, doc["tasks"], doc["error"]))
+                finishers.add(task)
+                task.add_done_callback(finishers.discard)
+
+        # Documents jamais finalisés (erreur côté extraction en mode flux) : on laisse
+        # simplement leurs batches se terminer, le status reste celui posé par l'amont.
+        pending = [t for doc in open_docs.values() for t in doc["tasks"]]
+        await asyncio.gather(*finishers, *pending, return_exceptions=True)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Journal de reprise d'ingest.py : ce qui a déjà été fait pour chaque document en cours.
+
+Sans journal, un document resté en status=processing après un crash est supprimé
+(chunks + ligne documents) puis ré-ingéré depuis le parsing du PDF. Avec lui, la
+reprise repart de l'offset exact :
+  - hash du texte extrait et liste des chunks (contenu, page, section, offsets) :
+    plus de parsing ni d'OCR ni de chunking à refaire ;
+  - embeddings déjà calculés : pas de ré-encodage des chunks non encore insérés ;
+  - dernier batch d'insert acquitté (`acked` = nombre de chunks insérés en continu
+    depuis la position 0) : on reprend à cette position. Les chunks au-delà
+    (batches asynchrones terminés dans le désordre, batch envoyé mais non acquitté)
+    sont supprimés en base avant la reprise.
+Les entrées sont effacées quand le document passe en done (ou en error).
+
+Fichier : data/.ingest_journal.sqlite (ou INGEST_JOURNAL_PATH).
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).resolve().parent.parent
+
+DEFAULT_JOURNAL_PATH = Path(os.environ.get("INGEST_JOURNAL_PATH") or project_root / "data" / ".ingest_journal.sqlite")
+
+
+class IngestJournal:
+    def __init__(self, path: Path = DEFAULT_JOURNAL_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # check_same_thread=False : le writer acquitte les batches depuis son thread.
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " path TEXT PRIMARY KEY,"
+            " document_id TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " pipeline_version INTEGER NOT NULL,"
+            " text_sha256 TEXT,"              # NULL tant que le chunking n'est pas terminé
+            " chunks_count INTEGER,"
+            " acked INTEGER NOT NULL DEFAULT 0,"
+            " job TEXT NOT NULL,"             # meta, ocr, fingerprint… (JSON) pour finaliser
+            " updated_at TEXT NOT NULL"
+            ")"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " path TEXT NOT NULL,"
+            " position INTEGER NOT NULL,"
+            " content TEXT NOT NULL,"
+            " page INTEGER,"
+            " section_title TEXT,"
+            " char_start INTEGER,"
+            " char_end INTEGER,"
+            " embedding BLOB,"
+            " PRIMARY KEY (path, position)"
+            ") WITHOUT ROWID"
+        )
+        self._db.commit()
+        self._acks: dict = {}   # path → {start: end} batches acquittés au-delà du front continu
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def start(self, path: str, document_id: str, pdf_path: Path, pipeline_version: int, job: dict) -> None:
+        """Nouveau document (status=processing en base) : remplace toute entrée précédente."""
+        st = pdf_path.stat()
+        with self._lock:
+            self._db.execute("DELETE FROM chunks WHERE path = ?", (path,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO docs (path, document_id, size, mtime_ns, pipeline_version, text_sha256,"
+                " chunks_count, acked, job, updated_at) VALUES (?, ?, ?, ?, ?, NULL, NULL, 0, ?, ?)",
+                (path, str(document_id), st.st_size, st.st_mtime_ns, pipeline_version, json.dumps(job), self._now()),
+            )
+            self._db.commit()
+            self._acks.pop(path, None)
+
+    def add_chunks(self, path: str, offset: int, chunks: list) -> None:
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks (path, position, content, page, section_title, char_start, char_end)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(path, pos, *chunk) for pos, chunk in enumerate(chunks, offset)],
+            )
+            self._db.commit()
+
+    def chunked(self, path: str, text_sha256: str, chunks_count: int, job: dict) -> None:
+        """Chunking terminé : la reprise n'aura plus besoin du PDF."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE docs SET text_sha256 = ?, chunks_count = ?, job = ?, updated_at = ? WHERE path = ?",
+                (text_sha256, chunks_count, json.dumps(job), self._now(), path),
+            )
+            self._db.commit()
+
+    def save_embeddings(self, path: str, offset: int, embeddings) -> None:
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        with self._lock:
+            self._db.executemany(
+                "UPDATE chunks SET embedding = ? WHERE path = ? AND position = ?",
+                [(vec.tobytes(), path, pos) for pos, vec in enumerate(vectors, offset)],
+            )
+            self._db.commit()
+
+    def ack(self, path: str, start: int, end: int) -> None:
+        """Batch [start, end) inséré. Le front `acked` n'avance que sur une suite continue de batches."""
+        with self._lock:
+            row = self._db.execute("SELECT acked FROM docs WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                return
+            acked = row[0]
+            pending = self._acks.setdefault(path, {})
+            pending[start] = max(end, pending.get(start, end))
+            while acked in pending:
+                acked = pending.pop(acked)
+            self._db.execute("UPDATE docs SET acked = ?, updated_at = ? WHERE path = ?", (acked, self._now(), path))
+            self._db.commit()
+
+    def get(self, path: str) -> object:
+        cols = ("path", "document_id", "size", "mtime_ns", "pipeline_version", "text_sha256", "chunks_count", "acked", "job")
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(cols)} FROM docs WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(zip(cols, row))
+        entry["job"] = json.loads(entry["job"])
+        return entry
+
+    def matches(self, entry: dict, document_id: object, pdf_path: Path, pipeline_version: int) -> bool:
+        """Le journal décrit bien ce document, ce fichier et cette version du pipeline."""
+        st = pdf_path.stat()
+        return (
+            entry["document_id"] == str(document_id)
+            and entry["size"] == st.st_size
+            and entry["mtime_ns"] == st.st_mtime_ns
+            and entry["pipeline_version"] == pipeline_version
+        )
+
+    def load_chunks(self, path: str, start: int, dim: int) -> tuple:
+        """(chunks à partir de `start`, embeddings (n, dim) ou None s'il en manque)."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT content, page, section_title, char_start, char_end, embedding FROM chunks"
+                " WHERE path = ? AND position >= ? ORDER BY position",
+                (path, start),
+            ).fetchall()
+        chunks = [tuple(r[:5]) for r in rows]
+        if not rows or any(r[5] is None for r in rows):
+            return chunks, None
+        return chunks, np.frombuffer(b"".join(r[5] for r in rows), dtype=np.float32).reshape(len(rows), dim).copy()
+
+    def finish(self, path: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM chunks WHERE path = ?", (path,))
+            self._db.execute("DELETE FROM docs WHERE path = ?", (path,))
+            self._db.commit()
+            self._acks.pop(path, None)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Manifest local d'ingestion : ce que ingest.py a déjà traité, fichier par fichier.
+
+Une ligne par PDF ingéré : path, size, mtime_ns, sha256, document_id,
+pipeline_version. Avec `ingest.py --incremental`, l'arbre est comparé au
+manifest avant tout accès réseau :
+  - size + mtime identiques (et même pipeline_version) → inchangé, pas de hash ;
+  - sinon on hash le fichier :
+      · même SHA-256 déjà connu sous un autre chemin → déplacé/renommé, pas de ré-ingestion ;
+      · même chemin, SHA-256 différent (ou pipeline_version plus ancienne) → modifié ;
+      · inconnu → nouveau.
+Seul le stat() est fait pour les fichiers inchangés : le diff du corpus complet
+tient en bien moins d'une seconde.
+
+Fichier : data/.ingest_manifest.sqlite (ou INGEST_MANIFEST_PATH).
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+
+DEFAULT_MANIFEST_PATH = Path(os.environ.get("INGEST_MANIFEST_PATH") or project_root / "data" / ".ingest_manifest.sqlite")
+HASH_BLOCK = 1 << 20  # lecture par blocs de 1 Mo
+
+
+def file_fingerprint(pdf_path: Path) -> dict:
+    """size, mtime_ns et SHA-256 d'un fichier."""
+    st = pdf_path.stat()
+    h = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": h.hexdigest()}
+
+
+class IngestManifest:
+    def __init__(self, path: Path = DEFAULT_MANIFEST_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # check_same_thread=False : le writer d'ingest.py enregistre depuis son thread.
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " sha256 TEXT NOT NULL,"
+            " document_id TEXT,"
+            " pipeline_version INTEGER NOT NULL,"
+            " ingested_at TEXT NOT NULL"
+            ")"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_files_sha256 ON files (sha256)")
+        self._db.commit()
+
+    def rows(self) -> dict:
+        """path → ligne (dict), tout le manifest en une requête."""
+        cols = ("path", "size", "mtime_ns", "sha256", "document_id", "pipeline_version")
+        with self._lock:
+            cur = self._db.execute(f"SELECT {', '.join(cols)} FROM files")
+            return {r[0]: dict(zip(cols, r)) for r in cur.fetchall()}
+
+    def record(self, path: str, fingerprint: dict, document_id: object, pipeline_version: int) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256, document_id, pipeline_version, ingested_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    path, fingerprint["size"], fingerprint["mtime_ns"], fingerprint["sha256"],
+                    str(document_id) if document_id is not None else None,
+                    pipeline_version, datetime.now(timezone.utc).isoformat(),
+                ),
+            )
+            self._db.commit()
+
+    def forget(self, path: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+            self._db.commit()
+
+    def diff(self, files: list, pipeline_version: int) -> dict:
+        """Compare [(storage_path, Path)] au manifest.
+
+        Retourne {"unchanged": [...], "new": [...], "changed": [...], "moved": [...]} ;
+        chaque entrée est (storage_path, Path, fingerprint, ligne du manifest ou None).
+        Le fingerprint vaut None pour les fichiers inchangés (pas de hash calculé).
+        """
+        known = self.rows()
+        by_sha: dict = {}
+        for row in known.values():
+            if row["pipeline_version"] == pipeline_version:
+                by_sha.setdefault(row["sha256"], row)
+        out = {"unchanged": [], "new": [], "changed": [], "moved": []}
+        for rel_path, pdf_path in files:
+            row = known.get(rel_path)
+            st = pdf_path.stat()
+            if (
+                row is not None
+                and row["size"] == st.st_size
+                and row["mtime_ns"] == st.st_mtime_ns
+                and row["pipeline_version"] == pipeline_version
+            ):
+                out["unchanged"].append((rel_path, pdf_path, None, row))
+                continue
+            fp = file_fingerprint(pdf_path)
+            if row is not None and row["sha256"] == fp["sha256"] and row["pipeline_version"] == pipeline_version:
+                # touch / copie qui préserve le contenu : on rafraîchit juste size/mtime
+                out["unchanged"].append((rel_path, pdf_path, fp, row))
+                continue
+            twin = by_sha.get(fp["sha256"])
+            if twin is not None and twin["path"] != rel_path:
+                out["moved"].append((rel_path, pdf_path, fp, twin))
+            elif row is not None:
+                out["changed"].append((rel_path, pdf_path, fp, row))
+            else:
+                out["new"].append((rel_path, pdf_path, fp, None))
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Writer Postgres direct pour ingest.py (--writer copy) : COPY binaire des chunks.
+
+Le writer REST (PostgREST, batches de INSERT_BATCH, embeddings en JSON) reste le
+défaut. Celui-ci passe par SUPABASE_DB_URL (psycopg2) :
+  - COPY public.chunks (...) FROM STDIN en format binaire : uuid, int4, texte et
+    halfvec encodés directement (pgvector : int16 dim, int16 réservé, float16 BE),
+    aucun float sérialisé en texte ; embedding_bit en format binaire bit (varbit) ;
+  - une transaction par document : tous ses chunks + le passage en status=done
+    sont validés ensemble (rollback complet en cas d'erreur) ;
+  - mode bulk optionnel (--bulk-index) : DROP de idx_chunks_embedding avant le run,
+    reconstruction HNSW à la fin avec maintenance_work_mem relevé.
+
+Un document en mode flux arrive en plusieurs segments consécutifs : ils restent
+dans la même transaction jusqu'au segment final.
+"""
+import io
+import json
+import os
+import struct
+import time
+import uuid
+
+import numpy as np
+import psycopg2
+
+from db_conn import MAINTENANCE_MEM
+from vector_format import bit_binary_rows, halfvec_binary_rows
+
+CHUNK_COLUMNS = (
+    "document_id", "content", "position", "page", "section_title", "char_start", "char_end", "embedding", "embedding_bit",
+)
+
+VECTOR_INDEX          = "idx_chunks_embedding"
+VECTOR_INDEX_DDL      = (
+    f"CREATE INDEX IF NOT EXISTS {VECTOR_INDEX} ON public.chunks "
+    "USING hnsw (embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)"
+)
+BULK_PARALLEL_WORKERS = int(os.environ.get("INGEST_PARALLEL_MAINTENANCE_WORKERS") or 4)
+
+_PGCOPY_HEADER  = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_PGCOPY_TRAILER = struct.pack("!h", -1)
+_NULL           = struct.pack("!i", -1)
+
+
+def _field(payload: bytes) -> bytes:
+    return struct.pack("!i", len(payload)) + payload
+
+
+def _text(value: object) -> bytes:
+    if value is None:
+        return _NULL
+    # Postgres refuse les NUL dans un text
+    return _field(str(value).replace("\x00", " ").encode("utf-8"))
+
+
+def _int4(value: object) -> bytes:
+    return _NULL if value is None else _field(struct.pack("!i", int(value)))
+
+
+def _fields(rows: np.ndarray) -> np.ndarray:
+    """Préfixe chaque ligne (uint8) de sa longueur de champ COPY."""
+    head = np.frombuffer(struct.pack("!i", rows.shape[1]), dtype=np.uint8)
+    return np.hstack([np.broadcast_to(head, (rows.shape[0], head.size)), rows])
+
+
+def _vector_fields(embeddings) -> list:
+    """Champs embedding + embedding_bit de chaque ligne, encodés en bloc (ligne NaN : deux NULL, section FTS seule)."""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    rows = np.hstack([_fields(halfvec_binary_rows(matrix)), _fields(bit_binary_rows(matrix))])
+    fields = [row.tobytes() for row in rows]
+    for i in np.flatnonzero(np.isnan(matrix[:, 0])):
+        fields[i] = _NULL + _NULL
+    return fields
+
+
+def encode_copy_binary(document_id: str, chunks: list, embeddings, start_pos: int = 0) -> bytes:
+    """Flux COPY binaire pour CHUNK_COLUMNS."""
+    doc_uuid = _field(uuid.UUID(str(document_id)).bytes)
+    out = [_PGCOPY_HEADER]
+    row_head = struct.pack("!h", len(CHUNK_COLUMNS))
+    vector_fields = _vector_fields(embeddings) if len(chunks) else []
+    for pos, ((content, page, section_title, char_start, char_end), vectors) in enumerate(zip(chunks, vector_fields), start_pos):
+        out.append(row_head)
+        out.append(doc_uuid)
+        out.append(_text(content))
+        out.append(_int4(pos))
+        out.append(_int4(page))
+        out.append(_text(section_title))
+        out.append(_int4(char_start))
+        out.append(_int4(char_end))
+        out.append(vectors)
+    out.append(_PGCOPY_TRAILER)
+    return b"".join(out)
+
+
+class CopyWriter:
+    name = "copy"
+
+    def __init__(self, db_url: str):
+        self.conn = psycopg2.connect(db_url)
+        self.conn.autocommit = False
+        with self.conn.cursor() as cur:
+            cur.execute("SET statement_timeout = 0;")
+        self.conn.commit()
+        self.open_document = None  # document dont la transaction est en cours
+
+    def write_chunks(self, job: dict, tag: str = "") -> None:
+        self.open_document = job["document_id"]
+        payload = encode_copy_binary(
+            job["document_id"], job["chunks"], job["embeddings"], job.get("position_offset", 0),
+        )
+        t0 = time.monotonic()
+        with self.conn.cursor() as cur:
+            cur.copy_expert(
+                f"COPY public.chunks ({', '.join(CHUNK_COLUMNS)}) FROM STDIN WITH (FORMAT binary)",
+                io.BytesIO(payload),
+            )
+        end = job.get("position_offset", 0) + len(job["chunks"])
+        print(
+            f"{tag}[insert] COPY {len(job['chunks'])} chunks ({len(payload) / 1024:.0f} Ko, "
+            f"{time.monotonic() - t0:.2f}s) → {end} au total.",
+            flush=True,
+        )
+
+    def finalize(self, job: dict, log: dict) -> None:
+        with self.conn.cursor() as cur:
+            cur.execute(
+                "UPDATE public.documents SET status = 'done', error_message = NULL,"
+                " ingestion_log = %s::jsonb, updated_at = %s WHERE id = %s",
+                (json.dumps(log), log["ingested_at"], job["document_id"]),
+            )
+        self.conn.commit()
+        self.open_document = None
+
+    def abort(self, job: dict) -> None:
+        try:
+            self.conn.rollback()
+        finally:
+            self.open_document = None
+
+    def close(self) -> None:
+        if self.open_document is not None:
+            self.conn.rollback()
+        self.conn.close()
+
+
+def drop_vector_index(db_url: str) -> None:
+    conn = psycopg2.connect(db_url)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET statement_timeout = 0;")
+            cur.execute(f"DROP INDEX IF EXISTS public.{VECTOR_INDEX};")
+    finally:
+        conn.close()
+    print(f"🧹  Index {VECTOR_INDEX} supprimé (mode bulk) — reconstruit en fin de run.", flush=True)
+
+
+def rebuild_vector_index(db_url: str) -> None:
+    print(
+        f"🏗   Reconstruction de {VECTOR_INDEX} (HNSW, maintenance_work_mem={MAINTENANCE_MEM}, "
+        f"{BULK_PARALLEL_WORKERS} workers)...",
+        flush=True,
+    )
+    t0 = time.monotonic()
+    conn = psycopg2.connect(db_url)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET statement_timeout = 0;")
+            cur.execute("SET maintenance_work_mem = %s;", (MAINTENANCE_MEM,))
+            cur.execute("SET max_parallel_maintenance_workers = %s;", (BULK_PARALLEL_WORKERS,))
+            cur.execute(VECTOR_INDEX_DDL + ";")
+    finally:
+        conn.close()
+    print(f"✅  Index {VECTOR_INDEX} reconstruit en {time.monotonic() - t0:.0f}s.", flush=True)
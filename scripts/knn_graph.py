@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Graphe des k plus proches voisins (cosinus) des embeddings, mis en cache sur disque.
+
+La plus grosse part d'un calcul UMAP (compute_umap.py) est la construction du
+graphe kNN ; il ne dépend que des embeddings, pas de min_dist ni de la mise en
+page. Il est donc calculé une fois par état du corpus (pynndescent, NN-descent
+multi-thread) et rangé sous data/.knn/<empreinte>/ (ou KNN_GRAPH_DIR) :
+  - indices.npy   : int32 (n, k), voisins de chaque ligne (position dans ids.npy,
+    le point lui-même en premier) ;
+  - distances.npy : float32 (n, k), distances cosinus correspondantes ;
+  - ids.npy       : ids des chunks, dans l'ordre des lignes ;
+  - search_index.pkl : index NNDescent (UMAP en a besoin pour transform) ;
+  - meta.json     : n, k, métrique, date, durée de construction.
+Les tableaux s'ouvrent en memmap (np.load(mmap_mode="r")) : un autre job hors
+ligne (documents similaires, audits, clustering) lit le graphe sans le recharger
+en mémoire ni le recalculer.
+
+L'empreinte (corpus_fingerprint) couvre les ids, les vecteurs, k et la métrique :
+un chunk ajouté ou réembeddé donne un nouveau graphe. Les KEEP_GRAPHS graphes
+les plus récents sont gardés.
+
+Usage :
+    graph = get_graph(ids, matrix, k=15)         # cache ou construction
+    graph.indices, graph.distances, graph.search_index()
+    graph = latest_graph()                       # dernier graphe construit (autres jobs)
+
+    cd scripts && python3 knn_graph.py --list
+    cd scripts && python3 knn_graph.py --neighbors <chunk_id>    # voisins d'un chunk dans le dernier graphe
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).resolve().parent.parent
+
+KNN_GRAPH_DIR = Path(os.environ.get("KNN_GRAPH_DIR") or project_root / "data" / ".knn")
+KNN_METRIC    = "cosine"
+KEEP_GRAPHS   = 2        # graphes gardés sur disque (les plus récents)
+_HASH_BLOCK   = 65536    # lignes hachées par bloc (matrice jamais copiée en entier)
+
+
+def corpus_fingerprint(ids: list, matrix: np.ndarray, k: int, metric: str = KNN_METRIC) -> str:
+    """Empreinte blake2b des ids (dans l'ordre), des vecteurs float32, de k et de la métrique."""
+    h = hashlib.blake2b(digest_size=12)
+    h.update(f"k={k} metric={metric} n={len(ids)} dim={matrix.shape[1]}\n".encode())
+    h.update("\n".join(ids).encode())
+    for start in range(0, len(matrix), _HASH_BLOCK):
+        h.update(np.ascontiguousarray(matrix[start:start + _HASH_BLOCK], dtype=np.float32).tobytes())
+    return h.hexdigest()
+
+
+class KnnGraph:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / "meta.json").read_text())
+        self.indices = np.load(self.path / "indices.npy", mmap_mode="r")
+        self.distances = np.load(self.path / "distances.npy", mmap_mode="r")
+        self.ids = np.load(self.path / "ids.npy", mmap_mode="r")
+        self._search_index = None
+
+    def search_index(self) -> object:
+        """Index NNDescent (chargé à la demande : il contient une copie des vecteurs)."""
+        if self._search_index is None:
+            with open(self.path / "search_index.pkl", "rb") as f:
+                self._search_index = pickle.load(f)
+        return self._search_index
+
+    def neighbors(self, chunk_id: str) -> list:
+        """[(chunk_id, distance), ...] des voisins d'un chunk (hors lui-même)."""
+        row = np.searchsorted(self.ids, chunk_id)
+        if row >= len(self.ids) or self.ids[row] != chunk_id:
+            raise KeyError(chunk_id)  # ids.npy est trié : compute_umap lit les chunks ORDER BY id
+        return [(str(self.ids[j]), float(d)) for j, d in zip(self.indices[row], self.distances[row]) if j != row]
+
+
+def build_graph(matrix: np.ndarray, k: int, metric: str = KNN_METRIC) -> tuple:
+    """(indices int32, distances float32, index NNDescent) — tous les cœurs (n_jobs=-1)."""
+    from pynndescent import NNDescent
+
+    # Mêmes réglages que umap.umap_.nearest_neighbors (compressed=False : transform possible)
+    n_trees = min(64, 5 + int(round((matrix.shape[0]) ** 0.5 / 20.0)))
+    n_iters = max(5, int(round(np.log2(matrix.shape[0]))))
+    index = NNDescent(
+        matrix, n_neighbors=k, metric=metric, n_trees=n_trees, n_iters=n_iters,
+        max_candidates=60, low_memory=True, n_jobs=-1, compressed=False, verbose=True,
+    )
+    indices, distances = index.neighbor_graph
+    return indices.astype(np.int32), distances.astype(np.float32), index
+
+
+def _save(path: Path, ids: list, indices: np.ndarray, distances: np.ndarray, index, meta: dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    np.save(tmp / "indices.npy", indices)
+    np.save(tmp / "distances.npy", distances)
+    np.save(tmp / "ids.npy", np.asarray(ids, dtype="U36"))
+    with open(tmp / "search_index.pkl", "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    (tmp / "meta.json").write_text(json.dumps(meta, indent=2))  # écrit en dernier : marque un graphe complet
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+
+def _graphs() -> list:
+    """Graphes complets, le plus récent d'abord."""
+    if not KNN_GRAPH_DIR.exists():
+        return []
+    paths = [p for p in KNN_GRAPH_DIR.iterdir() if (p / "meta.json").exists() and not p.name.endswith(".tmp")]
+    return sorted(paths, key=lambda p: (p / "meta.json").stat().st_mtime, reverse=True)
+
+
+def get_graph(ids: list, matrix: np.ndarray, k: int, metric: str = KNN_METRIC) -> KnnGraph:
+    """Graphe kNN de ces embeddings : depuis le cache si l'empreinte y est, sinon construit et rangé."""
+    t0 = time.monotonic()
+    key = corpus_fingerprint(ids, matrix, k, metric)
+    path = KNN_GRAPH_DIR / key
+    if (path / "meta.json").exists():
+        os.utime(path / "meta.json")  # récent : pas élagué
+        print(f"📂  Graphe kNN en cache ({key}, empreinte {time.monotonic() - t0:.1f}s).", flush=True)
+        return KnnGraph(path)
+
+    print(f"🔗  Construction du graphe kNN (k={k}, {len(ids)} points)...", flush=True)
+    t1 = time.monotonic()
+    indices, distances, index = build_graph(matrix, k, metric)
+    meta = {
+        "n": len(ids),
+        "k": k,
+        "metric": metric,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "build_seconds": round(time.monotonic() - t1, 1),
+    }
+    _save(path, ids, indices, distances, index, meta)
+    for old in _graphs()[KEEP_GRAPHS:]:
+        shutil.rmtree(old, ignore_errors=True)
+    print(f"✅  Graphe kNN construit en {meta['build_seconds']:.0f}s → {path}.", flush=True)
+    return KnnGraph(path)
+
+
+def latest_graph() -> object:
+    """Dernier graphe construit ou utilisé (None s'il n'y en a pas)."""
+    graphs = _graphs()
+    return KnnGraph(graphs[0]) if graphs else None
+
+
+# ── CLI ───────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Graphes kNN en cache (compute_umap.py)")
+    parser.add_argument("--list", action="store_true", help="Graphes sur disque, le plus récent d'abord")
+    parser.add_argument("--neighbors", metavar="CHUNK_ID", help="Voisins d'un chunk dans le dernier graphe")
+    args = parser.parse_args()
+    if not (args.list or args.neighbors):
+        parser.error("--list ou --neighbors")
+
+    if args.list:
+        for path in _graphs():
+            meta = json.loads((path / "meta.json").read_text())
+            size = sum(f.stat().st_size for f in path.iterdir())
+            print(
+                f"{path.name}  n={meta['n']:<8} k={meta['k']:<3} {meta['metric']:<7} "
+                f"{meta['built_at']}  {meta['build_seconds']:>6.0f}s  {size / 1e6:>8.0f} Mo"
+            )
+    if args.neighbors:
+        graph = latest_graph()
+        if graph is None:
+            sys.exit(f"❌  Aucun graphe dans {KNN_GRAPH_DIR} (lancer compute_umap.py).")
+        try:
+            for chunk_id, dist in graph.neighbors(args.neighbors):
+                print(f"{dist:.4f}  {chunk_id}")
+        except KeyError:
+            sys.exit(f"❌  Chunk absent du graphe {graph.path.name}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+# Les scripts s'importent entre eux à plat (cd scripts && python3 ...).
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Pas de tokenizer.json figé sur une machine de test : tokens estimés (déterministe, sans réseau).
+os.environ.setdefault("CHUNK_TOKENS_APPROX", "1")
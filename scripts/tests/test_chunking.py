@@ -0,0 +1,67 @@
+"""chunk_page : offsets exacts, budget de tokens, lignes trop longues, sections propagées."""
+import random
+
+from chunking import CHUNK_MAX_TOKENS, approx_token_counts, chunk_page
+from ingest import iter_chunks
+
+WORDS = "copper ligand complex synthesis crystal reaction yield solvent oxidation electron bond".split()
+
+
+def word_count(texts: list) -> list:
+    """Un token par mot : additif d'une ligne à l'autre, budget facile à vérifier."""
+    return [len(t.split()) for t in texts]
+
+
+def page(seed: int, lines: int = 80) -> str:
+    rng = random.Random(seed)
+    out = []
+    for i in range(lines):
+        if i % 25 == 0:
+            out.append(["Introduction", "2. Results and Discussion", "References", "Conclusions"][i // 25 % 4])
+        out.append("  " * rng.randint(0, 1) + " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 14))))
+    return "\n".join(out)
+
+
+def test_offsets_match_content():
+    for seed in range(5):
+        text = page(seed)
+        for count in (word_count, approx_token_counts):
+            chunks = chunk_page(text, count)
+            assert chunks
+            for content, _, start, end in chunks:
+                assert text[start:end] == content
+
+
+def test_no_chunk_exceeds_token_budget():
+    for seed in range(5):
+        text = page(seed)
+        for max_tokens in (12, 40, CHUNK_MAX_TOKENS):
+            for content, _, _, _ in chunk_page(text, word_count, max_tokens=max_tokens):
+                assert word_count([content])[0] <= max_tokens
+
+
+def test_overlong_line_is_split_between_words():
+    words = [f"{WORDS[i % len(WORDS)]}{i}" for i in range(300)]
+    text = "Methods\n" + " ".join(words)
+    chunks = chunk_page(text, word_count, max_tokens=40)
+    assert len(chunks) > 1
+    seen = []
+    for content, section, start, end in chunks:
+        assert text[start:end] == content
+        assert word_count([content])[0] <= 40
+        assert section == "Methods"
+        seen += [w for w in content.split() if w != "Methods"]
+    assert set(seen) == set(words)  # aucun mot coupé ni perdu (recouvrement : répétitions permises)
+
+
+def test_section_carries_over_to_later_chunks_and_pages():
+    body = "\n".join(" ".join(WORDS) for _ in range(30))
+    chunks = chunk_page("Introduction\n" + body + "\nReferences\n" + body, word_count)
+    sections = [section for _, section, _, _ in chunks]
+    assert sections[0] == "Introduction" and sections[-1] == "References"
+    assert sections.count("Introduction") > 1 and sections.count("References") > 1
+    assert sections == sorted(sections, key=["Introduction", "References"].index)
+
+    pages = [(1, "Results\n" + body), (2, body), (3, "Conclusions\n" + body)]
+    titles = {page_num: {title for _, p, title, _, _ in iter_chunks(pages) if p == page_num} for page_num, _ in pages}
+    assert titles == {1: {"Results"}, 2: {"Results"}, 3: {"Conclusions"}}
@@ -0,0 +1,50 @@
+"""embed_server.Handler : une requête mal formée reçoit une erreur, la connexion continue."""
+import json
+import socket
+import struct
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+
+from embed_server import MAX_MSG, Handler, recv_msg, send_msg
+
+
+class FakeBatcher:
+    def submit(self, texts, normalize):
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+def serve() -> socket.socket:
+    server_side, client = socket.socketpair()
+    server = SimpleNamespace(
+        model_name="all-MiniLM-L6-v2", batcher=FakeBatcher(),
+        embedder=SimpleNamespace(backend="torch", threads=1),
+    )
+    threading.Thread(target=Handler, args=(server_side, None, server), daemon=True).start()
+    client.settimeout(5)
+    return client
+
+
+def reply(client: socket.socket) -> dict:
+    return json.loads(recv_msg(client))
+
+
+def test_malformed_requests_get_an_error_frame():
+    client = serve()
+    for frame in (b"{pas du json", b"\xff\xfe", b"[1, 2]", json.dumps({"op": "encode", "texts": [1, None]}).encode()):
+        send_msg(client, frame)
+        assert reply(client)["ok"] is False
+
+    send_msg(client, json.dumps({"op": "encode", "texts": ["a", "b"]}).encode())
+    assert reply(client) == {"ok": True, "n": 2, "dim": 4}
+    assert len(recv_msg(client)) == 2 * 4 * 4
+    client.close()
+
+
+def test_oversized_frame_closes_the_connection():
+    client = serve()
+    client.sendall(struct.pack("!I", MAX_MSG + 1))
+    assert reply(client)["ok"] is False
+    assert client.recv(1) == b""
+    client.close()
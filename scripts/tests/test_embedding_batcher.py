@@ -0,0 +1,57 @@
+"""EmbeddingBatcher : ordre de sortie des jobs (segments de documents en flux)."""
+import queue
+
+import numpy as np
+
+from ingest import EMBED_DIM, EmbeddingBatcher
+
+
+class FakeModel:
+    def encode(self, texts, **kwargs):
+        return np.ones((len(texts), EMBED_DIM), dtype=np.float32)
+
+
+def chunk(text: str, section: str = "Results") -> tuple:
+    return (text, 1, section, 0, len(text))
+
+
+def segment(seq: int, chunks: list, final: bool) -> dict:
+    return {"tag": "[1/1]", "document_id": "doc", "seq": seq, "chunks": chunks, "final": final}
+
+
+def drain(q: queue.Queue) -> list:
+    out = []
+    while not q.empty():
+        out.append(q.get_nowait())
+    return out
+
+
+def test_fts_only_final_segment_waits_for_previous_segment():
+    out = queue.Queue()
+    batcher = EmbeddingBatcher(FakeModel(), out, batch_size=64, flush_s=10.0, cache=None)
+    batcher.add(segment(1, [chunk("body"), chunk("ref", "References")], final=False))
+    batcher.add(segment(2, [chunk("ref 2", "References")], final=True))
+    assert drain(out) == []  # seg1 encore en attente d'encodage : seg2 ne passe pas devant
+
+    batcher.flush()
+    jobs = drain(out)
+    assert [job["seq"] for job in jobs] == [1, 2]
+    assert np.isnan(jobs[0]["embeddings"][1]).all() and not np.isnan(jobs[0]["embeddings"][0]).any()
+    assert np.isnan(jobs[1]["embeddings"]).all()
+
+
+def test_empty_job_keeps_arrival_order():
+    out = queue.Queue()
+    batcher = EmbeddingBatcher(FakeModel(), out, batch_size=64, flush_s=10.0, cache=None)
+    batcher.add(dict(segment(1, [chunk("a"), chunk("b")], final=True), document_id="doc1"))
+    batcher.add(dict(segment(2, [], final=True), document_id="doc2"))  # doublon : 0 chunk
+    batcher.add(dict(segment(3, [chunk("c")], final=True), document_id="doc3"))
+    batcher.flush()
+    assert [job["seq"] for job in drain(out)] == [1, 2, 3]
+
+
+def test_job_without_pending_work_is_emitted_immediately():
+    out = queue.Queue()
+    batcher = EmbeddingBatcher(FakeModel(), out, batch_size=64, flush_s=10.0, cache=None)
+    batcher.add(segment(1, [chunk("ref", "References")], final=True))
+    assert [job["seq"] for job in drain(out)] == [1]
@@ -0,0 +1,75 @@
+"""EmbeddingCache : éviction LRU et reprise après crash (compaction, ligne partielle)."""
+import sqlite3
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+DIM = 4
+
+
+def vec(i: int) -> np.ndarray:
+    return np.full(DIM, i, dtype=np.float32) + np.arange(DIM, dtype=np.float32) / 10
+
+
+def open_cache(tmp_path, max_rows: int = 10) -> EmbeddingCache:
+    return EmbeddingCache("model", False, DIM, root=tmp_path, max_bytes=max_rows * DIM * 4)
+
+
+def put(cache: EmbeddingCache, ids) -> None:
+    ids = list(ids)
+    cache.put_many([f"t{i}" for i in ids], np.stack([vec(i) for i in ids]))
+
+
+def test_eviction_keeps_most_recently_used_vectors(tmp_path):
+    cache = open_cache(tmp_path)              # max 10 lignes, 8 gardées après éviction
+    put(cache, range(10))
+    cache.get_many(["t0", "t1", "t2"])        # utilisés à nouveau : plus récents que t3..t9
+    put(cache, range(10, 15))                 # 15 lignes > 10 → éviction
+    cache.close()
+
+    cache = open_cache(tmp_path)
+    kept = [0, 1, 2, 10, 11, 12, 13, 14]
+    vectors, missing = cache.get_many([f"t{i}" for i in kept])
+    assert missing == []
+    np.testing.assert_array_equal(vectors, np.stack([vec(i) for i in kept]))
+    _, missing = cache.get_many([f"t{i}" for i in range(3, 10)])
+    assert len(missing) == 7
+    assert cache.vectors_path.stat().st_size == len(kept) * DIM * 4
+    cache.close()
+
+
+def test_partial_trailing_row_is_truncated(tmp_path):
+    cache = open_cache(tmp_path)
+    put(cache, range(3))
+    cache.close()
+    with open(cache.vectors_path, "ab") as f:
+        f.write(b"\x00" * 6)                  # append interrompu au milieu d'une ligne
+
+    cache = open_cache(tmp_path)
+    assert cache.vectors_path.stat().st_size == 3 * DIM * 4
+    vectors, missing = cache.get_many(["t0", "t1", "t2"])
+    assert missing == []
+    np.testing.assert_array_equal(vectors, np.stack([vec(i) for i in range(3)]))
+    cache.close()
+
+
+def test_interrupted_compaction_empties_the_cache(tmp_path):
+    cache = open_cache(tmp_path)
+    put(cache, range(5))
+    index_path = cache.dir / "index.sqlite"
+    cache.close()
+    db = sqlite3.connect(str(index_path))     # crash entre os.replace et le commit final
+    db.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('compacting', 1)")
+    db.commit()
+    db.close()
+
+    cache = open_cache(tmp_path)
+    _, missing = cache.get_many([f"t{i}" for i in range(5)])
+    assert len(missing) == 5
+    assert cache.vectors_path.stat().st_size == 0
+    assert cache._meta("compacting") == 0
+    put(cache, [7])                           # réutilisable ensuite
+    vectors, missing = cache.get_many(["t7"])
+    assert missing == [] and np.array_equal(vectors[0], vec(7))
+    cache.close()
@@ -0,0 +1,59 @@
+"""IngestJournal : front d'acquittement continu et embeddings journalisés."""
+import numpy as np
+
+from ingest_journal import IngestJournal
+
+DIM = 4
+
+
+def chunk(i: int) -> tuple:
+    return (f"chunk {i}", 1, "Results", i * 10, i * 10 + 7)
+
+
+def journal(tmp_path, n: int = 10) -> IngestJournal:
+    pdf = tmp_path / "a.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    j = IngestJournal(tmp_path / "journal.sqlite")
+    j.start("a.pdf", "doc", pdf, 3, {"meta": {}})
+    j.add_chunks("a.pdf", 0, [chunk(i) for i in range(n)])
+    return j
+
+
+def test_ack_front_waits_for_the_batch_at_zero(tmp_path):
+    j = journal(tmp_path)
+    j.ack("a.pdf", 4, 8)   # batches terminés dans le désordre (writer async)
+    j.ack("a.pdf", 8, 10)
+    assert j.get("a.pdf")["acked"] == 0  # la reprise supprimera tout à partir de 0
+    j.ack("a.pdf", 0, 4)
+    assert j.get("a.pdf")["acked"] == 10
+    j.close()
+
+    reopened = IngestJournal(tmp_path / "journal.sqlite")
+    assert reopened.get("a.pdf")["acked"] == 10
+    reopened.close()
+
+
+def test_ack_front_stops_at_a_gap(tmp_path):
+    j = journal(tmp_path)
+    j.ack("a.pdf", 0, 4)
+    j.ack("a.pdf", 8, 10)
+    assert j.get("a.pdf")["acked"] == 4  # [4, 8) manquant : 8..10 n'est pas couvert
+    j.ack("a.pdf", 4, 8)
+    assert j.get("a.pdf")["acked"] == 10
+    j.close()
+
+
+def test_load_chunks_returns_none_embeddings_when_one_is_missing(tmp_path):
+    j = journal(tmp_path, n=6)
+    vectors = np.arange(6 * DIM, dtype=np.float32).reshape(6, DIM)
+    j.save_embeddings("a.pdf", 0, vectors[:3])
+    j.save_embeddings("a.pdf", 4, vectors[4:])  # position 3 sans embedding
+
+    chunks, embeddings = j.load_chunks("a.pdf", 2, DIM)
+    assert chunks == [chunk(i) for i in range(2, 6)]
+    assert embeddings is None
+
+    chunks, embeddings = j.load_chunks("a.pdf", 4, DIM)
+    assert chunks == [chunk(4), chunk(5)]
+    np.testing.assert_array_equal(embeddings, vectors[4:])
+    j.close()
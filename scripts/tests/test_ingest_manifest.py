@@ -0,0 +1,66 @@
+"""IngestManifest.diff : inchangé, touché, déplacé, modifié, nouveau, changement de PIPELINE_VERSION."""
+import os
+
+from ingest_manifest import IngestManifest, file_fingerprint
+
+VERSION = 3
+
+
+def write(path, data: bytes, mtime_ns: int = 1_700_000_000_000_000_000):
+    path.write_bytes(data)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+def kinds(diff: dict) -> dict:
+    return {rel: kind for kind, entries in diff.items() for rel, *_ in entries}
+
+
+def test_diff_classifies_every_case(tmp_path):
+    manifest = IngestManifest(tmp_path / "manifest.sqlite")
+    same = write(tmp_path / "same.pdf", b"same")
+    touched = write(tmp_path / "touched.pdf", b"touched")
+    old = write(tmp_path / "old.pdf", b"moved content")
+    edited = write(tmp_path / "edited.pdf", b"v1")
+    for rel, path in (("same.pdf", same), ("touched.pdf", touched), ("old.pdf", old), ("edited.pdf", edited)):
+        manifest.record(rel, file_fingerprint(path), f"id-{rel}", VERSION)
+
+    write(touched, b"touched", mtime_ns=1_800_000_000_000_000_000)  # touch : contenu identique
+    moved = write(tmp_path / "moved.pdf", b"moved content")
+    old.unlink()
+    write(edited, b"v2 plus long")
+    new = write(tmp_path / "new.pdf", b"new")
+    files = [(p.name, p) for p in (same, touched, moved, edited, new)]
+
+    diff = manifest.diff(files, VERSION)
+    assert kinds(diff) == {
+        "same.pdf": "unchanged", "touched.pdf": "unchanged", "moved.pdf": "moved",
+        "edited.pdf": "changed", "new.pdf": "new",
+    }
+    entries = {rel: (fp, row) for kind in diff for rel, _, fp, row in diff[kind]}
+    assert entries["same.pdf"][0] is None                     # size + mtime : pas de hash
+    assert entries["moved.pdf"][1]["path"] == "old.pdf"       # jumeau = ligne de l'ancien chemin
+    assert entries["moved.pdf"][1]["document_id"] == "id-old.pdf"
+    assert entries["new.pdf"][1] is None
+
+    # Touché : hashé une fois, puis ré-enregistré (comme apply_manifest_diff) → plus de hash ensuite.
+    fp, row = entries["touched.pdf"]
+    assert fp is not None and fp["sha256"] == row["sha256"]
+    manifest.record("touched.pdf", fp, row["document_id"], VERSION)
+    again = manifest.diff([("touched.pdf", touched)], VERSION)
+    assert again["unchanged"][0][2] is None
+    assert manifest.rows()["touched.pdf"]["mtime_ns"] == 1_800_000_000_000_000_000
+    manifest.close()
+
+
+def test_pipeline_version_bump_turns_unchanged_into_changed(tmp_path):
+    manifest = IngestManifest(tmp_path / "manifest.sqlite")
+    a = write(tmp_path / "a.pdf", b"a")
+    b = write(tmp_path / "b.pdf", b"b")
+    manifest.record("a.pdf", file_fingerprint(a), "id-a", VERSION)
+    manifest.record("b.pdf", file_fingerprint(b), "id-b", VERSION)
+    files = [("a.pdf", a), ("b.pdf", b)]
+    assert kinds(manifest.diff(files, VERSION)) == {"a.pdf": "unchanged", "b.pdf": "unchanged"}
+    # Même contenu, même chemin, version plus récente : à ré-ingérer (ni inchangé ni déplacé).
+    assert kinds(manifest.diff(files, VERSION + 1)) == {"a.pdf": "changed", "b.pdf": "changed"}
+    manifest.close()
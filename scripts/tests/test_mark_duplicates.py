@@ -0,0 +1,50 @@
+"""Boilerplate : gardé et inséré sans embedding (FTS seule), jamais écarté."""
+import queue
+import threading
+
+import numpy as np
+
+from ingest import EMBED_DIM, EmbeddingBatcher, chunk_rows, mark_duplicates
+
+
+class FakeIndex:
+    def __init__(self, statuses: list):
+        self.statuses = statuses
+
+    def classify(self, doc: str, texts: list) -> list:
+        return self.statuses[:len(texts)]
+
+
+class CountingModel:
+    def __init__(self):
+        self.texts = []
+
+    def encode(self, texts, **kwargs):
+        self.texts.extend(texts)
+        return np.ones((len(texts), EMBED_DIM), dtype=np.float32)
+
+
+def chunk(text: str) -> tuple:
+    return (text, 1, "Results", 0, len(text))
+
+
+def test_boilerplate_chunks_are_inserted_without_embedding():
+    stats = {"boilerplate_chunks": 0, "near_duplicate_chunks": 0}
+    chunks = [chunk("body"), chunk("Downloaded from"), chunk("near"), chunk("tail")]
+    job = {"tag": "[1/1]", "rel_path": "a.pdf", "document_id": "doc", "chunks": chunks, "final": True}
+    # Deuxième segment d'un flux : les positions notées sont absolues.
+    mark_duplicates(FakeIndex(["keep", "boilerplate", "near", "keep"]), job, chunks, 10, stats, threading.Lock())
+    assert job["chunks"] == chunks
+    assert job["dedup"] == {"boilerplate": [11], "near_duplicates": [12]}
+    assert stats == {"boilerplate_chunks": 1, "near_duplicate_chunks": 1}
+
+    out, model = queue.Queue(), CountingModel()
+    batcher = EmbeddingBatcher(model, out, batch_size=0, flush_s=10.0, cache=None)
+    batcher.add(dict(job, position_offset=10))
+    done = out.get_nowait()
+    assert model.texts == ["body", "near", "tail"]
+    assert batcher.fts_only == 0
+
+    rows = chunk_rows("doc", done["chunks"], done["embeddings"], done["position_offset"])
+    assert [r["position"] for r in rows] == [10, 11, 12, 13]
+    assert [r["embedding"] is None for r in rows] == [False, True, False, False]
@@ -0,0 +1,72 @@
+"""Flux interrompu après des segments déjà transmis : le writer annule le document."""
+import queue
+import threading
+
+import fitz
+import numpy as np
+
+import ingest
+
+
+class RecordingWriter:
+    """Journal des appels, comme CopyWriter : une transaction ouverte par write_chunks."""
+
+    def __init__(self):
+        self.calls = []
+
+    def write_chunks(self, job, tag=""):
+        self.calls.append(("write", job["position_offset"], len(job["chunks"])))
+
+    def finalize(self, job, log):
+        self.calls.append(("finalize", job["document_id"]))
+
+    def abort(self, job):
+        self.calls.append(("abort", job["document_id"]))
+
+
+PAGE = "Results\n\n" + " ".join(f"word{i}" for i in range(600))
+
+
+def test_stream_error_after_sent_segment_reaches_writer(tmp_path, monkeypatch):
+    pdf = tmp_path / "big.pdf"
+    doc = fitz.open()
+    doc.new_page()
+    doc.save(str(pdf))
+
+    def pages(doc, ocr_log, range_workers=1):
+        for n in range(1, 6):
+            yield n, PAGE
+        raise RuntimeError("page 6 illisible")
+
+    def prepare(sb, job, *args):
+        job["document_id"] = "doc-1"
+        return True
+
+    monkeypatch.setattr(ingest, "iter_pages", pages)
+    monkeypatch.setattr(ingest, "extract_metadata", lambda doc, text, path: {"doi": None})
+    monkeypatch.setattr(ingest, "prepare_document", prepare)
+    monkeypatch.setattr(ingest, "STREAM_SEGMENT", 2)
+
+    embed_q = queue.Queue()
+    job = {"tag": "[1/1]", "rel_path": str(pdf), "num_pages": 6}
+    ingest.stream_document(None, job, None, False, embed_q, {}, threading.Lock())
+
+    jobs = []
+    while not embed_q.empty():
+        jobs.append(embed_q.get_nowait())
+    assert len(jobs) >= 2 and all(not j["final"] for j in jobs[:-1])
+    assert jobs[-1]["final"] and jobs[-1]["chunks"] == [] and "page 6" in jobs[-1]["error"]
+
+    # Étage d'écriture : segments écrits, puis abort (pas de finalize), status=error
+    errors = []
+    monkeypatch.setattr(ingest, "record_error", lambda sb, rel_path, err: errors.append(err))
+    write_q = queue.Queue()
+    for j in jobs:
+        j["embeddings"] = np.zeros((len(j["chunks"]), ingest.EMBED_DIM), dtype=np.float32)
+        write_q.put(j)
+    write_q.put(ingest._STOP)
+    writer = RecordingWriter()
+    stats = {"done": 0, "error": 0}
+    ingest.write_stage(None, writer, write_q, None, None, stats, threading.Lock())
+    assert [c[0] for c in writer.calls] == ["write"] * (len(jobs) - 1) + ["abort"]
+    assert stats == {"done": 0, "error": 1} and len(errors) == 1
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Format des embeddings stockés en base : halfvec(384) (pgvector >= 0.7, float16).
+
+Migration 20261018110000_chunks_embedding_halfvec.sql. Côté Python les vecteurs
+restent en float32 (modèle, cache, journal) ; ils ne sont arrondis en float16
+qu'au moment de l'écriture, comme le ferait Postgres :
+  - texte '[x1,x2,...]' (PostgREST, paramètres psycopg2) : 5 chiffres significatifs,
+    juste ce qu'il faut pour retrouver exactement le float16 (≈ 3,6 Ko par vecteur
+    contre ≈ 8,4 Ko en JSON float32) ;
+  - binaire COPY (halfvec_recv) : int16 dim, int16 réservé, dim × float16 big-endian.
+
+La lecture (parse_vector) accepte indifféremment vector et halfvec : même format texte.
+En masse (compute_umap.py), decode_send_rows lit la sortie binaire de
+vector_send / halfvec_send (bytea) directement dans une matrice float32, sans
+passer par le texte ni par des listes Python.
+
+Colonne embedding_bit bit(384) (migration 20261018120000_chunks_embedding_bit.sql) :
+quantification binaire, un bit par dimension (1 si la composante est > 0, comme
+binary_quantize de pgvector), pour le préfiltre Hamming de match_chunks_bq.
+"""
+import struct
+
+import numpy as np
+
+EMBED_SQL_TYPE = "halfvec(384)"
+
+
+def halfvec_text(emb) -> str:
+    """Littéral texte pgvector d'un vecteur, arrondi en float16."""
+    return "[" + ",".join(["%.5g" % v for v in np.asarray(emb, dtype=np.float16).tolist()]) + "]"
+
+
+def halfvec_binary(emb) -> bytes:
+    """Format binaire halfvec_recv (sans l'entête de longueur du champ COPY)."""
+    vec = np.asarray(emb, dtype=">f2")
+    return struct.pack("!hh", vec.shape[0], 0) + vec.tobytes()
+
+
+def halfvec_binary_rows(matrix) -> np.ndarray:
+    """halfvec_binary de chaque ligne d'une matrice (n, dim) : tableau uint8 (n, 4 + 2·dim)."""
+    vecs = np.ascontiguousarray(matrix, dtype=">f2")
+    head = np.frombuffer(struct.pack("!hh", vecs.shape[1], 0), dtype=np.uint8)
+    return np.hstack([np.broadcast_to(head, (vecs.shape[0], head.size)), vecs.view(np.uint8)])
+
+
+def parse_vector(value) -> np.ndarray:
+    """vector / halfvec lu en base ('[...]' texte, liste ou tableau) → float32."""
+    if isinstance(value, str):
+        return np.fromstring(value.strip()[1:-1], sep=",", dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def send_function(sql_type: str) -> tuple:
+    """(fonction SQL *_send, dtype big-endian) d'une colonne 'vector(384)' ou 'halfvec(384)'."""
+    if sql_type.startswith("halfvec"):
+        return "halfvec_send", ">f2"
+    return "vector_send", ">f4"
+
+
+def decode_send_rows(values: list, dim: int, dtype: str, out: np.ndarray) -> None:
+    """Sorties vector_send / halfvec_send (int16 dim, int16 réservé, dim composantes
+    big-endian) → lignes de out (float32, len(values) × dim), en une conversion numpy."""
+    width = 4 + dim * np.dtype(dtype).itemsize
+    raw = np.frombuffer(b"".join(values), dtype=np.uint8)
+    if raw.size != len(values) * width:
+        raise ValueError(f"vecteurs de dimension inattendue (attendu {dim})")
+    rows = raw.reshape(len(values), width)
+    out[:] = np.ascontiguousarray(rows[:, 4:]).view(dtype)
+
+
+def bit_text(emb) -> str:
+    """Littéral texte bit(n) : '0110…'."""
+    return ((np.asarray(emb) > 0).view(np.uint8) + ord("0")).tobytes().decode("ascii")
+
+
+def bit_binary_rows(matrix) -> np.ndarray:
+    """Format binaire varbit_recv de chaque ligne (int32 nombre de bits, bits empaquetés
+    poids fort en premier) : tableau uint8 (n, 4 + dim/8)."""
+    matrix = np.asarray(matrix)
+    head = np.frombuffer(struct.pack("!i", matrix.shape[1]), dtype=np.uint8)
+    return np.hstack([np.broadcast_to(head, (matrix.shape[0], head.size)), np.packbits(matrix > 0, axis=1)])
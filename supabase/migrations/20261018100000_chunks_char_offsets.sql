@@ -0,0 +1,10 @@
+-- Offsets du chunk dans le texte de sa page (scripts/chunking.py) :
+-- texte_page[char_start:char_end] = content. Nuls pour les chunks antérieurs
+-- et ceux créés par l'upload API.
+
+alter table public.chunks
+  add column if not exists char_start int,
+  add column if not exists char_end int;
+
+comment on column public.chunks.char_start is 'Offset (caractères) du début du chunk dans le texte de sa page.';
+comment on column public.chunks.char_end is 'Offset (caractères, exclu) de la fin du chunk dans le texte de sa page.';
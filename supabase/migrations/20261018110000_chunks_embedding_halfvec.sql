@@ -0,0 +1,306 @@
+-- Alexandria : embeddings en demi-précision (pgvector halfvec, float16).
+--
+-- ~848k chunks : embedding vector(384) + embedding_fr vector(384) et leurs index HNSW
+-- dominent la taille de la base et la RAM. halfvec(384) stocke 2 octets par dimension
+-- au lieu de 4 : colonnes et index HNSW divisés par ~2, rappel quasi identique.
+-- Mesurer avant d'appliquer : python3 scripts/compare_halfvec.py (rappel@k et latence
+-- HNSW fp32 vs halfvec sur un échantillon du corpus).
+--
+-- Requiert pgvector >= 0.7.0 (type halfvec, opclass halfvec_cosine_ops).
+-- La conversion réécrit la table chunks (verrou exclusif) puis reconstruit les deux
+-- index HNSW : prévoir une fenêtre de maintenance.
+--
+-- Les RPC gardent leur signature (query_embedding vector) : le cast en halfvec est
+-- fait dans la fonction, les appels de l'app (lib/rag/search.ts, routes API) ne
+-- changent pas. Les scripts Python écrivent des littéraux halfvec (scripts/vector_format.py).
+
+do $$
+begin
+  if (select string_to_array(extversion, '.')::int[] from pg_extension where extname = 'vector') < array[0, 7, 0] then
+    raise exception 'pgvector >= 0.7.0 requis pour halfvec (alter extension vector update;)';
+  end if;
+end;
+$$;
+
+-- Colonnes
+drop index if exists public.idx_chunks_embedding;
+drop index if exists public.idx_chunks_embedding_fr;
+
+alter table public.chunks
+  alter column embedding    type halfvec(384) using embedding::halfvec(384),
+  alter column embedding_fr type halfvec(384) using embedding_fr::halfvec(384);
+
+comment on column public.chunks.embedding is 'Dimension 384 (sentence-transformers all-MiniLM-L6-v2), halfvec (float16).';
+comment on column public.chunks.embedding_fr is 'Embedding du contenu français, 384D, halfvec (float16).';
+
+-- Index HNSW (mêmes paramètres qu'en fp32)
+create index if not exists idx_chunks_embedding on public.chunks
+  using hnsw (embedding halfvec_cosine_ops)
+  with (m = 16, ef_construction = 64);
+
+create index if not exists idx_chunks_embedding_fr on public.chunks
+  using hnsw (embedding_fr halfvec_cosine_ops)
+  with (m = 16, ef_construction = 64);
+
+-- RPC : même signature, requête castée en halfvec(384) pour utiliser les index ci-dessus
+create or replace function public.match_chunks(
+  query_embedding vector,
+  match_threshold double precision default 0.5,
+  match_count integer default 20
+)
+returns table(
+  id uuid,
+  document_id uuid,
+  content text,
+  "position" integer,
+  page integer,
+  section_title text,
+  similarity double precision,
+  doc_title text,
+  doc_doi text,
+  doc_storage_path text
+)
+language sql
+stable
+as $function$
+  select
+    c.id,
+    c.document_id,
+    c.content,
+    c.position,
+    c.page,
+    c.section_title,
+    1 - (c.embedding <=> query_embedding::halfvec(384)) as similarity,
+    d.title as doc_title,
+    d.doi as doc_doi,
+    d.storage_path as doc_storage_path
+  from public.chunks c
+  join public.documents d on d.id = c.document_id
+  where d.status = 'done'
+    and c.is_temp = false
+    and c.embedding is not null
+    and (1 - (c.embedding <=> query_embedding::halfvec(384))) > match_threshold
+  order by c.embedding <=> query_embedding::halfvec(384)
+  limit match_count;
+$function$;
+
+create or replace function public.match_chunks_fr(
+  query_embedding vector(384),
+  match_threshold float default 0.5,
+  match_count int default 20
+)
+returns table (
+  id uuid,
+  document_id uuid,
+  content text,
+  "position" int,
+  page int,
+  section_title text,
+  similarity float,
+  doc_title text,
+  doc_doi text,
+  doc_storage_path text
+)
+language sql stable
+as $$
+  select
+    c.id,
+    c.document_id,
+    c.content_fr as content,
+    c.position,
+    c.page,
+    c.section_title,
+    1 - (c.embedding_fr <=> query_embedding::halfvec(384)) as similarity,
+    d.title as doc_title,
+    d.doi as doc_doi,
+    d.storage_path as doc_storage_path
+  from public.chunks c
+  join public.documents d on d.id = c.document_id
+  where d.status = 'done'
+    and c.embedding_fr is not null
+    and (1 - (c.embedding_fr <=> query_embedding::halfvec(384))) > match_threshold
+  order by c.embedding_fr <=> query_embedding::halfvec(384)
+  limit match_count;
+$$;
+
+create or replace function public.match_corpus_docs(
+  query_embedding  vector(384),
+  match_count      int   default 10,
+  chunk_candidates int   default 80,
+  match_threshold  float default 0.3
+)
+returns table (
+  document_id     uuid,
+  title           text,
+  journal         text,
+  published_at    date,
+  doi             text,
+  best_similarity float,
+  best_chunk      text
+)
+language sql stable
+as $$
+  with top_chunks as (
+    select
+      c.document_id,
+      c.content,
+      (1 - (c.embedding <=> query_embedding::halfvec(384))) as sim
+    from public.chunks c
+    join public.documents d on d.id = c.document_id
+    where d.is_author_article = false
+      and d.status = 'done'
+      and c.embedding is not null
+      and (1 - (c.embedding <=> query_embedding::halfvec(384))) > match_threshold
+    order by c.embedding <=> query_embedding::halfvec(384)
+    limit chunk_candidates
+  )
+  select
+    d.id                                                          as document_id,
+    d.title,
+    d.journal,
+    d.published_at,
+    d.doi,
+    max(tc.sim)                                                   as best_similarity,
+    (array_agg(tc.content order by tc.sim desc))[1]              as best_chunk
+  from   top_chunks tc
+  join   public.documents d on d.id = tc.document_id
+  group  by d.id, d.title, d.journal, d.published_at, d.doi
+  order  by best_similarity desc
+  limit  match_count;
+$$;
+
+create or replace function public.match_author_chunks(
+  query_embedding vector(384),
+  match_threshold float default 0.0,
+  match_count int default 3
+)
+returns table (
+  id uuid,
+  document_id uuid,
+  content text,
+  "position" int,
+  page int,
+  similarity float,
+  doc_title text
+)
+language sql stable
+as $$
+  select
+    c.id,
+    c.document_id,
+    c.content,
+    c.position,
+    c.page,
+    1 - (c.embedding <=> query_embedding::halfvec(384)) as similarity,
+    d.title as doc_title
+  from public.chunks c
+  join public.documents d on d.id = c.document_id
+  where d.is_author_article = true
+    and c.embedding is not null
+    and (1 - (c.embedding <=> query_embedding::halfvec(384))) > match_threshold
+  order by c.embedding <=> query_embedding::halfvec(384)
+  limit match_count;
+$$;
+
+create or replace function public.match_corpus_by_author_doc(
+  author_doc_id  uuid,
+  match_count    int   default 10
+)
+returns table (
+  document_id     uuid,
+  title           text,
+  journal         text,
+  published_at    date,
+  doi             text,
+  best_similarity float,
+  best_chunk      text
+)
+language plpgsql stable
+as $$
+declare
+  avg_emb halfvec(384);
+begin
+  -- 1. Embedding moyen de l'article auteur (moyenne calculée en float32)
+  select avg(c.embedding::vector(384))::halfvec(384)
+    into avg_emb
+  from public.chunks c
+  where c.document_id = author_doc_id
+    and c.embedding is not null;
+
+  if avg_emb is null then
+    return;  -- pas de chunks ou pas d'embeddings
+  end if;
+
+  -- 2. Top 200 chunks proches (index HNSW halfvec) → filtrer corpus → agréger par doc
+  return query
+  with top_chunks as (
+    select
+      c.document_id,
+      c.content,
+      (1 - (c.embedding <=> avg_emb)) as sim
+    from public.chunks c
+    where c.embedding is not null
+    order by c.embedding <=> avg_emb
+    limit 200
+  ),
+  corpus_chunks as (
+    select tc.document_id, tc.content, tc.sim
+    from   top_chunks tc
+    join   public.documents d on d.id = tc.document_id
+    where  d.is_author_article = false
+      and  d.status = 'done'
+  )
+  select
+    d.id                                                                     as document_id,
+    d.title,
+    d.journal,
+    d.published_at,
+    d.doi,
+    max(cc.sim)                                                              as best_similarity,
+    (array_agg(cc.content order by cc.sim desc))[1]                         as best_chunk
+  from   corpus_chunks cc
+  join   public.documents d on d.id = cc.document_id
+  group  by d.id, d.title, d.journal, d.published_at, d.doi
+  order  by best_similarity desc
+  limit  match_count;
+end;
+$$;
+
+-- Centroïde auteur : moyenne en float32 puis retour en halfvec pour la distance
+create or replace function get_author_representative_titles(top_n integer default 15)
+returns table (title text, distance float)
+language sql stable as $$
+  with centroid as (
+    select avg(c.embedding::vector(384))::halfvec(384) as vec
+    from chunks c
+    join documents d on d.id = c.document_id
+    where d.is_author_article = true and c.embedding is not null
+  ),
+  doc_distances as (
+    select
+      d.title,
+      avg(c.embedding <=> (select vec from centroid)) as dist
+    from chunks c
+    join documents d on d.id = c.document_id
+    where d.is_author_article = true and c.embedding is not null
+    group by d.title
+  )
+  select title, dist as distance
+  from doc_distances
+  where
+    length(title) > 25
+    and title ~ '^[A-Z][a-z]'              -- commence par Majuscule + minuscule
+    and title not like '%.doc%'             -- pas un nom de fichier Word
+    and title not like 'doi:%'              -- pas un DOI brut
+    and title !~ '[A-Z0-9_]{5,}'           -- pas des identifiants type RSC_CC, CHEMPR...
+    and length(title) - length(replace(title, ' ', '')) >= 2  -- au moins 3 mots
+  order by dist asc
+  limit top_n * 2                           -- prend 2x pour compenser les non-trouvés sur SS
+$$;
+
+comment on function public.match_chunks is 'Recherche par similarité cosinus sur chunks (embedding halfvec 384D, is_temp exclus). Retourne chunks + métadonnées document pour citations.';
+comment on function public.match_chunks_fr is 'Recherche par similarité cosinus sur chunks (embedding_fr halfvec 384D). Retourne content_fr comme content.';
+comment on function public.match_corpus_docs is
+  'Recherche de documents corpus similaires à un embedding (ex: chunk d''un article auteur).
+   Exclut les articles auteur (is_author_article=false). Agrège par document.
+   Utilise l''index HNSW halfvec via le pattern ORDER BY embedding <=> query::halfvec(384) LIMIT n.';
@@ -0,0 +1,133 @@
+-- Alexandria : quantification binaire des embeddings + RPC en deux phases (match_chunks_bq).
+--
+-- match_chunks parcourt un index HNSW sur les vecteurs 384D complets : latence et
+-- mémoire croissent avec le corpus. embedding_bit garde un bit par dimension
+-- (binary_quantize : 1 si la composante est > 0), soit 48 octets par chunk ; son
+-- index HNSW (distance de Hamming) est ~16x plus petit que celui des halfvec.
+--
+-- match_chunks_bq :
+--   1. candidats : les candidate_count chunks les plus proches en distance de Hamming
+--      (index idx_chunks_embedding_bit) ;
+--   2. rerank : cosinus exact sur les vecteurs complets (embedding halfvec) de ces
+--      seuls candidats, filtres status/is_temp/seuil, top match_count.
+-- Activé côté app par rag_settings.use_binary_prefilter ; binary_candidates règle
+-- le nombre de candidats (compromis rappel / latence, mesuré par
+-- scripts/compare_binary_rerank.py).
+--
+-- embedding_bit est écrit par les scripts d'ingestion (ingest.py, fix_spaced_chunks.py) ;
+-- le trigger ne le calcule que s'il manque (upload API, updates SQL manuels).
+-- Requiert pgvector >= 0.7.0 (binary_quantize, opérateur <~>, bit_hamming_ops).
+
+do $$
+begin
+  if (select string_to_array(extversion, '.')::int[] from pg_extension where extname = 'vector') < array[0, 7, 0] then
+    raise exception 'pgvector >= 0.7.0 requis pour binary_quantize / bit_hamming_ops (alter extension vector update;)';
+  end if;
+end;
+$$;
+
+-- Colonne + backfill (réécrit toutes les lignes : fenêtre de maintenance)
+alter table public.chunks
+  add column if not exists embedding_bit bit(384);
+
+update public.chunks
+set embedding_bit = binary_quantize(embedding)::bit(384)
+where embedding is not null
+  and embedding_bit is null;
+
+comment on column public.chunks.embedding_bit is 'Quantification binaire de embedding (1 bit/dimension, > 0). Préfiltre Hamming de match_chunks_bq.';
+
+-- Trigger de secours : calcule embedding_bit quand l'écrivain ne le fournit pas
+create or replace function public.chunks_embedding_bit_trigger()
+returns trigger language plpgsql as $$
+begin
+  if new.embedding is null then
+    new.embedding_bit := null;
+  elsif new.embedding_bit is null
+     or (tg_op = 'UPDATE'
+         and new.embedding is distinct from old.embedding
+         and new.embedding_bit is not distinct from old.embedding_bit) then
+    new.embedding_bit := binary_quantize(new.embedding)::bit(384);
+  end if;
+  return new;
+end;
+$$;
+
+drop trigger if exists chunks_embedding_bit on public.chunks;
+create trigger chunks_embedding_bit
+  before insert or update of embedding, embedding_bit on public.chunks
+  for each row execute function public.chunks_embedding_bit_trigger();
+
+-- Index HNSW Hamming
+create index if not exists idx_chunks_embedding_bit on public.chunks
+  using hnsw (embedding_bit bit_hamming_ops)
+  with (m = 16, ef_construction = 64);
+
+-- RPC en deux phases : mêmes colonnes que match_chunks
+create or replace function public.match_chunks_bq(
+  query_embedding vector,
+  match_threshold double precision default 0.5,
+  match_count integer default 20,
+  candidate_count integer default 200
+)
+returns table(
+  id uuid,
+  document_id uuid,
+  content text,
+  "position" integer,
+  page integer,
+  section_title text,
+  similarity double precision,
+  doc_title text,
+  doc_doi text,
+  doc_storage_path text
+)
+language plpgsql
+as $function$
+declare
+  q halfvec(384) := query_embedding::halfvec(384);
+  n integer := least(greatest(candidate_count, match_count), 1000);
+begin
+  -- Un scan HNSW ne renvoie pas plus de hnsw.ef_search lignes (max 1000) :
+  -- on l'aligne sur le nombre de candidats, pour cette transaction seulement.
+  perform set_config('hnsw.ef_search', greatest(n, 40)::text, true);
+
+  return query
+  with candidates as (
+    select c.id
+    from public.chunks c
+    where c.embedding_bit is not null
+    order by c.embedding_bit <~> binary_quantize(q)::bit(384)
+    limit n
+  )
+  select
+    c.id,
+    c.document_id,
+    c.content,
+    c.position,
+    c.page,
+    c.section_title,
+    1 - (c.embedding <=> q) as similarity,
+    d.title as doc_title,
+    d.doi as doc_doi,
+    d.storage_path as doc_storage_path
+  from candidates k
+  join public.chunks c on c.id = k.id
+  join public.documents d on d.id = c.document_id
+  where d.status = 'done'
+    and c.is_temp = false
+    and (1 - (c.embedding <=> q)) > match_threshold
+  order by c.embedding <=> q
+  limit match_count;
+end;
+$function$;
+
+comment on function public.match_chunks_bq is 'Recherche vectorielle en deux phases : candidats par distance de Hamming (embedding_bit, HNSW) puis rerank cosinus exact (embedding). Mêmes colonnes que match_chunks.';
+
+-- Paramètres RAG
+insert into public.rag_settings (key, value) values
+  ('use_binary_prefilter', 'false'),
+  ('binary_candidates', '200')
+on conflict (key) do nothing;
+
+comment on table public.rag_settings is 'Paramètres RAG : context_turns, similarity_threshold, guard_message, match_count, match_threshold, fts_weight, vector_weight, rrf_k, hybrid_top_k, use_similarity_guard, use_binary_prefilter, binary_candidates.';
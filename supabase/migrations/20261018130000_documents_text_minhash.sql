@@ -0,0 +1,10 @@
+-- Signature MinHash du début du texte (scripts/doc_fingerprints.py) : détection des
+-- quasi-doublons (preprint / version publiée, copies sous un autre chemin) quand la
+-- dédup DOI ne voit rien. Écrite par ingest.py à l'insert du document ; l'index LSH
+-- local (data/.doc_fingerprints.sqlite) se reconstruit depuis cette colonne.
+-- Un quasi-doublon est passé en done sans chunks, avec ingestion_log.duplicate_of.
+
+alter table public.documents
+  add column if not exists text_minhash integer[];
+
+comment on column public.documents.text_minhash is 'MinHash (64 minima, trigrammes de mots) des 10 000 premiers caractères du texte. Nul pour l''upload API.';
@@ -0,0 +1,26 @@
+-- Filigrane de scripts/embedding_snapshot.py : copie locale (memmap) des embeddings,
+-- synchronisée en ne relisant que les chunks insérés ou modifiés depuis le dernier
+-- passage. embedding_updated_at suit l'insert et les changements de ce que la copie
+-- contient (embedding, document_id, position, is_temp) ; l'écriture des
+-- coordonnées UMAP ou des traductions ne la touche pas.
+-- Les lignes existantes prennent la date de la migration (première synchro complète).
+
+alter table public.chunks
+  add column if not exists embedding_updated_at timestamptz not null default now();
+
+create index if not exists idx_chunks_embedding_updated_at on public.chunks (embedding_updated_at);
+
+create or replace function public.chunks_embedding_updated_at_trigger()
+returns trigger language plpgsql as $$
+begin
+  new.embedding_updated_at := now();
+  return new;
+end;
+$$;
+
+drop trigger if exists chunks_embedding_updated_at on public.chunks;
+create trigger chunks_embedding_updated_at
+  before update of embedding, document_id, position, is_temp on public.chunks
+  for each row execute function public.chunks_embedding_updated_at_trigger();
+
+comment on column public.chunks.embedding_updated_at is 'Dernier insert ou changement de embedding / document_id / position / is_temp (synchro de scripts/embedding_snapshot.py).';